@@ -0,0 +1,298 @@
+"""Latency, throughput and DB statements per endpoint of /api/v1, driven through an ASGI client.
+
+    python -m benchmarks.endpoints [--requests 200] [--concurrency 16] [--results benchmarks/results]
+        [--compare FILE] [--only PATH ...]
+
+Load a dataset first, e.g. with benchmarks.generate_catalog --load. Every run is stored as JSON
+in --results; --compare prints the change of p95 against an earlier run. Settings such as
+CACHE_ENABLED, BUILDING_INDEX_ENABLED, READ_MODEL_ENABLED or READ_MODEL_FILE are read from the environment as usual.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import time
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote
+
+import httpx
+import numpy as np
+from fastapi.routing import APIRoute
+from sqlalchemy import Engine, String, event, func, select
+
+from config import settings
+from database import async_session_maker
+from main import app
+from models import Building, Organization, Practice
+from repository import get_objects_count
+
+
+API_PREFIX = "/api/v1"
+HEADERS = {"X-API-Key": settings.API_KEY}
+
+_statements: ContextVar[list[int] | None] = ContextVar("statements", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count_statement(*_: Any) -> None:
+    counter = _statements.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@dataclass
+class Sample:
+    """Values to build request URLs from, taken from the loaded dataset."""
+    building_ids: list[int]
+    organization_ids: list[int]
+    practice_ids: list[int]
+    names: list[str]
+    bounds: tuple[float, float, float, float]
+    counts: dict[str, int]
+
+    def point(self) -> tuple[float, float]:
+        min_lat, min_lon, max_lat, max_lon = self.bounds
+        return random.uniform(min_lat, max_lat), random.uniform(min_lon, max_lon)
+
+
+async def load_sample(size: int = 1000) -> Sample:
+    """The same rows for the same dataset: ordered by a hash of the id, spread over the table."""
+    async with async_session_maker() as session:
+        def shuffled(model: Any) -> Any:
+            return func.md5(model.id.cast(String))
+
+        async def ids(model: Any) -> list[int]:
+            return list(await session.scalars(select(model.id).order_by(shuffled(model)).limit(size)))
+
+        names = list(await session.scalars(select(Organization.name).order_by(shuffled(Organization)).limit(size)))
+        bounds = (await session.execute(select(
+            func.min(Building.latitude),
+            func.min(Building.longitude),
+            func.max(Building.latitude),
+            func.max(Building.longitude),
+        ))).one()
+        return Sample(
+            building_ids=await ids(Building),
+            organization_ids=await ids(Organization),
+            practice_ids=await ids(Practice),
+            names=names,
+            bounds=tuple(bounds),  # pyright:ignore[reportArgumentType]
+            counts={
+                model.__tablename__: await get_objects_count(session, model)
+                for model in (Building, Organization, Practice)
+            },
+        )
+
+
+def _box(s: Sample) -> str:
+    lat, lon = s.point()
+    return f"lat1={lat}&lon1={lon}&lat2={lat + random.uniform(0.002, 0.02)}&lon2={lon + random.uniform(0.002, 0.02)}"
+
+
+def _circle(s: Sample) -> str:
+    lat, lon = s.point()
+    return f"lat={lat}&lon={lon}&radius={random.uniform(0.2, 2)}"
+
+
+def _viewport(s: Sample, zoom: int) -> str:
+    """bbox of a 1920x1080 map at zoom around a random point."""
+    lat, lon = s.point()
+    half_lon = 1920 / 256 * 360 / 2 ** zoom / 2
+    half_lat = 1080 / 256 * 360 / 2 ** zoom / 2 * math.cos(math.radians(lat))
+    return f"bbox={lon - half_lon},{lat - half_lat},{lon + half_lon},{lat + half_lat}&zoom={zoom}"
+
+
+def _search(s: Sample) -> str:
+    return f"search={quote(random.choice(random.choice(s.names).split()))}"
+
+
+# Sparse fieldset of a client needing ids and names only
+LEAN_ORGANIZATIONS = "fields=name&include="
+
+# Route path -> named request variants building a URL from the sample
+SCENARIOS: dict[str, dict[str, Callable[[Sample], str]]] = {
+    "/buildings/all": {"": lambda s: "/buildings/all"},
+    "/buildings/{building_id}/organizations": {
+        "": lambda s: f"/buildings/{random.choice(s.building_ids)}/organizations",
+    },
+    "/buildings/search_in_area": {
+        "box": lambda s: f"/buildings/search_in_area?{_box(s)}",
+        "circle": lambda s: f"/buildings/search_in_area?{_circle(s)}",
+    },
+    "/buildings/clusters": {
+        "zoom 10": lambda s: f"/buildings/clusters?{_viewport(s, 10)}",
+        "zoom 14": lambda s: f"/buildings/clusters?{_viewport(s, 14)}",
+        "practice": lambda s: (
+            f"/buildings/clusters?{_viewport(s, 12)}&practice_id={random.choice(s.practice_ids)}&recursive=true"
+        ),
+    },
+    "/organizations/all": {
+        "": lambda s: "/organizations/all",
+        "lean": lambda s: f"/organizations/all?{LEAN_ORGANIZATIONS}",
+    },
+    "/organizations/search_in_area": {
+        "box": lambda s: f"/organizations/search_in_area?{_box(s)}",
+        "circle": lambda s: f"/organizations/search_in_area?{_circle(s)}",
+        "circle, lean": lambda s: f"/organizations/search_in_area?{_circle(s)}&{LEAN_ORGANIZATIONS}",
+    },
+    "/organizations/search_by_name": {"": lambda s: f"/organizations/search_by_name?{_search(s)}"},
+    "/organizations/search": {
+        "area+practice": lambda s: (
+            f"/organizations/search?{_circle(s)}&practice_id={random.choice(s.practice_ids)}&recursive=true"
+        ),
+        "building+name": lambda s: f"/organizations/search?building_id={random.choice(s.building_ids)}&{_search(s)}",
+    },
+    "/organizations/nearest": {
+        "": lambda s: "/organizations/nearest?lat={}&lon={}&k=20".format(*s.point()),
+        "practice": lambda s: "/organizations/nearest?lat={}&lon={}&k=20&practice_id={}".format(
+            *s.point(), random.choice(s.practice_ids)
+        ),
+    },
+    "/organizations/batch": {
+        "": lambda s: "/organizations/batch?" + "&".join(f"ids={i}" for i in random.sample(s.organization_ids, 50)),
+    },
+    "/organizations/{organization_id}": {"": lambda s: f"/organizations/{random.choice(s.organization_ids)}"},
+    "/practices/all": {"": lambda s: "/practices/all"},
+    "/practices/{practice_id}/organizations": {
+        "": lambda s: f"/practices/{random.choice(s.practice_ids)}/organizations",
+    },
+    "/practices/{practice_id}/organizations/recursive": {
+        "": lambda s: f"/practices/{random.choice(s.practice_ids)}/organizations/recursive",
+    },
+}
+# Service routes, not worth measuring
+SKIPPED = {"/cache/stats", "/cache/invalidate", "/pool/stats"}
+
+
+@dataclass
+class Result:
+    endpoint: str
+    requests: int
+    errors: int
+    throughput: float  # requests per second
+    p50: float  # ms
+    p95: float
+    p99: float
+    statements: float  # per request, mean
+
+
+async def run_endpoint(
+    client: httpx.AsyncClient,
+    endpoint: str,
+    make_url: Callable[[Sample], str],
+    sample: Sample,
+    n: int,
+    concurrency: int,
+) -> Result:
+    urls = [make_url(sample) for _ in range(n)]
+    latencies: list[float] = []
+    statements: list[int] = []
+    errors = 0
+
+    async def worker() -> None:
+        nonlocal errors
+        while urls:
+            url = urls.pop()
+            counter = [0]
+            _statements.set(counter)
+            start = time.perf_counter()
+            response = await client.get(API_PREFIX + url, headers=HEADERS)
+            latencies.append(time.perf_counter() - start)
+            statements.append(counter[0])
+            if response.status_code != 200:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall_time = time.perf_counter() - start
+
+    p50, p95, p99 = (np.percentile(latencies, [50, 95, 99]) * 1000).tolist()
+    return Result(endpoint, n, errors, n / wall_time, p50, p95, p99, float(np.mean(statements)))
+
+
+def check_coverage() -> None:
+    paths = {
+        route.path.removeprefix(API_PREFIX)
+        for route in app.routes
+        if isinstance(route, APIRoute) and route.path.startswith(API_PREFIX)
+    }
+    missing = paths - SCENARIOS.keys() - SKIPPED
+    if missing:
+        print(f"No scenario for: {', '.join(sorted(missing))}")
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="per endpoint variant")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--results", type=Path, default=Path("benchmarks/results"))
+    parser.add_argument("--compare", type=Path)
+    parser.add_argument("--only", nargs="+", help="route paths to run, e.g. /organizations/search_in_area")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    check_coverage()
+    baseline: dict[str, dict[str, Any]] = {}
+    if args.compare:
+        baseline = {r["endpoint"]: r for r in json.loads(args.compare.read_text())["results"]}
+
+    results: list[Result] = []
+    async with app.router.lifespan_context(app):
+        sample = await load_sample()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            print(f"{'endpoint':<56} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'sql':>5} {'err':>4} {'p95 diff':>9}")
+            for path, variants in SCENARIOS.items():
+                if args.only and path not in args.only:
+                    continue
+                for variant, make_url in variants.items():
+                    endpoint = f"{path} [{variant}]" if variant else path
+                    res = await run_endpoint(client, endpoint, make_url, sample, args.requests, args.concurrency)
+                    results.append(res)
+                    diff = ""
+                    if endpoint in baseline:
+                        diff = f"{(res.p95 / baseline[endpoint]['p95'] - 1) * 100:+.0f}%"
+                    print(
+                        f"{endpoint:<56} {res.throughput:>8.1f} {res.p50:>8.2f} {res.p95:>8.2f} {res.p99:>8.2f} "
+                        f"{res.statements:>5.1f} {res.errors:>4} {diff:>9}"
+                    )
+
+    args.results.mkdir(parents=True, exist_ok=True)
+    now = datetime.now(timezone.utc)
+    output = args.results / f"{now:%Y%m%dT%H%M%S}.json"
+    output.write_text(json.dumps({
+        "timestamp": now.isoformat(),
+        "revision": git_revision(),
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "settings": {
+            "CACHE_ENABLED": settings.CACHE_ENABLED,
+            "BUILDING_INDEX_ENABLED": settings.BUILDING_INDEX_ENABLED,
+            "READ_MODEL_ENABLED": settings.READ_MODEL_ENABLED,
+            "READ_MODEL_FILE": settings.READ_MODEL_FILE,
+        },
+        "dataset": sample.counts,
+        "results": [asdict(r) for r in results],
+    }, indent=2))
+    print(f"Stored in {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""Synthetic catalog in the import_catalog format.
+
+    python -m benchmarks.generate_catalog --out data/ [--buildings 100000] [--organizations 300000]
+        [--depth 3] [--fanout 5] [--practices-per-organization 2] [--seed 0] [--load]
+
+Buildings are dense around a few centers and sparse elsewhere in the city, organizations
+prefer leaf practices. With --load the files are imported right away.
+"""
+import argparse
+import asyncio
+import csv
+import json
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.geo_filters import CITY_BOUNDS
+from import_catalog import import_catalog
+
+
+STREETS = ["Тверская", "Арбат", "Покровка", "Мясницкая", "Пятницкая", "Сретенка", "Лесная", "Садовая"]
+STREET_KINDS = ["ул.", "пер.", "пр-т", "наб."]
+WORDS = ["Кофе", "Дом", "Сити", "Маркет", "Лаборатория", "Сервис", "Вкус", "Центр", "Студия", "Плюс"]
+CLUSTER_SHARE = 0.7  # buildings around the centers, the rest is uniform
+CLUSTER_COUNT = 12
+CLUSTER_SPREAD = 0.01  # degrees, standard deviation
+
+
+def generate_buildings(rng: np.random.Generator, n: int, path: Path) -> None:
+    min_lat, min_lon, max_lat, max_lon = CITY_BOUNDS
+    n_clustered = int(n * CLUSTER_SHARE)
+    centers = rng.uniform((min_lat, min_lon), (max_lat, max_lon), (CLUSTER_COUNT, 2))
+    clustered = centers[rng.integers(0, CLUSTER_COUNT, n_clustered)] + rng.normal(0, CLUSTER_SPREAD, (n_clustered, 2))
+    uniform = rng.uniform((min_lat, min_lon), (max_lat, max_lon), (n - n_clustered, 2))
+    points = np.concatenate([clustered, uniform])
+    points = np.clip(points, (min_lat, min_lon), (max_lat, max_lon))
+
+    with path.open("w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "address", "coordinates"])
+        for i, (lat, lon) in enumerate(points.tolist(), start=1):
+            street = f"{STREET_KINDS[i % len(STREET_KINDS)]} {STREETS[i % len(STREETS)]}"
+            writer.writerow([i, f"г. Москва, {street} {i % 200 + 1}", f"{lat:.6f},{lon:.6f}"])
+
+
+def generate_practices(depth: int, fanout: int, path: Path) -> tuple[list[int], list[int]]:
+    """Tree of `fanout` roots, each node having `fanout` children down to `depth` levels. Returns all and leaf ids."""
+    ids: list[int] = []
+    leaves: list[int] = []
+    with path.open("w", encoding="utf-8") as f:
+        level: list[int | None] = [None]
+        for d in range(depth):
+            next_level: list[int | None] = []
+            for parent_id in level:
+                for _ in range(fanout):
+                    practice_id = len(ids) + 1
+                    ids.append(practice_id)
+                    next_level.append(practice_id)
+                    row = {"id": practice_id, "name": f"Деятельность {practice_id}", "parent_id": parent_id}
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+                    if d == depth - 1:
+                        leaves.append(practice_id)
+            level = next_level
+    return ids, leaves
+
+
+def random_phone(rng: np.random.Generator) -> str:
+    return f"8-9{rng.integers(10, 99)}-{rng.integers(100, 999)}-{rng.integers(10, 99)}-{rng.integers(10, 99)}"
+
+
+def generate_organizations(
+    rng: np.random.Generator,
+    n: int,
+    n_buildings: int,
+    practice_ids: list[int],
+    leaf_ids: list[int],
+    practices_per_organization: int,
+    path: Path,
+) -> None:
+    # A few buildings host many organizations, as business centers do
+    building_ids = np.minimum(rng.zipf(1.3, n), n_buildings)
+    building_ids = np.where(rng.random(n) < 0.5, building_ids, rng.integers(1, n_buildings + 1, n))
+    with path.open("w", encoding="utf-8") as f:
+        for i, building_id in enumerate(building_ids.tolist(), start=1):
+            pool = leaf_ids if rng.random() < 0.8 else practice_ids
+            k = min(max(1, int(rng.poisson(practices_per_organization))), len(pool))
+            practices = sorted(set(rng.choice(pool, k).tolist()))
+            phones = [random_phone(rng) for _ in range(rng.integers(0, 3))]
+            name = f"{WORDS[i % len(WORDS)]} {WORDS[(i // len(WORDS)) % len(WORDS)]} {i}"
+            f.write(json.dumps({
+                "id": i,
+                "name": name,
+                "phone_numbers": phones,
+                "building_id": building_id,
+                "practice_ids": practices,
+            }, ensure_ascii=False) + "\n")
+
+
+async def load(out: Path) -> None:
+    async for table, count, seconds in import_catalog(
+        out / "buildings.csv",
+        out / "practices.jsonl",
+        out / "organizations.jsonl",
+        batch_size=10_000,
+    ):
+        print(f"loaded {count} rows into {table} in {seconds:.2f} s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--buildings", type=int, default=100_000)
+    parser.add_argument("--organizations", type=int, default=300_000)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--fanout", type=int, default=5)
+    parser.add_argument("--practices-per-organization", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load", action="store_true")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    args.out.mkdir(parents=True, exist_ok=True)
+    generate_buildings(rng, args.buildings, args.out / "buildings.csv")
+    practice_ids, leaf_ids = generate_practices(args.depth, args.fanout, args.out / "practices.jsonl")
+    generate_organizations(
+        rng,
+        args.organizations,
+        args.buildings,
+        practice_ids,
+        leaf_ids,
+        args.practices_per_organization,
+        args.out / "organizations.jsonl",
+    )
+    print(f"{args.buildings} buildings, {len(practice_ids)} practices, {args.organizations} organizations in {args.out}")
+    if args.load:
+        asyncio.run(load(args.out))
+
+
+if __name__ == "__main__":
+    main()
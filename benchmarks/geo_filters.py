@@ -0,0 +1,72 @@
+"""Scalar vs vectorized area filters.
+
+    python -m benchmarks.geo_filters [--sizes 10000 100000 1000000] [--repeat 5]
+"""
+import argparse
+import time
+from collections.abc import Callable
+from types import SimpleNamespace
+from typing import Any, cast
+
+import numpy as np
+
+from geo_arrays import CoordinateStore
+from schemas import BoxArea, CircleArea
+from utils import find_buildings_in_box_area, find_buildings_in_circle_area
+
+
+# Moscow, roughly inside the MKAD
+CITY_BOUNDS = (55.57, 37.37, 55.91, 37.85)
+
+
+def make_buildings(n: int, seed: int = 0) -> list[Any]:
+    min_lat, min_lon, max_lat, max_lon = CITY_BOUNDS
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(min_lat, max_lat, n)
+    lons = rng.uniform(min_lon, max_lon, n)
+    return [
+        SimpleNamespace(id=i, latitude=lat, longitude=lon)
+        for i, (lat, lon) in enumerate(zip(lats.tolist(), lons.tolist()), start=1)
+    ]
+
+
+def best_of(repeat: int, fn: Callable[[], Any]) -> tuple[float, Any]:
+    best, res = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    box = BoxArea(lat1=55.75, lon1=37.62, lat2=55.70, lon2=37.52)
+    circle = CircleArea(lat=55.75, lon=37.62, radius=5)
+
+    print(f"{'points':>10} {'filter':>7} {'scalar, ms':>11} {'vector, ms':>11} {'speedup':>8} {'matches':>8}")
+    for n in args.sizes:
+        buildings = cast(Any, make_buildings(n))
+        build_time, store = best_of(1, lambda: CoordinateStore.from_buildings(buildings))
+
+        for name, scalar, vector in (
+            ("box", lambda: find_buildings_in_box_area(buildings, box), lambda: store.in_box_area(box)),
+            ("circle", lambda: find_buildings_in_circle_area(buildings, circle), lambda: store.in_circle_area(circle)),
+        ):
+            scalar_time, scalar_res = best_of(args.repeat, scalar)
+            vector_time, vector_res = best_of(args.repeat, vector)
+            if [b.id for b in scalar_res] != vector_res.tolist():
+                raise AssertionError(f"{name} filter results differ at {n} points")
+            print(
+                f"{n:>10} {name:>7} {scalar_time * 1000:>11.2f} {vector_time * 1000:>11.2f} "
+                f"{scalar_time / vector_time:>7.1f}x {len(vector_res):>8}"
+            )
+        print(f"{n:>10} {'(store build)':>19} {build_time * 1000:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
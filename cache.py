@@ -0,0 +1,224 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Coroutine, Hashable
+from functools import wraps
+from typing import Any, Concatenate, NoReturn, ParamSpec, TypeVar, cast
+
+from pydantic import BaseModel
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from constants import DATASET_VERSION_TTL
+from geo_index import building_index
+from models import Building, Organization, Practice
+from repository import get_dataset_version
+from schemas import BoxArea, CircleArea
+
+
+P = ParamSpec("P")
+T = TypeVar("T")
+S = TypeVar("S")
+
+_COORDINATE_DIGITS = 6  # ~0.1 m
+
+
+class TTLCache:
+    """LRU cache whose entries also expire `ttl` seconds after they were stored."""
+
+    def __init__(self, ttl: float, maxsize: int):
+        self.ttl: float = ttl
+        self.maxsize: int = maxsize
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> tuple[bool, Any]:
+        entry = self._data.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+caches: dict[str, TTLCache] = {}
+
+
+def normalize_cache_key(value: Any) -> Hashable:
+    # A box is centered at (lat1, lon1), so only the distances to (lat2, lon2) matter
+    if isinstance(value, BoxArea):
+        return (
+            "box",
+            round(value.lat1, _COORDINATE_DIGITS),
+            round(value.lon1, _COORDINATE_DIGITS),
+            round(abs(value.lat1 - value.lat2), _COORDINATE_DIGITS),
+            round(abs(value.lon1 - value.lon2), _COORDINATE_DIGITS),
+        )
+    if isinstance(value, CircleArea):
+        return (
+            "circle",
+            round(value.lat, _COORDINATE_DIGITS),
+            round(value.lon, _COORDINATE_DIGITS),
+            round(value.radius, _COORDINATE_DIGITS),
+        )
+    if isinstance(value, BaseModel):
+        return (type(value).__name__, *(normalize_cache_key(getattr(value, f)) for f in type(value).model_fields))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_cache_key(v) for v in value)  # pyright:ignore[reportUnknownVariableType]
+    return value
+
+
+def _read_only(self: Any, *args: Any, **kwargs: Any) -> NoReturn:
+    raise TypeError("A cached value is read-only, copy it to change it")
+
+
+class _FrozenDict(dict[Any, Any]):
+    # A dict still, for orjson and pydantic serialization
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+
+class _FrozenList(list[Any]):
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = clear = extend = insert = pop = remove = reverse = sort = _read_only
+
+
+def _frozen(value: Any) -> Any:
+    """Read-only copy of the dicts, lists and models of a service result, made once when it is stored."""
+    if isinstance(value, dict):
+        return _FrozenDict((k, _frozen(v)) for k, v in cast(dict[Any, Any], value).items())
+    if isinstance(value, list):
+        return _FrozenList(_frozen(v) for v in cast(list[Any], value))
+    if isinstance(value, BaseModel):
+        return value.model_copy(update={f: _frozen(getattr(value, f)) for f in type(value).model_fields})
+    return value
+
+
+def cached(
+    ttl: float,
+    maxsize: int,
+) -> Callable[
+    [Callable[Concatenate[S, P], Coroutine[Any, Any, T]]],
+    Callable[Concatenate[S, P], Coroutine[Any, Any, T]],
+]:
+    """Read-through cache for a service method, shared by all instances of the service.
+
+    Values are stored read-only, changing a cached result raises TypeError instead of
+    changing what the next caller gets. Models are handed out as shallow copies.
+    """
+
+    def decorator(
+        method: Callable[Concatenate[S, P], Coroutine[Any, Any, T]],
+    ) -> Callable[Concatenate[S, P], Coroutine[Any, Any, T]]:
+        cache = caches[method.__name__] = TTLCache(ttl, maxsize)
+
+        @wraps(method)
+        async def wrapper(self: S, *args: P.args, **kwargs: P.kwargs) -> T:
+            if not settings.CACHE_ENABLED:
+                return await method(self, *args, **kwargs)
+
+            key = (normalize_cache_key(args), normalize_cache_key(tuple(sorted(kwargs.items()))))
+            found, value = cache.get(key)
+            if found:
+                return value.model_copy() if isinstance(value, BaseModel) else value  # pyright:ignore[reportReturnType]
+            value = await method(self, *args, **kwargs)
+            cache.set(key, _frozen(value))
+            return value
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_caches(*names: str) -> None:
+    """Drops cached results of the given service methods, or of all of them, in this process only."""
+    for name in names or caches:
+        caches[name].clear()
+
+
+def cache_stats() -> dict[str, dict[str, int | float]]:
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+# -------------- Dataset version --------------
+class DatasetVersion:
+    """Last seen value of the dataset_version counter, re-read at most every `ttl` seconds.
+
+    A changed value means the catalog was written, possibly by another process,
+    so the in-process caches are dropped and the building index is rebuilt.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl: float = ttl
+        self._value: int | None = None
+        self._checked_at: float = float("-inf")
+
+    async def get(self, session: AsyncSession) -> int:
+        if self._value is not None and time.monotonic() - self._checked_at < self.ttl:
+            return self._value
+        value = await get_dataset_version(session)
+        if self._value is not None and value != self._value:
+            invalidate_caches()
+            building_index.invalidate()
+        self._value = value
+        self._checked_at = time.monotonic()
+        return value
+
+    def expire(self) -> None:
+        self._checked_at = float("-inf")
+
+
+dataset_version = DatasetVersion(DATASET_VERSION_TTL)
+
+
+# -------------- Invalidation on committed catalog changes --------------
+_CHANGED_KEY = "catalog_changed"
+
+
+@event.listens_for(Session, "after_flush")
+def _note_catalog_changes(session: Session, _: Any) -> None:
+    if any(
+        isinstance(obj, (Building, Organization, Practice))
+        for obj in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info[_CHANGED_KEY] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session: Session) -> None:
+    if session.info.pop(_CHANGED_KEY, False):
+        invalidate_caches()
+        dataset_version.expire()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_catalog_changes(session: Session) -> None:
+    session.info.pop(_CHANGED_KEY, None)
@@ -8,8 +8,28 @@ class Settings(BaseSettings):
     DB_PORT: int
     DB_NAME: str
 
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = -1  # seconds, -1 - never
+    DB_POOL_PRE_PING: bool = False
+    DB_POOL_SLOW_CHECKOUT: float = 0.1  # log checkouts that waited longer, seconds
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    # Full URLs (postgresql+asyncpg://...) of read replicas, as a JSON list
+    DB_REPLICA_URLS: list[str] = []
+
     API_KEY: str
 
+    # Log requests slower than this, with the SQL they issued, seconds
+    METRICS_SLOW_REQUEST_SECONDS: float | None = None
+
+    BUILDING_INDEX_ENABLED: bool = True
+    CACHE_ENABLED: bool = True
+    # Serve reads from an in-memory copy of the catalog, see read_model.py
+    READ_MODEL_ENABLED: bool = False
+    # Serve reads from a snapshot file written by python -m snapshot_file, see snapshot_file.py
+    READ_MODEL_FILE: str | None = None
+
     model_config: SettingsConfigDict = SettingsConfigDict(env_file=".env")  # pyright:ignore[reportIncompatibleVariableOverride]
 
     def get_db_url(self) -> str:
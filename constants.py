@@ -1 +1,34 @@
-EARTH_RADIUS: float = 6371  # km
\ No newline at end of file
+EARTH_RADIUS: float = 6371  # km
+BUILDING_INDEX_CELL_SIZE: float = 0.01  # degrees, ~1.1 km by latitude
+
+PAGE_DEFAULT_LIMIT: int = 100
+PAGE_MAX_LIMIT: int = 1000
+BATCH_MAX_IDS: int = 500
+
+NEAREST_MAX_K: int = 100
+NEAREST_START_RADIUS: float = 0.5  # km, the first search circle
+NEAREST_RADIUS_GROWTH: float = 4  # the circle grows this many times while fewer than k organizations are found
+NEAREST_MAX_RADIUS: float = 100  # km, organizations further away are not returned
+
+# A map cell is a web mercator tile CLUSTER_CELL_ZOOM_OFFSET levels below the map zoom, 64 px of a 256 px tile
+CLUSTER_TILE_ZOOM: int = 24  # zoom of the precomputed building tile, see models.Building
+CLUSTER_CELL_ZOOM_OFFSET: int = 2
+CLUSTER_MAX_ZOOM: int = CLUSTER_TILE_ZOOM - CLUSTER_CELL_ZOOM_OFFSET
+CLUSTER_MAX_CELLS: int = 4096  # per request, a 4K screen shows about 2000
+CLUSTER_PRACTICE_CACHE_SIZE: int = 32  # practices whose building clusters the read model keeps, up to ~1.6 MB each
+MERCATOR_MAX_LATITUDE: float = 85.0511287798  # degrees, the projection is a square up to it
+
+STREAM_BATCH_SIZE: int = 1000
+NDJSON_MEDIA_TYPE: str = "application/x-ndjson"
+
+CACHE_MAXSIZE: int = 1024  # entries per cached method
+CACHE_TTL_REFERENCE: float = 300  # s, buildings and practices
+CACHE_TTL_ORGANIZATIONS: float = 60  # s
+CACHE_TTL_SEARCH: float = 30  # s, area and name searches
+DATASET_VERSION_TTL: float = 1  # s, how long a read dataset version is trusted
+
+READ_MODEL_POLL_INTERVAL: float = 5  # s, dataset version check while no notification comes
+READ_MODEL_REFRESH_DELAY: float = 0.5  # s, notifications arriving meanwhile are handled by one refresh
+SNAPSHOT_FILE_POLL_INTERVAL: float = 0.2  # s, how often a worker stats the snapshot file for a new one
+
+DB_REPLICA_RETRY_INTERVAL: float = 5  # s, how long an unreachable replica is skipped
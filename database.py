@@ -1,11 +1,98 @@
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+import logging
+import time
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import Any
+
+from sqlalchemy import exc
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry
 
 from config import settings
+from constants import DB_REPLICA_RETRY_INTERVAL
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolMetrics:
+    """Counters of connection checkouts, with the time spent waiting for a free connection,
+    and of new connections, with the time spent opening them."""
+
+    def __init__(self):
+        self.checkouts: int = 0
+        self.timeouts: int = 0
+        self.wait_time_total: float = 0
+        self.wait_time_max: float = 0
+        self.connects: int = 0
+        self.connect_time_total: float = 0
+        self.connect_time_max: float = 0
+
+    def record_checkout(self, wait_time: float) -> None:
+        self.checkouts += 1
+        self.wait_time_total += wait_time
+        self.wait_time_max = max(self.wait_time_max, wait_time)
+
+    def record_connect(self, connect_time: float) -> None:
+        self.connects += 1
+        self.connect_time_total += connect_time
+        self.connect_time_max = max(self.connect_time_max, connect_time)
+
+
+_CONNECT_TIME_KEY = "pool_connect_time"
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.metrics: PoolMetrics = PoolMetrics()
+
+    def _create_connection(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        entry = super()._create_connection()
+        # Handed to the _do_get that asked for it, other checkouts don't see a new entry
+        entry.info[_CONNECT_TIME_KEY] = time.perf_counter() - start
+        return entry
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            entry = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+        connect_time: float = entry.info.pop(_CONNECT_TIME_KEY, 0)
+        if connect_time:
+            self.metrics.record_connect(connect_time)
+        # Opening a connection is not waiting for a free one
+        wait_time = time.perf_counter() - start - connect_time
+        self.metrics.record_checkout(wait_time)
+        if wait_time >= settings.DB_POOL_SLOW_CHECKOUT:
+            logger.warning("Waited %.3f s for a DB connection: %s", wait_time, self.status())
+        return entry
+
+
+def _create_engine(url: str) -> AsyncEngine:
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args={
+            # SQLAlchemy's cache of prepared statements and asyncpg's own one.
+            # Both must be 0 behind pgbouncer in transaction mode.
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        },
+    )
 
 
 DATABASE_URL = settings.get_db_url()
-engine = create_async_engine(DATABASE_URL)
+engine = _create_engine(DATABASE_URL)
 
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
@@ -14,6 +101,83 @@ class Base(AsyncAttrs, DeclarativeBase):
     __abstract__: bool = True
 
 
-async def get_db_session():
-    async with async_session_maker() as session:
+# -------------- Read replicas --------------
+class ReplicaSet:
+    """Picks the replica with the fewest checked-out connections, round-robin among equals.
+
+    A replica that failed to connect is skipped for DB_REPLICA_RETRY_INTERVAL seconds.
+    """
+
+    def __init__(self, engines: list[AsyncEngine]):
+        self.engines: list[AsyncEngine] = engines
+        self._down_until: list[float] = [float("-inf")] * len(engines)
+        self._turn: int = 0
+
+    def pick(self) -> AsyncEngine | None:
+        now = time.monotonic()
+        alive = [i for i, until in enumerate(self._down_until) if until <= now]
+        if not alive:
+            return None
+        self._turn += 1
+        n = len(self.engines)
+        i = min(alive, key=lambda i: (_pool(self.engines[i]).checkedout(), (i - self._turn) % n))
+        return self.engines[i]
+
+    def mark_down(self, engine: AsyncEngine) -> None:
+        self._down_until[self.engines.index(engine)] = time.monotonic() + DB_REPLICA_RETRY_INTERVAL
+
+
+replicas = ReplicaSet([_create_engine(url) for url in settings.DB_REPLICA_URLS])
+
+
+async def _open_replica_session() -> AsyncSession | None:
+    while (replica := replicas.pick()) is not None:
+        session = async_session_maker(bind=replica)
+        try:
+            await session.connection()
+        except (OSError, exc.DBAPIError) as e:
+            logger.warning("Replica %s is unavailable: %s", replica.url.render_as_string(), e)
+            replicas.mark_down(replica)
+            await session.close()
+            continue
+        return session
+    return None
+
+
+# -------------- Pool stats --------------
+def _pool(engine: AsyncEngine) -> InstrumentedPool:
+    return engine.pool  # pyright:ignore[reportReturnType]
+
+
+def _pool_stats(engine: AsyncEngine) -> dict[str, int | float]:
+    pool = _pool(engine)
+    checkouts = pool.metrics.checkouts
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+        "checkouts": checkouts,
+        "timeouts": pool.metrics.timeouts,
+        "wait_time_avg": pool.metrics.wait_time_total / checkouts if checkouts else 0,
+        "wait_time_max": pool.metrics.wait_time_max,
+        "connects": pool.metrics.connects,
+        "connect_time_avg": pool.metrics.connect_time_total / pool.metrics.connects if pool.metrics.connects else 0,
+        "connect_time_max": pool.metrics.connect_time_max,
+    }
+
+
+def pool_stats() -> dict[str, dict[str, int | float]]:
+    res = {"primary": _pool_stats(engine)}
+    for i, replica in enumerate(replicas.engines, 1):
+        res[f"replica_{i}"] = _pool_stats(replica)
+    return res
+
+
+@asynccontextmanager
+async def db_session(read_only: bool) -> AsyncGenerator[AsyncSession]:
+    """A session of a replica for read_only use if any is configured and reachable, of the primary otherwise."""
+    session = await _open_replica_session() if read_only else None
+    async with session or async_session_maker() as session:
         yield session
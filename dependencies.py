@@ -1,20 +1,62 @@
-from typing import Annotated
+from collections.abc import AsyncIterator, Callable, Sequence
+from typing import Annotated, Any
 
-from fastapi import Depends, HTTPException, Query
+from fastapi import Depends, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse
 from fastapi.security.api_key import APIKeyHeader
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
-from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_422_UNPROCESSABLE_CONTENT
+from starlette.status import (
+    HTTP_304_NOT_MODIFIED,
+    HTTP_401_UNAUTHORIZED,
+    HTTP_422_UNPROCESSABLE_CONTENT,
+)
 
+from cache import dataset_version
 from config import settings
-from database import get_db_session
+from constants import (
+    CLUSTER_CELL_ZOOM_OFFSET,
+    CLUSTER_MAX_CELLS,
+    CLUSTER_MAX_ZOOM,
+    CLUSTER_TILE_ZOOM,
+    PAGE_DEFAULT_LIMIT,
+    PAGE_MAX_LIMIT,
+)
+from database import db_session
+from metrics import measure_serialization
+from read_model import CatalogSnapshot, read_model
 from repository import Repository
-from schemas import BoxArea, CircleArea
-from service import SecundaService
+from schemas import (
+    BUILDING_FIELDS,
+    ORGANIZATION_FIELDS,
+    ORGANIZATION_RELATIONSHIPS,
+    BoxArea,
+    CircleArea,
+    ClusterGrid,
+    OrganizationFilters,
+    Page,
+    Pagination,
+)
+from service import SecundaService, SnapshotService
+from snapshot_file import MappedSnapshot, mapped_read_model
+from utils import decode_cursor, mercator_tile
 
 
 # -------------- Service --------------
-def get_service(session: Annotated[AsyncSession, Depends(get_db_session)]):
-    repo = Repository(session)
+async def get_catalog_source(request: Request) -> AsyncIterator[AsyncSession | CatalogSnapshot | MappedSnapshot]:
+    """The in-memory snapshot while the read model serves reads, no connection is taken then."""
+    snapshot = read_model.snapshot or mapped_read_model.snapshot
+    if snapshot is not None:
+        yield snapshot
+        return
+    async with db_session(request.method in ("GET", "HEAD")) as session:
+        yield session
+
+
+def get_service(source: Annotated[AsyncSession | CatalogSnapshot | MappedSnapshot, Depends(get_catalog_source)]):
+    if not isinstance(source, AsyncSession):
+        return SnapshotService(source)
+    repo = Repository(source)
     return SecundaService(repo)
 
 
@@ -40,7 +82,7 @@ def circle_query(
     return CircleArea(lat=lat, lon=lon, radius=radius)  # pyright: ignore[reportArgumentType]
 
 
-def area_query(
+def optional_area_query(
     box: Annotated[BoxArea | None, Depends(box_query)],
     circle: Annotated[CircleArea | None, Depends(circle_query)],
 ) -> BoxArea | CircleArea | None:
@@ -49,12 +91,187 @@ def area_query(
             HTTP_422_UNPROCESSABLE_CONTENT,
             "Specify only one area",
         )
-    if not box and not circle:
+    return box or circle
+
+
+def area_query(
+    area: Annotated[BoxArea | CircleArea | None, Depends(optional_area_query)],
+) -> BoxArea | CircleArea:
+    if not area:
         raise HTTPException(
             HTTP_422_UNPROCESSABLE_CONTENT,
             "Area is required",
         )
-    return box or circle
+    return area
+
+
+def organization_filters_query(
+    area: Annotated[BoxArea | CircleArea | None, Depends(optional_area_query)],
+    building_id: Annotated[int | None, Query(gt=0, description="Id здания")] = None,
+    practice_id: Annotated[int | None, Query(gt=0, description="Id деятельности")] = None,
+    recursive: Annotated[
+        bool,
+        Query(description="Учитывать также деятельности, являющиеся потомками данной деятельности"),
+    ] = False,
+    name: Annotated[str | None, Query(min_length=1, description="Подстрока названия организации")] = None,
+) -> OrganizationFilters:
+    if area is None and building_id is None and practice_id is None and name is None:
+        raise HTTPException(
+            HTTP_422_UNPROCESSABLE_CONTENT,
+            "Specify at least one filter",
+        )
+    return OrganizationFilters(
+        area=area,
+        building_id=building_id,
+        practice_id=practice_id,
+        recursive=recursive,
+        name=name,
+    )
+
+
+def cluster_grid_query(
+    bbox: Annotated[
+        str,
+        Query(description="Видимая область карты: долгота и широта юго-западного, затем северо-восточного угла через запятую"),
+    ],
+    zoom: Annotated[int, Query(ge=0, le=CLUSTER_MAX_ZOOM, description="Уровень масштаба карты")],
+) -> ClusterGrid:
+    try:
+        west, south, east, north = (float(v) for v in bbox.split(","))
+    except ValueError:
+        west = south = east = north = None
+    if (
+        west is None or south is None or east is None or north is None
+        or not (-180 <= west < east <= 180 and -90 <= south < north <= 90)
+    ):
+        raise HTTPException(
+            HTTP_422_UNPROCESSABLE_CONTENT,
+            "Invalid bbox",
+        )
+    cell_zoom = zoom + CLUSTER_CELL_ZOOM_OFFSET
+    shift = CLUSTER_TILE_ZOOM - cell_zoom
+    x1, y1 = (v >> shift for v in mercator_tile(north, west, CLUSTER_TILE_ZOOM))
+    x2, y2 = (v >> shift for v in mercator_tile(south, east, CLUSTER_TILE_ZOOM))
+    if (x2 - x1 + 1) * (y2 - y1 + 1) > CLUSTER_MAX_CELLS:
+        raise HTTPException(
+            HTTP_422_UNPROCESSABLE_CONTENT,
+            "Too many map cells, lower the zoom",
+        )
+    return ClusterGrid(zoom=cell_zoom, x1=x1, y1=y1, x2=x2, y2=y2)
+
+
+# -------------- Sparse Fieldsets --------------
+# The response_model of a route is its full response, with fields or include it is not validated against it
+_SPARSE_NOTE = "Схема ответа описывает полные объекты, при выборе полей в них только выбранные"
+
+
+def _listed_names(value: str | None, allowed: Sequence[str], parameter: str) -> set[str] | None:
+    """Comma separated names of a fields= or include= value, None when the parameter is not given."""
+    if value is None:
+        return None
+    names = {name.strip() for name in value.split(",")} - {""}
+    unknown = names.difference(allowed)
+    if unknown:
+        raise HTTPException(
+            HTTP_422_UNPROCESSABLE_CONTENT,
+            f"Unknown {parameter}: {', '.join(sorted(unknown))}",
+        )
+    return names
+
+
+def building_fields_query(
+    fields: Annotated[
+        str | None,
+        Query(description="Поля зданий через запятую, id выводится всегда. По умолчанию выводятся все поля. " + _SPARSE_NOTE),
+    ] = None,
+) -> tuple[str, ...]:
+    chosen = _listed_names(fields, BUILDING_FIELDS, "fields")
+    if chosen is None:
+        return BUILDING_FIELDS
+    return tuple(f for f in BUILDING_FIELDS if f == "id" or f in chosen)
+
+
+def organization_fields_query(
+    fields: Annotated[
+        str | None,
+        Query(description="Поля организаций через запятую, id выводится всегда. По умолчанию выводятся все поля. " + _SPARSE_NOTE),
+    ] = None,
+    include: Annotated[
+        str | None,
+        Query(description=(
+            f"Связанные объекты через запятую: {', '.join(ORGANIZATION_RELATIONSHIPS)}. "
+            "По умолчанию выводятся все, с пустым значением - ни одного, без лишнего запроса к БД"
+        )),
+    ] = None,
+) -> tuple[str, ...]:
+    attributes = [f for f in ORGANIZATION_FIELDS if f not in ORGANIZATION_RELATIONSHIPS]
+    chosen = _listed_names(fields, attributes, "fields")
+    if chosen is None:
+        chosen = set(attributes)
+    included = _listed_names(include, ORGANIZATION_RELATIONSHIPS, "include")
+    if included is None:
+        included = set(ORGANIZATION_RELATIONSHIPS)
+    return tuple(f for f in ORGANIZATION_FIELDS if f == "id" or f in chosen or f in included)
+
+
+# -------------- Responses --------------
+def forwarded_headers(response: Response) -> dict[str, str]:
+    """Headers set by dependencies on the injected response (e.g. ETag).
+
+    FastAPI drops them when a route returns its own Response.
+    """
+    return {name: value for name, value in response.headers.items() if name != "content-length"}
+
+
+def serialized(response: Response, content: Any) -> ORJSONResponse:
+    """Serializes content as it is, skipping the validation pass of response_model."""
+    with measure_serialization():
+        if isinstance(content, BaseModel):
+            content = content.model_dump(mode="json")
+        return ORJSONResponse(content, headers=forwarded_headers(response))
+
+
+# -------------- Pagination --------------
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def paginated(response: Response, page: Page[Any]) -> ORJSONResponse:
+    if page.next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return serialized(response, page.items)
+
+
+def _pagination_query(key_size: int) -> Callable[..., Pagination]:
+    def pagination_query(
+        limit: Annotated[
+            int,
+            Query(ge=1, le=PAGE_MAX_LIMIT, description="Максимальное количество элементов на странице"),
+        ] = PAGE_DEFAULT_LIMIT,
+        after: Annotated[
+            str | None,
+            Query(description=f"Курсор следующей страницы из заголовка {NEXT_CURSOR_HEADER}"),
+        ] = None,
+    ) -> Pagination:
+        if after is None:
+            return Pagination(limit=limit)
+        try:
+            key = decode_cursor(after)
+        except ValueError:
+            key = None
+        if key is None or len(key) != key_size:
+            raise HTTPException(
+                HTTP_422_UNPROCESSABLE_CONTENT,
+                "Invalid cursor",
+            )
+        return Pagination(limit=limit, after=key)
+
+    return pagination_query
+
+
+# Pages ordered by id
+pagination_query = _pagination_query(1)
+# Pages ordered by (rank, id)
+ranked_pagination_query = _pagination_query(2)
 
 
 # -------------- API Key --------------
@@ -67,3 +284,21 @@ def verify_api_key(api_key: Annotated[str, Depends(api_key_header)]):
             HTTP_401_UNAUTHORIZED,
             "Invalid API Key",
         )
+
+
+# -------------- Conditional Requests --------------
+async def check_etag(
+    request: Request,
+    response: Response,
+    source: Annotated[AsyncSession | CatalogSnapshot | MappedSnapshot, Depends(get_catalog_source)],
+    _: Annotated[str, Depends(verify_api_key)],
+) -> None:
+    """Answers 304 before the route runs if the client already has the current dataset version."""
+    version = await dataset_version.get(source) if isinstance(source, AsyncSession) else source.version
+    etag = f'"{version}"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            raise HTTPException(HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
@@ -0,0 +1,156 @@
+from collections.abc import Iterable, Sequence
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from constants import CLUSTER_TILE_ZOOM, EARTH_RADIUS as R
+from models import Building
+from schemas import BoxArea, CircleArea, ClusterGrid
+
+
+FloatArray = npt.NDArray[np.float64]
+IdArray = npt.NDArray[np.int64]
+Mask = npt.NDArray[np.bool_]
+
+
+def distance_wgs84_array(lats: FloatArray, lons: FloatArray, lat: float, lon: float) -> FloatArray:
+    lats, lons = np.radians(lats), np.radians(lons)
+    lat, lon = np.radians(lat), np.radians(lon)
+
+    dlat = lat - lats
+    dlon = lon - lons
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lats) * np.cos(lat) * np.sin(dlon / 2) ** 2
+    return 2 * R * np.arcsin(np.sqrt(a))
+
+
+def box_area_mask(lats: FloatArray, lons: FloatArray, area: BoxArea) -> Mask:
+    return (
+        (np.abs(area.lat1 - lats) <= abs(area.lat1 - area.lat2))
+        & (np.abs(area.lon1 - lons) <= abs(area.lon1 - area.lon2))
+    )
+
+
+def circle_area_mask(lats: FloatArray, lons: FloatArray, area: CircleArea) -> Mask:
+    return distance_wgs84_array(lats, lons, area.lat, area.lon) <= area.radius
+
+
+class CoordinateStore:
+    """Building ids with their coordinates laid out as contiguous arrays."""
+
+    def __init__(self, ids: IdArray, lats: FloatArray, lons: FloatArray):
+        self.ids: IdArray = np.ascontiguousarray(ids, dtype=np.int64)
+        self.lats: FloatArray = np.ascontiguousarray(lats, dtype=np.float64)
+        self.lons: FloatArray = np.ascontiguousarray(lons, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def from_points(cls, points: Iterable[tuple[int, float, float]]) -> "CoordinateStore":
+        arr = np.array(list(points), dtype=np.float64).reshape(-1, 3)
+        return cls(arr[:, 0].astype(np.int64), arr[:, 1], arr[:, 2])
+
+    @classmethod
+    def from_buildings(cls, buildings: Sequence[Building]) -> "CoordinateStore":
+        return cls.from_points((b.id, b.latitude, b.longitude) for b in buildings)
+
+    @classmethod
+    def concatenate(cls, stores: Sequence["CoordinateStore"]) -> "CoordinateStore":
+        if not stores:
+            return cls.from_points(())
+        return cls(
+            np.concatenate([s.ids for s in stores]),
+            np.concatenate([s.lats for s in stores]),
+            np.concatenate([s.lons for s in stores]),
+        )
+
+    def in_box_area(self, area: BoxArea) -> IdArray:
+        return self.ids[box_area_mask(self.lats, self.lons, area)]
+
+    def in_circle_area(self, area: CircleArea) -> IdArray:
+        return self.ids[circle_area_mask(self.lats, self.lons, area)]
+
+
+def morton_codes(xs: IdArray, ys: IdArray) -> IdArray:
+    """Bits of x and y interleaved. The tiles of a cell at a lower zoom get consecutive codes."""
+    def spread(v: IdArray) -> npt.NDArray[np.uint64]:
+        u: npt.NDArray[np.uint64] = v.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+        for shift, mask in (
+            (16, 0x0000FFFF0000FFFF),
+            (8, 0x00FF00FF00FF00FF),
+            (4, 0x0F0F0F0F0F0F0F0F),
+            (2, 0x3333333333333333),
+            (1, 0x5555555555555555),
+        ):
+            u = (u | (u << np.uint64(shift))) & np.uint64(mask)
+        return u
+
+    return (spread(xs) | (spread(ys) << np.uint64(1))).astype(np.int64)
+
+
+class TileClusters:
+    """Buildings ordered by the Morton code of their tile, with running sums of their coordinates
+    and organization counts. The buildings of a cell at any zoom are a contiguous run, so a cell
+    is aggregated by two binary searches, whatever the number of its buildings.
+    """
+
+    def __init__(
+        self,
+        codes: IdArray,
+        lat_sums: FloatArray,
+        lon_sums: FloatArray,
+        organization_sums: IdArray,
+    ):
+        self.codes: IdArray = codes  # sorted
+        # n + 1 items, from 0
+        self.lat_sums: FloatArray = lat_sums
+        self.lon_sums: FloatArray = lon_sums
+        self.organization_sums: IdArray = organization_sums
+
+    @classmethod
+    def build(
+        cls,
+        tile_xs: IdArray,
+        tile_ys: IdArray,
+        lats: FloatArray,
+        lons: FloatArray,
+        organization_counts: IdArray,
+    ) -> "TileClusters":
+        codes = morton_codes(np.asarray(tile_xs, dtype=np.int64), np.asarray(tile_ys, dtype=np.int64))
+        order = np.argsort(codes, kind="stable")
+
+        def running_sum(values: npt.ArrayLike, dtype: type[np.float64] | type[np.int64]) -> npt.NDArray[Any]:
+            sums = np.zeros(len(order) + 1, dtype=dtype)
+            np.cumsum(np.asarray(values, dtype=dtype)[order], out=sums[1:])
+            return sums
+
+        return cls(
+            codes[order],
+            running_sum(lats, np.float64),
+            running_sum(lons, np.float64),
+            running_sum(organization_counts, np.int64),
+        )
+
+    def cells(self, grid: ClusterGrid) -> list[dict[str, Any]]:
+        """Non-empty cells of the grid, by rows from the north, shaped as BuildingClusterSchema."""
+        ys, xs = np.mgrid[grid.y1:grid.y2 + 1, grid.x1:grid.x2 + 1].reshape(2, -1)
+        shift = 2 * (CLUSTER_TILE_ZOOM - grid.zoom)
+        starts = morton_codes(xs, ys) << shift
+        first = np.searchsorted(self.codes, starts)
+        end = np.searchsorted(self.codes, starts + (1 << shift))
+        counts = end - first
+        found = counts > 0
+        first, end, counts = first[found], end[found], counts[found]
+        return [
+            {"x": x, "y": y, "latitude": lat, "longitude": lon, "buildings": n, "organizations": organizations}
+            for x, y, lat, lon, n, organizations in zip(
+                xs[found].tolist(),
+                ys[found].tolist(),
+                ((self.lat_sums[end] - self.lat_sums[first]) / counts).tolist(),
+                ((self.lon_sums[end] - self.lon_sums[first]) / counts).tolist(),
+                counts.tolist(),
+                (self.organization_sums[end] - self.organization_sums[first]).tolist(),
+            )
+        ]
@@ -0,0 +1,148 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+from math import floor
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from constants import BUILDING_INDEX_CELL_SIZE
+from geo_arrays import CoordinateStore
+from models import Building
+from schemas import BoxArea, CircleArea
+from utils import box_area_bounds, circle_area_bounds, parse_coordinates
+
+
+Cell = tuple[int, int]
+Point = tuple[int, float, float]  # id, lat, lon
+
+
+class BuildingIndex:
+    """Uniform lat/lon grid over building coordinates.
+
+    A query visits only the cells overlapping the area's bounding box, so its cost
+    depends on the area size and the number of matches, not on the number of buildings.
+    Points of the visited cells are filtered in one vectorized call.
+    """
+
+    def __init__(self, cell_size: float = BUILDING_INDEX_CELL_SIZE):
+        self._cell_size: float = cell_size
+        self._cells: dict[Cell, dict[int, tuple[float, float]]] = {}
+        self._points: dict[int, tuple[float, float]] = {}
+        self._cell_stores: dict[Cell, CoordinateStore] = {}
+        self._build_lock: asyncio.Lock = asyncio.Lock()
+        self.is_built: bool = False
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lon: float) -> Cell:
+        return floor(lat / self._cell_size), floor(lon / self._cell_size)
+
+    async def ensure_built(self, load_points: Callable[[], Awaitable[Iterable[Point]]]) -> None:
+        if self.is_built:
+            return
+        async with self._build_lock:
+            if not self.is_built:
+                self.build(await load_points())
+
+    def invalidate(self) -> None:
+        """The next query rebuilds the index, e.g. after the buildings were changed by another process."""
+        self.is_built = False
+
+    def build(self, points: Iterable[Point]) -> None:
+        self._cells = {}
+        self._points = {}
+        self._cell_stores = {}
+        for building_id, lat, lon in points:
+            self.upsert(building_id, lat, lon)
+        self.is_built = True
+
+    def upsert(self, building_id: int, lat: float, lon: float) -> None:
+        self.remove(building_id)
+        self._points[building_id] = (lat, lon)
+        cell = self._cell(lat, lon)
+        self._cells.setdefault(cell, {})[building_id] = (lat, lon)
+        self._cell_stores.pop(cell, None)
+
+    def remove(self, building_id: int) -> None:
+        point = self._points.pop(building_id, None)
+        if point is None:
+            return
+        cell = self._cell(*point)
+        del self._cells[cell][building_id]
+        self._cell_stores.pop(cell, None)
+        if not self._cells[cell]:
+            del self._cells[cell]
+
+    def _cell_store(self, cell: Cell) -> CoordinateStore:
+        store = self._cell_stores.get(cell)
+        if store is None:
+            store = CoordinateStore.from_points(
+                (building_id, lat, lon) for building_id, (lat, lon) in self._cells[cell].items()
+            )
+            self._cell_stores[cell] = store
+        return store
+
+    def _candidates(self, bounds: tuple[float, float, float, float]) -> CoordinateStore:
+        min_lat, min_lon, max_lat, max_lon = bounds
+        min_row, min_col = self._cell(min_lat, min_lon)
+        max_row, max_col = self._cell(max_lat, max_lon)
+
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            cells = [
+                (row, col) for row, col in self._cells
+                if min_row <= row <= max_row and min_col <= col <= max_col
+            ]
+        else:
+            cells = [
+                (row, col)
+                for row in range(min_row, max_row + 1)
+                for col in range(min_col, max_col + 1)
+                if (row, col) in self._cells
+            ]
+        return CoordinateStore.concatenate([self._cell_store(cell) for cell in cells])
+
+    def query_box(self, area: BoxArea) -> list[int]:
+        res = self._candidates(box_area_bounds(area)).in_box_area(area)
+        return sorted(res.tolist())
+
+    def query_circle(self, area: CircleArea) -> list[int]:
+        res = self._candidates(circle_area_bounds(area)).in_circle_area(area)
+        return sorted(res.tolist())
+
+
+building_index = BuildingIndex()
+
+
+# -------------- Keeping the index in sync with committed changes --------------
+_CHANGES_KEY = "building_index_changes"
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_building_changes(session: Session, _: Any) -> None:
+    changes: dict[int, tuple[float, float] | None] = session.info.setdefault(_CHANGES_KEY, {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Building):
+            # Latitude and longitude are expired here, set by the database, reading them is a query
+            changes[obj.id] = parse_coordinates(obj.coordinates)
+    for obj in session.deleted:
+        if isinstance(obj, Building):
+            changes[obj.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_building_changes(session: Session) -> None:
+    changes: dict[int, tuple[float, float] | None] = session.info.pop(_CHANGES_KEY, {})
+    if not building_index.is_built:
+        return
+    for building_id, point in changes.items():
+        if point is None:
+            building_index.remove(building_id)
+        else:
+            building_index.upsert(building_id, *point)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_building_changes(session: Session) -> None:
+    session.info.pop(_CHANGES_KEY, None)
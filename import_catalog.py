@@ -0,0 +1,259 @@
+"""Bulk import of a catalog from CSV or JSONL files with PostgreSQL COPY.
+
+    python -m import_catalog [--buildings FILE] [--practices FILE] [--organizations FILE] [--batch-size 10000]
+
+Rows carry their own ids and rows that already exist are updated, so an import can be re-run.
+The format is chosen by the file extension: .csv (with a header row, lists separated by ";")
+or .jsonl (one object per line). Fields:
+
+    buildings:      id, address, coordinates ("lat,lon")
+    practices:      id, name, parent_id (empty for a root)
+    organizations:  id, name, phone_numbers, building_id, practice_ids
+
+Practices of an imported organization are replaced with the ones from the file.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import time
+from collections.abc import AsyncIterator, Iterable, Iterator
+from pathlib import Path
+from typing import Any
+
+from asyncpg import Connection
+
+from database import engine
+
+
+Record = tuple[Any, ...]
+
+
+def read_records(path: Path) -> Iterator[dict[str, Any]]:
+    with path.open(encoding="utf-8", newline="") as f:
+        if path.suffix == ".csv":
+            yield from csv.DictReader(f)
+        elif path.suffix == ".jsonl":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            raise ValueError(f"Unsupported file format: {path}")
+
+
+def _optional_int(value: Any) -> int | None:
+    return None if value in (None, "") else int(value)
+
+
+def _str_list(value: Any) -> list[str]:
+    if isinstance(value, list):
+        return [str(v) for v in value]  # pyright:ignore[reportUnknownVariableType, reportUnknownArgumentType]
+    return [v.strip() for v in str(value or "").split(";") if v.strip()]
+
+
+def building_record(row: dict[str, Any]) -> Record:
+    return int(row["id"]), row["address"], row["coordinates"]
+
+
+def sort_practices_by_depth(rows: Iterable[dict[str, Any]]) -> list[tuple[int, str, int | None, int]]:
+    """(id, name, parent_id, depth) with parents before children.
+
+    The practice triggers read the parent row, so a parent has to be inserted first.
+    Depth is counted from the topmost practice of the file, whose parent may already be in the database.
+    """
+    practices = {int(row["id"]): (row["name"], _optional_int(row.get("parent_id"))) for row in rows}
+    depths: dict[int, int] = {}
+
+    def depth(practice_id: int) -> int:
+        chain: list[int] = []
+        while practice_id in practices and practice_id not in depths:
+            if practice_id in chain:
+                raise ValueError(f"Practice {practice_id} is its own ancestor")
+            chain.append(practice_id)
+            practice_id = practices[practice_id][1]  # pyright:ignore[reportAssignmentType]
+        base = depths.get(practice_id, -1)
+        for i, chained_id in enumerate(reversed(chain), start=1):
+            depths[chained_id] = base + i
+        return depths[chain[0]] if chain else base
+
+    res = [(practice_id, name, parent_id, depth(practice_id)) for practice_id, (name, parent_id) in practices.items()]
+    return sorted(res, key=lambda p: p[3])
+
+
+async def copy_in_batches(
+    conn: Connection,
+    table: str,
+    columns: list[str],
+    records: Iterable[Record],
+    batch_size: int,
+) -> int:
+    count = 0
+    batch: list[Record] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await conn.copy_records_to_table(table, records=batch, columns=columns)
+            count += len(batch)
+            batch = []
+    if batch:
+        await conn.copy_records_to_table(table, records=batch, columns=columns)
+        count += len(batch)
+    return count
+
+
+async def import_buildings(conn: Connection, path: Path, batch_size: int) -> int:
+    # Latitude, longitude and the tiles are set from coordinates by the database, see models.Building
+    await conn.execute("""
+        CREATE TEMP TABLE import_building (
+            id integer, address varchar, coordinates varchar
+        ) ON COMMIT DROP
+    """)
+    count = await copy_in_batches(
+        conn,
+        "import_building",
+        ["id", "address", "coordinates"],
+        (building_record(row) for row in read_records(path)),
+        batch_size,
+    )
+    await conn.execute("""
+        INSERT INTO building (id, address, coordinates)
+        SELECT id, address, coordinates FROM import_building
+        ON CONFLICT (id) DO UPDATE
+        SET address = EXCLUDED.address,
+            coordinates = EXCLUDED.coordinates
+        WHERE (building.address, building.coordinates) IS DISTINCT FROM (EXCLUDED.address, EXCLUDED.coordinates)
+    """)
+    return count
+
+
+async def import_practices(conn: Connection, path: Path, batch_size: int) -> int:
+    practices = sort_practices_by_depth(read_records(path))
+    await conn.execute("""
+        CREATE TEMP TABLE import_practice (
+            id integer, name varchar, parent_id integer, depth integer
+        ) ON COMMIT DROP
+    """)
+    await copy_in_batches(conn, "import_practice", ["id", "name", "parent_id", "depth"], practices, batch_size)
+    # One statement per level, so the row triggers always find the parent's closure rows and path
+    for depth in range(practices[-1][3] + 1 if practices else 0):
+        await conn.execute("""
+            INSERT INTO practice (id, name, parent_id)
+            SELECT id, name, parent_id FROM import_practice WHERE depth = $1
+            ON CONFLICT (id) DO UPDATE
+            SET name = EXCLUDED.name,
+                parent_id = EXCLUDED.parent_id
+            WHERE (practice.name, practice.parent_id) IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.parent_id)
+        """, depth)
+    return len(practices)
+
+
+async def import_organizations(conn: Connection, path: Path, batch_size: int) -> int:
+    await conn.execute("CREATE TEMP TABLE import_organization (LIKE organization) ON COMMIT DROP")
+    await conn.execute("""
+        CREATE TEMP TABLE import_organization_practice (
+            organization_id integer, practice_id integer
+        ) ON COMMIT DROP
+    """)
+    links: list[Record] = []
+
+    def organization_records() -> Iterator[Record]:
+        for row in read_records(path):
+            organization_id = int(row["id"])
+            links.extend((organization_id, int(p)) for p in _str_list(row.get("practice_ids")))
+            yield organization_id, row["name"], _str_list(row.get("phone_numbers")), int(row["building_id"])
+
+    async def flush_links() -> None:
+        await conn.copy_records_to_table(
+            "import_organization_practice",
+            records=links,
+            columns=["organization_id", "practice_id"],
+        )
+        links.clear()
+
+    count = 0
+    batch: list[Record] = []
+    for record in organization_records():
+        batch.append(record)
+        if len(batch) >= batch_size:
+            await conn.copy_records_to_table("import_organization", records=batch)
+            await flush_links()
+            count += len(batch)
+            batch = []
+    if batch:
+        await conn.copy_records_to_table("import_organization", records=batch)
+        count += len(batch)
+    await flush_links()
+
+    await conn.execute("""
+        INSERT INTO organization (id, name, phone_numbers, building_id)
+        SELECT id, name, phone_numbers, building_id FROM import_organization
+        ON CONFLICT (id) DO UPDATE
+        SET name = EXCLUDED.name,
+            phone_numbers = EXCLUDED.phone_numbers,
+            building_id = EXCLUDED.building_id
+        WHERE (organization.name, organization.phone_numbers, organization.building_id)
+            IS DISTINCT FROM (EXCLUDED.name, EXCLUDED.phone_numbers, EXCLUDED.building_id)
+    """)
+    await conn.execute("""
+        DELETE FROM organization_practice
+        USING import_organization
+        WHERE organization_practice.organization_id = import_organization.id
+          AND NOT EXISTS (
+              SELECT 1 FROM import_organization_practice AS link
+              WHERE link.organization_id = organization_practice.organization_id
+                AND link.practice_id = organization_practice.practice_id
+          )
+    """)
+    await conn.execute("""
+        INSERT INTO organization_practice (organization_id, practice_id)
+        SELECT DISTINCT organization_id, practice_id FROM import_organization_practice
+        ON CONFLICT DO NOTHING
+    """)
+    return count
+
+
+async def import_catalog(
+    buildings: Path | None,
+    practices: Path | None,
+    organizations: Path | None,
+    batch_size: int,
+) -> AsyncIterator[tuple[str, int, float]]:
+    """Imports everything in one transaction, yields (table, rows, seconds) as each file is loaded."""
+    async with engine.connect() as sa_conn:
+        raw = await sa_conn.get_raw_connection()
+        conn: Connection = raw.driver_connection  # pyright:ignore[reportAssignmentType]
+        async with conn.transaction():
+            for table, path, load in (
+                ("building", buildings, import_buildings),
+                ("practice", practices, import_practices),
+                ("organization", organizations, import_organizations),
+            ):
+                if path is None:
+                    continue
+                start = time.perf_counter()
+                count = await load(conn, path, batch_size)
+                # Rows were inserted with explicit ids
+                await conn.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))"
+                )
+                yield table, count, time.perf_counter() - start
+        await conn.execute("ANALYZE building, practice, organization, organization_practice")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--buildings", type=Path)
+    parser.add_argument("--practices", type=Path)
+    parser.add_argument("--organizations", type=Path)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    async for table, count, seconds in import_catalog(args.buildings, args.practices, args.organizations, args.batch_size):
+        print(f"{table:>12}: {count:>10} rows in {seconds:8.2f} s ({count / max(seconds, 1e-9):>10.0f} rows/s)")
+    print(f"{'total':>12}: {time.perf_counter() - start:.2f} s")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,11 +1,15 @@
+import pathlib
 from contextlib import asynccontextmanager
 from typing import Annotated
 
-from fastapi import Depends, FastAPI, Path, Query
+from fastapi import Depends, FastAPI, Path, Query, Response
 
+from config import settings
 from database import async_session_maker
 from dependencies import area_query, get_service, verify_api_key
 from init_database import is_db_data_present, populate_db
+from metrics import record_request_metrics, render_metrics
+from read_model import read_model
 from routes.router import router
 from schemas import (
     BoxArea,
@@ -15,15 +19,24 @@ from schemas import (
     OrganizationSchema,
 )
 from service import SecundaService
+from snapshot_file import mapped_read_model
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):  # pyright:ignore[reportUnusedParameter]
-    async with async_session_maker() as session:
-        if not await is_db_data_present(session):
-            print("No data found. Populating DB...")
-            await populate_db(session)
+    if settings.READ_MODEL_FILE:
+        # The loader writing the file has the database populated
+        await mapped_read_model.start(pathlib.Path(settings.READ_MODEL_FILE))
+    else:
+        async with async_session_maker() as session:
+            if not await is_db_data_present(session):
+                print("No data found. Populating DB...")
+                await populate_db(session)
+        if settings.READ_MODEL_ENABLED:
+            await read_model.start()
     yield
+    await read_model.stop()
+    await mapped_read_model.stop()
 
 
 tags_metadata = [
@@ -39,7 +52,17 @@ tags_metadata = [
         "name": "organizations",
         "description": "Методы для вывода информации об организациях.",
     },
+    {
+        "name": "service",
+        "description": "Служебные методы.",
+    },
 ]
 
 app = FastAPI(lifespan=lifespan, openapi_tags=tags_metadata)
+app.middleware("http")(record_request_metrics)
 app.include_router(router)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    return render_metrics()
@@ -0,0 +1,192 @@
+import logging
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Generator, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import Request, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+from prometheus_client.registry import Collector
+from sqlalchemy import Engine, event
+
+from cache import cache_stats
+from config import settings
+from database import pool_stats
+
+
+logger = logging.getLogger(__name__)
+
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+_STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time until the response headers are sent",
+    ["method", "route", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUEST_DB_STATEMENTS = Histogram(
+    "http_request_db_statements",
+    "SQL statements executed per request",
+    ["route"],
+    buckets=_STATEMENT_BUCKETS,
+)
+REQUEST_DB_DURATION = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent executing SQL statements per request",
+    ["route"],
+    buckets=_LATENCY_BUCKETS,
+)
+REQUEST_SERIALIZATION_DURATION = Histogram(
+    "http_request_serialization_duration_seconds",
+    "Time spent serializing the response body per request, for routes measuring it (see measure_serialization)",
+    ["route"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time: float = 0
+    serialization_time: float = 0
+    serialization_measured: bool = False  # the service routes leave it to FastAPI, unmeasured
+    sql: list[str] = field(default_factory=list[str])  # only collected for slow request logging
+
+
+_request_stats: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def measure_serialization() -> Generator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.serialization_time += time.perf_counter() - start
+            stats.serialization_measured = True
+
+
+# -------------- SQL statements --------------
+_STATEMENT_START_KEY = "metrics_statement_start"
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_statement(conn: Any, cursor: Any, statement: str, *_: Any) -> None:
+    if _request_stats.get() is not None:
+        conn.info.setdefault(_STATEMENT_START_KEY, []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_statement(conn: Any, cursor: Any, statement: str, *_: Any) -> None:
+    stats = _request_stats.get()
+    if stats is None or not conn.info.get(_STATEMENT_START_KEY):
+        return
+    stats.statements += 1
+    stats.db_time += time.perf_counter() - conn.info[_STATEMENT_START_KEY].pop()
+    if settings.METRICS_SLOW_REQUEST_SECONDS is not None:
+        stats.sql.append(statement)
+
+
+# -------------- Middleware --------------
+async def record_request_metrics(request: Request, call_next: Callable[[Request], Awaitable[Response]]) -> Response:
+    stats = RequestStats()
+    token = _request_stats.set(stats)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _request_stats.reset(token)
+    duration = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    route_path: str = getattr(route, "path", "unmatched")
+    if route_path == "/metrics":
+        return response
+    REQUEST_DURATION.labels(request.method, route_path, response.status_code).observe(duration)
+    # The body is sent after the headers, an NDJSON export runs its queries and serialization meanwhile
+    body: AsyncIterator[bytes] | None = getattr(response, "body_iterator", None)
+    if body is None:
+        _record_request_stats(request, route_path, stats, duration)
+    else:
+        response.body_iterator = _recorded_body(  # pyright:ignore[reportAttributeAccessIssue]
+            body, request, route_path, stats, start
+        )
+    return response
+
+
+async def _recorded_body(
+    body: AsyncIterator[bytes],
+    request: Request,
+    route_path: str,
+    stats: RequestStats,
+    start: float,
+) -> AsyncIterator[bytes]:
+    try:
+        async for chunk in body:
+            yield chunk
+    finally:
+        _record_request_stats(request, route_path, stats, time.perf_counter() - start)
+
+
+def _record_request_stats(request: Request, route_path: str, stats: RequestStats, duration: float) -> None:
+    """duration is until the whole body was sent."""
+    REQUEST_DB_STATEMENTS.labels(route_path).observe(stats.statements)
+    REQUEST_DB_DURATION.labels(route_path).observe(stats.db_time)
+    if stats.serialization_measured:
+        REQUEST_SERIALIZATION_DURATION.labels(route_path).observe(stats.serialization_time)
+
+    slow = settings.METRICS_SLOW_REQUEST_SECONDS
+    if slow is not None and duration >= slow:
+        logger.warning(
+            "Slow request %s %s: %.3f s, %d statements in %.3f s, serialization %s\n%s",
+            request.method,
+            request.url.path,
+            duration,
+            stats.statements,
+            stats.db_time,
+            f"{stats.serialization_time:.3f} s" if stats.serialization_measured else "not measured",
+            "\n".join(f"  {sql}" for sql in stats.sql),
+        )
+
+
+# -------------- Cache and pool gauges --------------
+class ServiceCollector(Collector):
+    """Exposes cache_stats() and pool_stats() as they are at scrape time."""
+
+    def collect(self) -> Iterator[Metric]:
+        yield from _families("service_cache", "method", cache_stats(), ("size",), ("hits", "misses", "evictions"))
+        yield from _families(
+            "db_pool",
+            "pool",
+            pool_stats(),
+            ("size", "checked_out", "overflow", "wait_time_avg", "wait_time_max", "connect_time_avg", "connect_time_max"),
+            ("checkouts", "timeouts", "connects"),
+        )
+
+
+def _families(
+    prefix: str,
+    label: str,
+    stats: dict[str, dict[str, int | float]],
+    gauges: tuple[str, ...],
+    counters: tuple[str, ...],
+) -> Iterator[Metric]:
+    for stat in gauges + counters:
+        family_type = GaugeMetricFamily if stat in gauges else CounterMetricFamily
+        family = family_type(f"{prefix}_{stat}", f"{prefix} {stat}".replace("_", " "), labels=[label])
+        for key, values in stats.items():
+            family.add_metric([key], values[stat])
+        yield family
+
+
+REGISTRY.register(ServiceCollector())
+
+
+def render_metrics() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
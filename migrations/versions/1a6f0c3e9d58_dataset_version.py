@@ -0,0 +1,57 @@
+"""Dataset version counter
+
+Revision ID: 1a6f0c3e9d58
+Revises: e7c41d5b8a26
+Create Date: 2026-10-18 15:02:37.210684
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '1a6f0c3e9d58'
+down_revision: Union[str, Sequence[str], None] = 'e7c41d5b8a26'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CATALOG_TABLES = ('building', 'organization', 'practice', 'organization_practice')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('dataset_version',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Start from the current time in ms, so versions do not repeat after the database is recreated
+    op.execute("INSERT INTO dataset_version (id, version) VALUES (1, (extract(epoch FROM now()) * 1000)::bigint)")
+
+    op.execute("""
+        CREATE FUNCTION dataset_version_bump() RETURNS trigger AS $$
+        DECLARE
+            new_version bigint;
+        BEGIN
+            UPDATE dataset_version SET version = version + 1 WHERE id = 1
+            RETURNING version INTO new_version;
+            PERFORM pg_notify('catalog_changed', new_version::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table in CATALOG_TABLES:
+        op.execute(f"""
+            CREATE TRIGGER {table}_dataset_version_bump
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION dataset_version_bump()
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in CATALOG_TABLES:
+        op.execute(f"DROP TRIGGER {table}_dataset_version_bump ON {table}")
+    op.execute("DROP FUNCTION dataset_version_bump()")
+    op.drop_table('dataset_version')
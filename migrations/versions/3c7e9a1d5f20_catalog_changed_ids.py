@@ -0,0 +1,99 @@
+"""Changed table and row ids in catalog_changed notifications
+
+Revision ID: 3c7e9a1d5f20
+Revises: 80de38416330
+Create Date: 2026-10-18 18:40:05.316942
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '3c7e9a1d5f20'
+down_revision: Union[str, Sequence[str], None] = '80de38416330'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Table -> column identifying the changed rows for listeners
+CATALOG_TABLES = {
+    'building': 'id',
+    'organization': 'id',
+    'practice': 'id',
+    'organization_practice': 'organization_id',
+}
+# Notification payloads are limited to 8000 bytes
+MAX_NOTIFIED_IDS = 500
+
+
+def _create_dataset_version_bump(payload: str) -> None:
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION dataset_version_bump() RETURNS trigger AS $$
+        DECLARE
+            new_version bigint;
+        BEGIN
+            UPDATE dataset_version SET version = version + 1 WHERE id = 1
+            RETURNING version INTO new_version;
+            PERFORM pg_notify('catalog_changed', {payload});
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Without ids: the whole table changed
+    _create_dataset_version_bump("json_build_object('version', new_version, 'table', TG_TABLE_NAME)::text")
+    op.execute(f"""
+        CREATE FUNCTION catalog_changed() RETURNS trigger AS $$
+        DECLARE
+            ids integer[];
+            new_version bigint;
+        BEGIN
+            EXECUTE format('SELECT array_agg(DISTINCT %I) FROM changed_rows', TG_ARGV[0]) INTO ids;
+            IF ids IS NULL THEN
+                RETURN NULL;
+            END IF;
+            UPDATE dataset_version SET version = version + 1 WHERE id = 1
+            RETURNING version INTO new_version;
+            PERFORM pg_notify('catalog_changed', json_build_object(
+                'version', new_version,
+                'table', TG_TABLE_NAME,
+                'ids', CASE WHEN cardinality(ids) <= {MAX_NOTIFIED_IDS} THEN ids END
+            )::text);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    for table, key in CATALOG_TABLES.items():
+        op.execute(f"DROP TRIGGER {table}_dataset_version_bump ON {table}")
+        op.execute(f"""
+            CREATE TRIGGER {table}_dataset_version_bump
+            AFTER TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION dataset_version_bump()
+        """)
+        # A trigger with a transition table fires on one event only.
+        # Updates report the new rows, ids of catalog rows are never changed.
+        for event, transition in (('insert', 'NEW'), ('update', 'NEW'), ('delete', 'OLD')):
+            op.execute(f"""
+                CREATE TRIGGER {table}_catalog_changed_{event}
+                AFTER {event.upper()} ON {table}
+                REFERENCING {transition} TABLE AS changed_rows
+                FOR EACH STATEMENT EXECUTE FUNCTION catalog_changed('{key}')
+            """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table in CATALOG_TABLES:
+        for event in ('insert', 'update', 'delete'):
+            op.execute(f"DROP TRIGGER {table}_catalog_changed_{event} ON {table}")
+        op.execute(f"DROP TRIGGER {table}_dataset_version_bump ON {table}")
+        op.execute(f"""
+            CREATE TRIGGER {table}_dataset_version_bump
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON {table}
+            FOR EACH STATEMENT EXECUTE FUNCTION dataset_version_bump()
+        """)
+    op.execute("DROP FUNCTION catalog_changed()")
+    _create_dataset_version_bump("new_version::text")
@@ -0,0 +1,38 @@
+"""Building latitude/longitude columns
+
+Revision ID: 4f1c2a7d9e3b
+Revises: c9b3d8b5eb9b
+Create Date: 2026-10-18 10:12:04.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '4f1c2a7d9e3b'
+down_revision: Union[str, Sequence[str], None] = 'c9b3d8b5eb9b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('building', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('building', sa.Column('longitude', sa.Float(), nullable=True))
+    op.execute(
+        "UPDATE building SET "
+        "latitude = split_part(coordinates, ',', 1)::double precision, "
+        "longitude = split_part(coordinates, ',', 2)::double precision"
+    )
+    op.alter_column('building', 'latitude', nullable=False)
+    op.alter_column('building', 'longitude', nullable=False)
+    op.create_index('ix_building_latitude_longitude', 'building', ['latitude', 'longitude'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_building_latitude_longitude', table_name='building')
+    op.drop_column('building', 'longitude')
+    op.drop_column('building', 'latitude')
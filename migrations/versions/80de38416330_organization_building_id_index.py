@@ -0,0 +1,26 @@
+"""Index on organization building_id
+
+Revision ID: 80de38416330
+Revises: 1a6f0c3e9d58
+Create Date: 2026-10-18 17:12:44.508127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '80de38416330'
+down_revision: Union[str, Sequence[str], None] = '1a6f0c3e9d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_organization_building_id', 'organization', ['building_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_organization_building_id', table_name='organization')
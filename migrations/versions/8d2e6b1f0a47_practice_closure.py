@@ -0,0 +1,102 @@
+"""Practice closure table
+
+Revision ID: 8d2e6b1f0a47
+Revises: 4f1c2a7d9e3b
+Create Date: 2026-10-18 11:40:27.604915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '8d2e6b1f0a47'
+down_revision: Union[str, Sequence[str], None] = '4f1c2a7d9e3b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('practice_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['practice.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['descendant_id'], ['practice.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_practice_closure_descendant_id', 'practice_closure', ['descendant_id'], unique=False)
+    op.create_index('ix_organization_practice_practice_id', 'organization_practice', ['practice_id'], unique=False)
+
+    op.execute("""
+        INSERT INTO practice_closure (ancestor_id, descendant_id, depth)
+        WITH RECURSIVE tree AS (
+            SELECT id AS ancestor_id, id AS descendant_id, 0 AS depth FROM practice
+            UNION ALL
+            SELECT tree.ancestor_id, practice.id, tree.depth + 1
+            FROM tree JOIN practice ON practice.parent_id = tree.descendant_id
+        )
+        SELECT ancestor_id, descendant_id, depth FROM tree
+    """)
+
+    op.execute("""
+        CREATE FUNCTION practice_closure_insert() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO practice_closure (ancestor_id, descendant_id, depth)
+            SELECT ancestor_id, NEW.id, depth + 1
+            FROM practice_closure
+            WHERE descendant_id = NEW.parent_id
+            UNION ALL
+            SELECT NEW.id, NEW.id, 0;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER practice_closure_insert
+        AFTER INSERT ON practice
+        FOR EACH ROW EXECUTE FUNCTION practice_closure_insert()
+    """)
+
+    op.execute("""
+        CREATE FUNCTION practice_closure_move() RETURNS trigger AS $$
+        BEGIN
+            IF EXISTS (
+                SELECT 1 FROM practice_closure
+                WHERE ancestor_id = NEW.id AND descendant_id = NEW.parent_id
+            ) THEN
+                RAISE EXCEPTION 'practice % cannot be moved under its own descendant %', NEW.id, NEW.parent_id;
+            END IF;
+
+            DELETE FROM practice_closure
+            WHERE descendant_id IN (SELECT descendant_id FROM practice_closure WHERE ancestor_id = NEW.id)
+              AND ancestor_id NOT IN (SELECT descendant_id FROM practice_closure WHERE ancestor_id = NEW.id);
+
+            INSERT INTO practice_closure (ancestor_id, descendant_id, depth)
+            SELECT sup.ancestor_id, sub.descendant_id, sup.depth + sub.depth + 1
+            FROM practice_closure sup
+            CROSS JOIN practice_closure sub
+            WHERE sup.descendant_id = NEW.parent_id AND sub.ancestor_id = NEW.id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER practice_closure_move
+        AFTER UPDATE OF parent_id ON practice
+        FOR EACH ROW WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id)
+        EXECUTE FUNCTION practice_closure_move()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER practice_closure_move ON practice")
+    op.execute("DROP FUNCTION practice_closure_move()")
+    op.execute("DROP TRIGGER practice_closure_insert ON practice")
+    op.execute("DROP FUNCTION practice_closure_insert()")
+    op.drop_index('ix_organization_practice_practice_id', table_name='organization_practice')
+    op.drop_index('ix_practice_closure_descendant_id', table_name='practice_closure')
+    op.drop_table('practice_closure')
@@ -0,0 +1,51 @@
+"""Building latitude/longitude set from coordinates by a trigger
+
+Revision ID: 9a4d7c2e6b18
+Revises: 5b8e2f4a1c93
+Create Date: 2026-10-18 23:41:17.530264
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '9a4d7c2e6b18'
+down_revision: Union[str, Sequence[str], None] = '5b8e2f4a1c93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Not generated columns: tile_x and tile_y are generated from them, and a generated column
+    # can't refer to another one. Generated columns are computed after BEFORE triggers.
+    op.execute("""
+        CREATE FUNCTION building_lat_lon_set() RETURNS trigger AS $$
+        BEGIN
+            NEW.latitude := split_part(NEW.coordinates, ',', 1)::double precision;
+            NEW.longitude := split_part(NEW.coordinates, ',', 2)::double precision;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    # Any update, so latitude and longitude can't be set apart from coordinates either
+    op.execute("""
+        CREATE TRIGGER building_lat_lon_set
+        BEFORE INSERT OR UPDATE ON building
+        FOR EACH ROW EXECUTE FUNCTION building_lat_lon_set()
+    """)
+    op.execute("""
+        UPDATE building SET coordinates = coordinates
+        WHERE (latitude, longitude) IS DISTINCT FROM (
+            split_part(coordinates, ',', 1)::double precision,
+            split_part(coordinates, ',', 2)::double precision
+        )
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER building_lat_lon_set ON building")
+    op.execute("DROP FUNCTION building_lat_lon_set()")
@@ -0,0 +1,89 @@
+"""Practice level and path columns
+
+Revision ID: b5a93c0e7f12
+Revises: 8d2e6b1f0a47
+Create Date: 2026-10-18 12:55:48.093217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'b5a93c0e7f12'
+down_revision: Union[str, Sequence[str], None] = '8d2e6b1f0a47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('practice', sa.Column('level', sa.Integer(), nullable=True))
+    op.add_column('practice', sa.Column('path', sa.ARRAY(sa.Integer()), nullable=True))
+
+    op.execute("""
+        UPDATE practice
+        SET level = ancestors.level, path = ancestors.path
+        FROM (
+            SELECT descendant_id, max(depth) AS level, array_agg(ancestor_id ORDER BY depth DESC) AS path
+            FROM practice_closure
+            GROUP BY descendant_id
+        ) AS ancestors
+        WHERE practice.id = ancestors.descendant_id
+    """)
+    op.alter_column('practice', 'level', nullable=False)
+    op.alter_column('practice', 'path', nullable=False)
+
+    op.execute("""
+        CREATE FUNCTION practice_path_set() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.parent_id IS NULL THEN
+                NEW.level := 0;
+                NEW.path := ARRAY[NEW.id];
+            ELSE
+                SELECT level + 1, path || NEW.id
+                INTO NEW.level, NEW.path
+                FROM practice
+                WHERE id = NEW.parent_id;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER practice_path_set
+        BEFORE INSERT OR UPDATE OF parent_id ON practice
+        FOR EACH ROW EXECUTE FUNCTION practice_path_set()
+    """)
+
+    op.execute("""
+        CREATE FUNCTION practice_path_move() RETURNS trigger AS $$
+        BEGIN
+            UPDATE practice
+            SET level = practice.level - OLD.level + NEW.level,
+                path = NEW.path || practice.path[cardinality(OLD.path) + 1:]
+            FROM practice_closure
+            WHERE practice_closure.ancestor_id = NEW.id
+              AND practice_closure.depth > 0
+              AND practice.id = practice_closure.descendant_id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER practice_path_move
+        AFTER UPDATE OF parent_id ON practice
+        FOR EACH ROW WHEN (OLD.parent_id IS DISTINCT FROM NEW.parent_id)
+        EXECUTE FUNCTION practice_path_move()
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER practice_path_move ON practice")
+    op.execute("DROP FUNCTION practice_path_move()")
+    op.execute("DROP TRIGGER practice_path_set ON practice")
+    op.execute("DROP FUNCTION practice_path_set()")
+    op.drop_column('practice', 'path')
+    op.drop_column('practice', 'level')
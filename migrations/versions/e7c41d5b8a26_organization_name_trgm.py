@@ -0,0 +1,34 @@
+"""Trigram index on organization name
+
+Revision ID: e7c41d5b8a26
+Revises: b5a93c0e7f12
+Create Date: 2026-10-18 13:31:09.771540
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = 'e7c41d5b8a26'
+down_revision: Union[str, Sequence[str], None] = 'b5a93c0e7f12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.create_index(
+        'ix_organization_name_trgm',
+        'organization',
+        ['name'],
+        unique=False,
+        postgresql_using='gin',
+        postgresql_ops={'name': 'gin_trgm_ops'},
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_organization_name_trgm', table_name='organization', postgresql_using='gin')
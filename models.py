@@ -1,6 +1,6 @@
 from typing import Annotated
 
-from sqlalchemy import Column, ForeignKey, String, Table
+from sqlalchemy import BigInteger, Column, Computed, FetchedValue, ForeignKey, Index, Integer, String, Table
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import ARRAY
 
@@ -10,21 +10,61 @@ from database import Base
 
 int_pk = Annotated[int, mapped_column(primary_key=True)]
 str_array = Annotated[list[str], mapped_column(ARRAY(String))]
+# Columns computed by database triggers
+int_computed = Annotated[int, mapped_column(server_default=FetchedValue(), server_onupdate=FetchedValue())]
+float_computed = Annotated[float, mapped_column(server_default=FetchedValue(), server_onupdate=FetchedValue())]
+int_array_computed = Annotated[
+    list[int],
+    mapped_column(ARRAY(Integer), server_default=FetchedValue(), server_onupdate=FetchedValue()),
+]
 
 organization_practice_table = Table(
     "organization_practice",
     Base.metadata,
     Column("organization_id", ForeignKey("organization.id"), primary_key=True),  # pyright:ignore[reportUnknownArgumentType]
     Column("practice_id", ForeignKey("practice.id"), primary_key=True),  # pyright:ignore[reportUnknownArgumentType]
+    Index("ix_organization_practice_practice_id", "practice_id"),
+)
+
+# Every (ancestor, descendant) pair of the practice tree, including (id, id) with depth 0.
+# Maintained by triggers on "practice", see migration 8d2e6b1f0a47.
+practice_closure_table = Table(
+    "practice_closure",
+    Base.metadata,
+    Column("ancestor_id", ForeignKey("practice.id", ondelete="CASCADE"), primary_key=True),  # pyright:ignore[reportUnknownArgumentType]
+    Column("descendant_id", ForeignKey("practice.id", ondelete="CASCADE"), primary_key=True),  # pyright:ignore[reportUnknownArgumentType]
+    Column("depth", Integer, nullable=False),
+    Index("ix_practice_closure_descendant_id", "descendant_id"),
+)
+
+# Single row, bumped by statement triggers on every catalog table, see migrations 1a6f0c3e9d58 and 3c7e9a1d5f20.
+dataset_version_table = Table(
+    "dataset_version",
+    Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("version", BigInteger, nullable=False),
 )
 
 
 class Building(Base):
     __tablename__: str = "building"
+    __table_args__: tuple[Index, ...] = (
+        Index("ix_building_latitude_longitude", "latitude", "longitude"),
+        Index("ix_building_tile_x_tile_y", "tile_x", "tile_y"),
+    )
 
     id: Mapped[int_pk]
     address: Mapped[str]  # lat,lng, N.E.
     coordinates: Mapped[str]
+    # Parsed from coordinates, see migration 9a4d7c2e6b18
+    latitude: Mapped[float_computed]
+    longitude: Mapped[float_computed]
+    # Web mercator tile at CLUSTER_TILE_ZOOM, see migration 5b8e2f4a1c93 and utils.mercator_tile
+    tile_x: Mapped[int] = mapped_column(Computed("least(floor((longitude + 180) / 360 * 16777216), 16777215)::integer"))
+    tile_y: Mapped[int] = mapped_column(Computed(
+        "least(greatest(floor((1 - asinh(tan(radians(least(greatest(latitude, -85.0511287798), 85.0511287798))))"
+        " / pi()) / 2 * 16777216), 0), 16777215)::integer"
+    ))
 
     organizations: Mapped[list["Organization"]] = relationship(
         back_populates="building",
@@ -34,7 +74,16 @@ class Building(Base):
 
 class Organization(Base):
     __tablename__: str = "organization"
-    
+    __table_args__: tuple[Index, ...] = (
+        Index(
+            "ix_organization_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+        Index("ix_organization_building_id", "building_id"),
+    )
+
     id: Mapped[int_pk]
     name: Mapped[str]
     phone_numbers: Mapped[str_array]
@@ -53,6 +102,8 @@ class Practice(Base):
     id: Mapped[int_pk]
     name: Mapped[str]
     parent_id: Mapped[int | None] = mapped_column(ForeignKey("practice.id"))
+    level: Mapped[int_computed]
+    path: Mapped[int_array_computed]  # ids from the root down to this practice
 
     parent: Mapped["Practice | None"] = relationship(
         back_populates="children",
@@ -67,12 +118,3 @@ class Practice(Base):
         secondary=organization_practice_table,
         back_populates="practices",
     )
-
-    @property
-    def level(self):
-        level = 0
-        current = self.parent
-        while current:
-            level += 1
-            current = current.parent
-        return level
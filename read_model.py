@@ -0,0 +1,472 @@
+"""In-memory copy of the whole catalog, serving reads without a database round trip.
+
+Enabled by READ_MODEL_ENABLED. The snapshot is loaded at startup and kept up to date from
+catalog_changed notifications, which name the changed table and row ids (see migration 3c7e9a1d5f20):
+only those rows are read again and patched in. A notification without ids, or a lost listener
+connection, makes the whole catalog load again. The dataset version is also polled, so changes are
+picked up when notifications are not delivered at all, e.g. behind pgbouncer in transaction mode.
+"""
+import asyncio
+import json
+import logging
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from collections.abc import Iterable, Mapping
+from typing import Any
+
+import asyncpg
+import numpy as np
+from asyncpg import Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from constants import READ_MODEL_POLL_INTERVAL, READ_MODEL_REFRESH_DELAY
+from database import async_session_maker, engine
+from geo_arrays import TileClusters
+from geo_index import BuildingIndex
+from repository import Repository, get_dataset_version
+from schemas import ORGANIZATION_FIELDS
+from utils import trigram_words, trigrams
+
+
+logger = logging.getLogger(__name__)
+
+Item = dict[str, Any]
+
+CHANNEL = "catalog_changed"
+CATALOG_TABLES = ("building", "practice", "organization", "organization_practice")
+
+
+def _remove_sorted(ids: list[int], value: int) -> int | None:
+    """Removes value from a sorted list, returns the index it was at."""
+    i = bisect_left(ids, value)
+    if i < len(ids) and ids[i] == value:
+        del ids[i]
+        return i
+    return None
+
+
+def _cluster(
+    building_ids: list[int],
+    tiles: Mapping[int, tuple[int, int]],
+    points: Mapping[int, tuple[float, float]],
+    organization_counts: Mapping[int, int],
+) -> TileClusters:
+    tile_array = np.array([tiles[i] for i in building_ids], dtype=np.int64).reshape(-1, 2)
+    point_array = np.array([points[i] for i in building_ids], dtype=np.float64).reshape(-1, 2)
+    counts = np.array([organization_counts.get(i, 0) for i in building_ids], dtype=np.int64)
+    return TileClusters.build(tile_array[:, 0], tile_array[:, 1], point_array[:, 0], point_array[:, 1], counts)
+
+
+class CatalogSnapshot:
+    """The catalog as items shaped like the response schemas, with the indexes to find them.
+
+    Patched in place by the apply_* methods. They run on the event loop without awaiting,
+    so a request never sees a change half applied. The {"id", "name"} dicts nested in items are shared,
+    a renamed practice or organization is one dict to change. Id lists are sorted.
+    """
+
+    def __init__(self, version: int):
+        self.version: int = version
+
+        self.buildings: dict[int, Item] = {}
+        self.building_points: dict[int, tuple[float, float]] = {}
+        self.building_ids: list[int] = []
+        self.building_index: BuildingIndex = BuildingIndex()
+        self.building_tiles: dict[int, tuple[int, int]] = {}
+
+        self.practices: dict[int, Item] = {}
+        self.practice_ids: list[int] = []
+        self.descendants: defaultdict[int, set[int]] = defaultdict(set)  # a practice is its own descendant
+
+        self.organizations: dict[int, Item] = {}
+        self.organization_ids: list[int] = []
+        self.organization_names: dict[int, str] = {}  # lowercase, for substring search
+        # trigram_words of the name and the number of its trigrams, for ranking by similarity
+        self.organization_trigrams: dict[int, tuple[str, int]] = {}
+        self.organizations_in_building: defaultdict[int, list[int]] = defaultdict(list)
+        self.organizations_of_practice: defaultdict[int, list[int]] = defaultdict(list)
+
+        self._practice_refs: dict[int, Item] = {}
+        self._organization_refs: dict[int, Item] = {}
+
+        # Rebuilt whole after the buildings or organizations change, see ReadModel._patch
+        self.building_clusters: TileClusters = self.cluster_buildings()
+
+    @classmethod
+    def from_tables(
+        cls,
+        version: int,
+        buildings: Iterable[Any],
+        practices: Iterable[Any],
+        descendants: Iterable[Any],
+        organizations: Iterable[Any],
+        links: Iterable[Any],
+    ) -> "CatalogSnapshot":
+        """Rows as given by the Repository.list_catalog_* methods, ordered by id."""
+        snapshot = cls(version)
+        snapshot.apply_practices(practices, descendants)
+
+        for building_id, address, coordinates, lat, lon, tile_x, tile_y in buildings:
+            snapshot.buildings[building_id] = {"id": building_id, "address": address, "coordinates": coordinates}
+            snapshot.building_points[building_id] = (lat, lon)
+            snapshot.building_tiles[building_id] = (tile_x, tile_y)
+        snapshot.building_ids = list(snapshot.buildings)
+        snapshot.building_index.build((i, lat, lon) for i, (lat, lon) in snapshot.building_points.items())
+
+        for row in organizations:
+            snapshot._set_organization(*row)
+        snapshot.organization_ids = list(snapshot.organizations)
+
+        # Appending keeps the lists sorted, links come ordered by organization and practice
+        for organization_id, practice_id in links:
+            snapshot.organizations_of_practice[practice_id].append(organization_id)
+            snapshot.organizations[organization_id]["practices"].append(snapshot._practice_refs[practice_id])
+            snapshot.practices[practice_id]["organizations"].append(snapshot._organization_refs[organization_id])
+        snapshot.building_clusters = snapshot.cluster_buildings()
+        return snapshot
+
+    def cluster_buildings(self) -> TileClusters:
+        """Clusters of all buildings, a few hundred ms for a large catalog: run off the event loop."""
+        organization_counts = {i: len(self.organizations_in_building.get(i, ())) for i in self.building_ids}
+        return _cluster(self.building_ids, self.building_tiles, self.building_points, organization_counts)
+
+    def cluster_patched_buildings(
+        self,
+        building_ids: Iterable[int],
+        buildings: Iterable[Any],
+        organization_ids: Iterable[int],
+        organizations: Iterable[Any],
+    ) -> TileClusters:
+        """Clusters of all buildings as they are once apply_buildings and apply_organizations are
+        given these rows, the snapshot left as it is. Run off the event loop, the copies are taken
+        whole while requests only read.
+        """
+        tiles = dict(self.building_tiles)
+        points = dict(self.building_points)
+        rows = {row[0]: row for row in buildings}
+        for building_id in building_ids:
+            row = rows.get(building_id)
+            if row is None:
+                tiles.pop(building_id, None)
+                points.pop(building_id, None)
+            else:
+                points[building_id] = (row[3], row[4])
+                tiles[building_id] = (row[5], row[6])
+
+        organization_counts = Counter({i: len(ids) for i, ids in list(self.organizations_in_building.items())})
+        rows = {row[0]: row for row in organizations}
+        for organization_id in organization_ids:
+            item = self.organizations.get(organization_id)
+            if item is not None:
+                organization_counts[item["building_id"]] -= 1
+            row = rows.get(organization_id)
+            if row is not None:
+                organization_counts[row[3]] += 1
+        return _cluster(sorted(tiles), tiles, points, organization_counts)
+
+    def building_clusters_of(self, organization_ids: Iterable[int]) -> TileClusters:
+        """Clusters of the buildings of the given organizations, counting only them."""
+        counts = Counter(self.organizations[i]["building_id"] for i in organization_ids)
+        return _cluster(list(counts), self.building_tiles, self.building_points, counts)
+
+    def organization_items(
+        self,
+        organization_ids: Iterable[int],
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> list[Item]:
+        """The shared items with every field, copies with the given fields otherwise."""
+        organizations = self.organizations
+        if fields == ORGANIZATION_FIELDS:
+            return [organizations[i] for i in organization_ids]
+        return [{f: organizations[i][f] for f in fields} for i in organization_ids]
+
+    def organization_ids_with_name(self, search_substr: str) -> list[int]:
+        """Sorted ids of the organizations with the name containing search_substr, in any case."""
+        search_lower = search_substr.lower()
+        return [i for i in self.organization_ids if search_lower in self.organization_names[i]]
+
+    def organization_trigrams_with_name(self, search_substr: str) -> list[tuple[int, str, int]]:
+        """The same ids, with their organization_trigrams."""
+        return [(i, *self.organization_trigrams[i]) for i in self.organization_ids_with_name(search_substr)]
+
+    def apply_practices(self, practices: Iterable[Any], descendants: Iterable[Any]) -> None:
+        """Takes the whole practice table, it is small."""
+        seen: set[int] = set()
+        for practice_id, name, parent_id, level in practices:
+            seen.add(practice_id)
+            ref = self._practice_refs.setdefault(practice_id, {"id": practice_id})
+            ref["name"] = name
+            item = self.practices.get(practice_id)
+            if item is None:
+                refs = self._organization_refs
+                self.practices[practice_id] = {
+                    "id": practice_id,
+                    "name": name,
+                    "parent_id": parent_id,
+                    "level": level,
+                    "organizations": [refs[i] for i in self.organizations_of_practice.get(practice_id, ())],
+                }
+            else:
+                item.update(name=name, parent_id=parent_id, level=level)
+        for practice_id in self.practices.keys() - seen:
+            del self.practices[practice_id]
+            del self._practice_refs[practice_id]
+        self.practice_ids = sorted(self.practices)
+
+        self.descendants = defaultdict(set)
+        for ancestor_id, descendant_id in descendants:
+            self.descendants[ancestor_id].add(descendant_id)
+
+    def apply_buildings(self, building_ids: Iterable[int], buildings: Iterable[Any]) -> None:
+        """Current rows of the given buildings, the ones without a row were deleted."""
+        rows = {row[0]: row for row in buildings}
+        for building_id in building_ids:
+            row = rows.get(building_id)
+            if row is None:
+                if self.buildings.pop(building_id, None) is not None:
+                    del self.building_points[building_id]
+                    del self.building_tiles[building_id]
+                    _remove_sorted(self.building_ids, building_id)
+                    self.building_index.remove(building_id)
+                continue
+            _, address, coordinates, lat, lon, tile_x, tile_y = row
+            item = self.buildings.get(building_id)
+            if item is None:
+                self.buildings[building_id] = {"id": building_id, "address": address, "coordinates": coordinates}
+                insort(self.building_ids, building_id)
+            else:
+                item.update(address=address, coordinates=coordinates)
+            self.building_points[building_id] = (lat, lon)
+            self.building_tiles[building_id] = (tile_x, tile_y)
+            self.building_index.upsert(building_id, lat, lon)
+
+    def _set_organization(self, organization_id: int, name: str, phone_numbers: list[str], building_id: int) -> None:
+        ref = self._organization_refs.setdefault(organization_id, {"id": organization_id})
+        ref["name"] = name
+        item = self.organizations.get(organization_id)
+        if item is None:
+            self.organizations[organization_id] = {
+                "id": organization_id,
+                "name": name,
+                "phone_numbers": phone_numbers,
+                "building_id": building_id,
+                "practices": [],
+            }
+            insort(self.organizations_in_building[building_id], organization_id)
+        else:
+            if item["building_id"] != building_id:
+                _remove_sorted(self.organizations_in_building[item["building_id"]], organization_id)
+                insort(self.organizations_in_building[building_id], organization_id)
+            item.update(name=name, phone_numbers=phone_numbers, building_id=building_id)
+        self.organization_names[organization_id] = name.lower()
+        words = trigram_words(name)
+        self.organization_trigrams[organization_id] = (words, len(trigrams(words)))
+
+    def apply_organizations(self, organization_ids: Iterable[int], organizations: Iterable[Any]) -> None:
+        """Current rows of the given organizations, the ones without a row were deleted."""
+        rows = {row[0]: row for row in organizations}
+        for organization_id in organization_ids:
+            row = rows.get(organization_id)
+            if row is not None:
+                if organization_id not in self.organizations:
+                    insort(self.organization_ids, organization_id)
+                self._set_organization(*row)
+                continue
+            item = self.organizations.pop(organization_id, None)
+            if item is None:
+                continue
+            for practice in item["practices"]:
+                self._unlink(organization_id, practice["id"])
+            _remove_sorted(self.organizations_in_building[item["building_id"]], organization_id)
+            _remove_sorted(self.organization_ids, organization_id)
+            del self.organization_names[organization_id]
+            del self.organization_trigrams[organization_id]
+            del self._organization_refs[organization_id]
+
+    def _unlink(self, organization_id: int, practice_id: int) -> None:
+        i = _remove_sorted(self.organizations_of_practice[practice_id], organization_id)
+        if i is not None and practice_id in self.practices:
+            del self.practices[practice_id]["organizations"][i]
+
+    def apply_links(self, organization_ids: Iterable[int], links: Iterable[Any]) -> None:
+        """Current (organization_id, practice_id) rows of the given organizations."""
+        practice_ids: defaultdict[int, list[int]] = defaultdict(list)
+        for organization_id, practice_id in links:
+            practice_ids[organization_id].append(practice_id)
+        for organization_id in organization_ids:
+            item = self.organizations.get(organization_id)
+            if item is None:
+                continue
+            for practice in item["practices"]:
+                self._unlink(organization_id, practice["id"])
+            refs: list[Item] = []
+            item["practices"] = refs
+            for practice_id in practice_ids[organization_id]:
+                if practice_id not in self.practices:
+                    continue
+                of_practice = self.organizations_of_practice[practice_id]
+                i = bisect_left(of_practice, organization_id)
+                of_practice.insert(i, organization_id)
+                self.practices[practice_id]["organizations"].insert(i, self._organization_refs[organization_id])
+                refs.append(self._practice_refs[practice_id])
+
+
+async def _repeatable_read_session() -> AsyncSession:
+    # The rows and the version are read from one snapshot of the database
+    session = async_session_maker()
+    await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+    return session
+
+
+async def load_snapshot() -> CatalogSnapshot:
+    async with await _repeatable_read_session() as session:
+        repo = Repository(session)
+        version = await get_dataset_version(session)
+        tables = (
+            await repo.list_catalog_buildings(),
+            await repo.list_catalog_practices(),
+            await repo.list_practice_descendants(),
+            await repo.list_catalog_organizations(),
+            await repo.list_organization_practice_links(),
+        )
+    return await asyncio.to_thread(CatalogSnapshot.from_tables, version, *tables)
+
+
+class ReadModel:
+    def __init__(self):
+        self.snapshot: CatalogSnapshot | None = None
+        self._changed: defaultdict[str, set[int]] = defaultdict(set)  # table -> ids
+        self._reload: bool = False
+        self._wakeup: asyncio.Event = asyncio.Event()
+        self._refreshed: asyncio.Condition = asyncio.Condition()
+        self._listener: Connection | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    async def start(self) -> None:
+        await self._listen()
+        self.snapshot = await load_snapshot()
+        logger.info("Read model loaded, version %d", self.snapshot.version)
+        self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._listener is not None:
+            self._listener.terminate()
+            self._listener = None
+
+    async def wait_for_version(self, version: int | None) -> CatalogSnapshot:
+        """The snapshot as soon as its version is not the given one."""
+        async with self._refreshed:
+            await self._refreshed.wait_for(lambda: self.snapshot is not None and self.snapshot.version != version)
+            assert self.snapshot is not None
+            return self.snapshot
+
+    def _on_notification(self, conn: Any, pid: int, channel: str, payload: object) -> None:
+        # Not skipped by version: a patch of other rows may have read a newer one
+        try:
+            change = json.loads(str(payload))
+            table, ids = change["table"], change.get("ids")
+        except (ValueError, TypeError, KeyError):
+            table, ids = None, None
+        if table == "practice":
+            self._changed.setdefault(table, set())  # read whole, whatever the ids
+        elif table in CATALOG_TABLES and ids is not None:
+            self._changed[table].update(ids)
+        else:
+            self._reload = True
+        self._wakeup.set()
+
+    async def _listen(self) -> None:
+        """Listens on a connection of its own, outside of the pool."""
+        if self._listener is not None:
+            self._listener.terminate()
+        listener = await asyncpg.connect(engine.url.set(drivername="postgresql").render_as_string(False))
+        await listener.add_listener(CHANNEL, self._on_notification)
+        self._listener = listener
+
+    async def _refresh_forever(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), READ_MODEL_POLL_INTERVAL)
+                await asyncio.sleep(READ_MODEL_REFRESH_DELAY)
+            except TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                if self._listener is None or self._listener.is_closed():
+                    # Notifications may have been missed meanwhile
+                    await self._listen()
+                    self._reload = True
+                await self.refresh()
+            except Exception:
+                logger.exception("Read model refresh failed")
+
+    async def refresh(self) -> None:
+        assert self.snapshot is not None
+        changed, self._changed = self._changed, defaultdict(set)
+        reload, self._reload = self._reload, False
+        start = time.perf_counter()
+        try:
+            if not reload and not changed:
+                async with async_session_maker() as session:
+                    if await get_dataset_version(session) == self.snapshot.version:
+                        return
+                # Changed without a notification
+                reload = True
+            if reload:
+                self.snapshot = await load_snapshot()
+            else:
+                await self._patch(self.snapshot, changed)
+        except BaseException:
+            for table, ids in changed.items():
+                self._changed[table] |= ids
+            self._reload |= reload
+            raise
+        logger.info(
+            "Read model %s, version %d in %.3f s",
+            "reloaded" if reload else "patched (" + ", ".join(f"{t}: {len(ids)}" for t, ids in changed.items()) + ")",
+            self.snapshot.version,
+            time.perf_counter() - start,
+        )
+        async with self._refreshed:
+            self._refreshed.notify_all()
+
+    @staticmethod
+    async def _patch(snapshot: CatalogSnapshot, changed: dict[str, set[int]]) -> None:
+        building_ids = sorted(changed.get("building", ()))
+        organization_ids = sorted(changed.get("organization", ()))
+        linked_ids = sorted(changed.get("organization_practice", ()))
+        practices = descendants = None
+        async with await _repeatable_read_session() as session:
+            repo = Repository(session)
+            version = await get_dataset_version(session)
+            if "practice" in changed:
+                practices = await repo.list_catalog_practices()
+                descendants = await repo.list_practice_descendants()
+            buildings = await repo.list_catalog_buildings(building_ids) if building_ids else ()
+            organizations = await repo.list_catalog_organizations(organization_ids) if organization_ids else ()
+            links = await repo.list_organization_practice_links(linked_ids) if linked_ids else ()
+
+        clusters = None
+        if building_ids or organization_ids:
+            # Off the event loop, requests meanwhile get the rows and clusters of the previous version
+            clusters = await asyncio.to_thread(
+                snapshot.cluster_patched_buildings, building_ids, buildings, organization_ids, organizations
+            )
+
+        # No awaiting from here, the rows, clusters and version change together.
+        # Links go last, they need the practices and organizations.
+        if practices is not None and descendants is not None:
+            snapshot.apply_practices(practices, descendants)
+        snapshot.apply_buildings(building_ids, buildings)
+        snapshot.apply_organizations(organization_ids, organizations)
+        snapshot.apply_links(linked_ids, links)
+        if clusters is not None:
+            snapshot.building_clusters = clusters
+        snapshot.version = version
+
+
+read_model = ReadModel()
@@ -1,9 +1,117 @@
-from sqlalchemy import func, or_, select
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+from sqlalchemy import (
+    ARRAY,
+    ColumnElement,
+    Integer,
+    Row,
+    RowMapping,
+    Select,
+    any_,
+    func,
+    literal,
+    select,
+    tuple_,
+    update,
+)
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import QueryableAttribute, selectinload
 
+from constants import CLUSTER_TILE_ZOOM, EARTH_RADIUS as R, STREAM_BATCH_SIZE
 from database import Base
-from models import Building, Organization, Practice
+from models import (
+    Building,
+    Organization,
+    Practice,
+    dataset_version_table,
+    organization_practice_table,
+    practice_closure_table,
+)
+from schemas import (
+    BUILDING_FIELDS,
+    ORGANIZATION_FIELDS,
+    BoxArea,
+    CircleArea,
+    ClusterGrid,
+    OrganizationFilters,
+    Pagination,
+)
+from utils import box_area_bounds, circle_area_bounds
+
+
+def _building_in_bounds(bounds: tuple[float, float, float, float]) -> ColumnElement[bool]:
+    min_lat, min_lon, max_lat, max_lon = bounds
+    return (
+        Building.latitude.between(min_lat, max_lat)
+        & Building.longitude.between(min_lon, max_lon)
+    )
+
+
+def _building_distance_wgs84(lat: float, lon: float) -> ColumnElement[float]:
+    a = (
+        func.power(func.sin(func.radians(Building.latitude - lat) * 0.5), 2)
+        + func.cos(func.radians(lat)) * func.cos(func.radians(Building.latitude))
+        * func.power(func.sin(func.radians(Building.longitude - lon) * 0.5), 2)
+    )
+    return 2 * R * func.asin(func.sqrt(func.least(a, 1)))
+
+
+def _building_in_box_area(area: BoxArea) -> ColumnElement[bool]:
+    return _building_in_bounds(box_area_bounds(area))
+
+
+def _building_in_circle_area(area: CircleArea) -> ColumnElement[bool]:
+    return _building_in_bounds(circle_area_bounds(area)) & (
+        _building_distance_wgs84(area.lat, area.lon) <= area.radius
+    )
+
+
+def _organization_in_area(area: BoxArea | CircleArea) -> ColumnElement[bool]:
+    if type(area) == BoxArea:
+        in_area = _building_in_box_area(area)
+    elif type(area) == CircleArea:
+        in_area = _building_in_circle_area(area)
+    else:
+        raise TypeError("Unsupported Area Type")
+    return Organization.building_id.in_(select(Building.id).where(in_area))
+
+
+def _organization_has_practice(practice_id: int, recursive: bool = False) -> ColumnElement[bool]:
+    """With recursive, a practice from the subtree of practice_id counts too."""
+    organization_ids = select(organization_practice_table.c.organization_id)
+    if recursive:
+        organization_ids = (
+            organization_ids
+            .join(
+                practice_closure_table,
+                practice_closure_table.c.descendant_id == organization_practice_table.c.practice_id,
+            )
+            .where(practice_closure_table.c.ancestor_id == practice_id)
+        )
+    else:
+        organization_ids = organization_ids.where(organization_practice_table.c.practice_id == practice_id)
+    return Organization.id.in_(organization_ids)
+
+
+def _organization_name_contains(search_substr: str) -> ColumnElement[bool]:
+    pattern = search_substr.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return Organization.name.ilike(f"%{pattern}%", escape="\\")
+
+
+_Column = QueryableAttribute[Any] | ColumnElement[Any]
+
+
+def _id_in(column: _Column, ids: list[int]) -> ColumnElement[bool]:
+    """A single array parameter, however many ids there are."""
+    return column == any_(literal(ids, ARRAY(Integer)))
+
+
+def _keyset_page(stmt: Select[Any], page: Pagination, *keys: _Column) -> Select[Any]:
+    """Orders by keys and fetches one row past the page to tell whether a next page exists."""
+    if page.after is not None:
+        stmt = stmt.where(tuple_(*keys) > tuple_(*(literal(value) for value in page.after)))
+    return stmt.order_by(*keys).limit(page.limit + 1)
 
 
 async def get_objects_count(session: AsyncSession, model: type[Base]) -> int:
@@ -11,47 +119,179 @@ async def get_objects_count(session: AsyncSession, model: type[Base]) -> int:
     return await session.scalar(stmt) or 0
 
 
+async def get_dataset_version(session: AsyncSession) -> int:
+    stmt = select(dataset_version_table.c.version)
+    return await session.scalar(stmt) or 0
+
+
+async def bump_dataset_version(session: AsyncSession) -> int:
+    """Marks the catalog as changed, as the triggers on its tables do, but without a notification."""
+    stmt = (
+        update(dataset_version_table)
+        .values(version=dataset_version_table.c.version + 1)
+        .returning(dataset_version_table.c.version)
+    )
+    return await session.scalar(stmt) or 0
+
+
+_BUILDING_COLUMNS = (Building.id, Building.address, Building.coordinates)
+_ORGANIZATION_COLUMNS = (
+    Organization.id,
+    Organization.name,
+    Organization.phone_numbers,
+    Organization.building_id,
+)
+_PRACTICE_COLUMNS = (Practice.id, Practice.name, Practice.parent_id, Practice.level)
+
+
+def _columns_of(columns: Sequence[_Column], fields: Sequence[str]) -> list[_Column]:
+    """The id column and the ones of the requested fields, other fields are not columns."""
+    return [c for c in columns if c.key == "id" or c.key in fields]
+
+
 class Repository:
+    """Lists return plain rows with the columns of the corresponding response schemas.
+
+    Nested collections are fetched with a separate query per page, see
+    list_practices_of_organizations and list_organizations_of_practices.
+    With fields only the id and the columns of those fields are selected.
+    """
+
     def __init__(self, session: AsyncSession):
         self._session: AsyncSession = session
 
-    async def list_buildings(self):
-        stmt = select(Building)
-        return (await self._session.scalars(stmt)).all()
+    async def list_buildings(self, page: Pagination, fields: Sequence[str] = BUILDING_FIELDS):
+        stmt = _keyset_page(select(*_columns_of(_BUILDING_COLUMNS, fields)), page, Building.id)
+        return (await self._session.execute(stmt)).all()
 
-    async def list_organizations(self):
+    async def stream_buildings(self, fields: Sequence[str] = BUILDING_FIELDS) -> AsyncIterator[Sequence[Row[Any]]]:
         stmt = (
-            select(Organization)
-            .options(selectinload(Organization.practices))
+            select(*_columns_of(_BUILDING_COLUMNS, fields))
+            .order_by(Building.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
         )
-        return (await self._session.scalars(stmt)).all()
+        async for partition in (await self._session.stream(stmt)).partitions():
+            yield partition
 
-    async def list_practices(self):
+    async def list_buildings_by_ids(self, building_ids: list[int], fields: Sequence[str] = BUILDING_FIELDS):
         stmt = (
-            select(Practice)
-            .options(selectinload(Practice.organizations))
+            select(*_columns_of(_BUILDING_COLUMNS, fields))
+            .where(Building.id.in_(building_ids))
+            .order_by(Building.id)
         )
-        return (await self._session.scalars(stmt)).all()
+        return (await self._session.execute(stmt)).all()
+
+    async def list_building_points(self):
+        stmt = select(Building.id, Building.latitude, Building.longitude)
+        return [(building_id, lat, lon) for building_id, lat, lon in await self._session.execute(stmt)]
 
-    async def list_organizations_by_building_ids(self, building_ids: list[int]):
+    async def list_buildings_in_box_area(
+        self,
+        area: BoxArea,
+        page: Pagination,
+        fields: Sequence[str] = BUILDING_FIELDS,
+    ):
+        stmt = _keyset_page(
+            select(*_columns_of(_BUILDING_COLUMNS, fields)).where(_building_in_box_area(area)),
+            page,
+            Building.id,
+        )
+        return (await self._session.execute(stmt)).all()
+
+    async def list_buildings_in_circle_area(
+        self,
+        area: CircleArea,
+        page: Pagination,
+        fields: Sequence[str] = BUILDING_FIELDS,
+    ):
+        stmt = _keyset_page(
+            select(*_columns_of(_BUILDING_COLUMNS, fields)).where(_building_in_circle_area(area)),
+            page,
+            Building.id,
+        )
+        return (await self._session.execute(stmt)).all()
+
+    async def list_practices_of_organizations(self, organization_ids: list[int]):
+        """Rows of (organization_id, id, name)."""
         stmt = (
-            select(Organization)
-            .where(Organization.building_id.in_(building_ids))
-            .options(selectinload(Organization.practices))
+            select(organization_practice_table.c.organization_id, Practice.id, Practice.name)
+            .join(Practice, Practice.id == organization_practice_table.c.practice_id)
+            .where(organization_practice_table.c.organization_id.in_(organization_ids))
+            .order_by(organization_practice_table.c.organization_id, Practice.id)
         )
-        return (await self._session.scalars(stmt)).all()
+        return (await self._session.execute(stmt)).all()
+
+    async def _list_organizations(self, page: Pagination, fields: Sequence[str], *where: ColumnElement[bool]):
+        stmt = _keyset_page(select(*_columns_of(_ORGANIZATION_COLUMNS, fields)).where(*where), page, Organization.id)
+        return (await self._session.execute(stmt)).all()
 
-    async def list_organizations_by_practice_id(self, practice_id: int):
+    async def list_organizations(self, page: Pagination, fields: Sequence[str] = ORGANIZATION_FIELDS):
+        return await self._list_organizations(page, fields)
+
+    async def stream_organizations(
+        self,
+        fields: Sequence[str] = ORGANIZATION_FIELDS,
+    ) -> AsyncIterator[Sequence[Row[Any]]]:
         stmt = (
-            select(Organization)
-            .where(
-                Organization.practices.any(Practice.id == practice_id)
-            )
-            .options(
-                selectinload(Organization.practices)
+            select(*_columns_of(_ORGANIZATION_COLUMNS, fields))
+            .order_by(Organization.id)
+            .execution_options(yield_per=STREAM_BATCH_SIZE)
+        )
+        async for partition in (await self._session.stream(stmt)).partitions():
+            yield partition
+
+    async def list_practices(self, page: Pagination):
+        stmt = _keyset_page(select(*_PRACTICE_COLUMNS), page, Practice.id)
+        return (await self._session.execute(stmt)).all()
+
+    async def list_organizations_of_practices(self, practice_ids: list[int]):
+        """Rows of (practice_id, id, name)."""
+        stmt = (
+            select(organization_practice_table.c.practice_id, Organization.id, Organization.name)
+            .join(Organization, Organization.id == organization_practice_table.c.organization_id)
+            .where(organization_practice_table.c.practice_id.in_(practice_ids))
+            .order_by(organization_practice_table.c.practice_id, Organization.id)
+        )
+        return (await self._session.execute(stmt)).all()
+
+    async def list_organizations_by_building_ids(
+        self,
+        building_ids: list[int],
+        page: Pagination,
+        fields: Sequence[str] = ORGANIZATION_FIELDS,
+    ):
+        return await self._list_organizations(page, fields, Organization.building_id.in_(building_ids))
+
+    async def list_organizations_in_area(
+        self,
+        area: BoxArea | CircleArea,
+        page: Pagination,
+        fields: Sequence[str] = ORGANIZATION_FIELDS,
+    ):
+        """One statement whatever the area size: buildings are matched through
+        ix_building_latitude_longitude and joined to organizations by ix_organization_building_id."""
+        return await self._list_organizations(page, fields, _organization_in_area(area))
+
+    async def list_organizations_by_practice_id(
+        self,
+        practice_id: int,
+        page: Pagination,
+        fields: Sequence[str] = ORGANIZATION_FIELDS,
+    ):
+        return await self._list_organizations(page, fields, _organization_has_practice(practice_id))
+
+    async def list_organizations_with_buildings(self, organization_ids: list[int]):
+        """Organization rows with building_address and building_coordinates columns, in no particular order."""
+        stmt = (
+            select(
+                *_ORGANIZATION_COLUMNS,
+                Building.address.label("building_address"),
+                Building.coordinates.label("building_coordinates"),
             )
+            .join(Building, Building.id == Organization.building_id)
+            .where(Organization.id.in_(organization_ids))
         )
-        return (await self._session.scalars(stmt)).all()
+        return (await self._session.execute(stmt)).all()
 
     async def get_organization(self, organization_id: int):
         stmt = (
@@ -64,26 +304,168 @@ class Repository:
         )
         return await self._session.scalar(stmt)
 
-    async def list_organizations_by_practice_id_recursively(self, practice_id: int):
+    async def list_organizations_by_practice_id_recursively(
+        self,
+        practice_id: int,
+        page: Pagination,
+        fields: Sequence[str] = ORGANIZATION_FIELDS,
+    ):
+        return await self._list_organizations(page, fields, _organization_has_practice(practice_id, recursive=True))
+
+    async def list_organizations_by_name_search(
+        self,
+        search_substr: str,
+        page: Pagination,
+        fields: Sequence[str] = ORGANIZATION_FIELDS,
+    ):
+        """Organization rows with an extra rank column, best matches first: rank is the negated name similarity."""
+        rank = -func.similarity(Organization.name, search_substr)
+        stmt = _keyset_page(
+            select(*_columns_of(_ORGANIZATION_COLUMNS, fields), rank.label("rank"))
+            .where(_organization_name_contains(search_substr)),
+            page,
+            rank,
+            Organization.id,
+        )
+        return (await self._session.execute(stmt)).all()
+
+    async def list_nearest_organizations(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        radius: float,
+        practice_id: int | None = None,
+        fields: Sequence[str] = ORGANIZATION_FIELDS,
+    ):
+        """Up to k organization rows within radius of the point, nearest first, with an extra distance column.
+
+        The circle's bounding box is served by ix_building_latitude_longitude, so only
+        the buildings around the point are read.
+        """
+        distance = _building_distance_wgs84(lat, lon)
         stmt = (
-            select(Organization)
-            .join(Organization.practices)
-            .where(
-                or_(
-                    Practice.id == practice_id,
-                    Practice.parent_id == practice_id,
-                    Practice.parent.has(parent_id=practice_id)
-                )
+            select(*_columns_of(_ORGANIZATION_COLUMNS, fields), distance.label("distance"))
+            .join(Building, Building.id == Organization.building_id)
+            .where(_building_in_circle_area(CircleArea(lat=lat, lon=lon, radius=radius)))
+            .order_by(distance, Organization.id)
+            .limit(k)
+        )
+        if practice_id is not None:
+            stmt = stmt.where(_organization_has_practice(practice_id))
+        return (await self._session.execute(stmt)).all()
+
+    async def search_organizations(
+        self,
+        filters: OrganizationFilters,
+        page: Pagination,
+        fields: Sequence[str] = ORGANIZATION_FIELDS,
+    ):
+        """Every given filter applies. Each one is a semi-join on an indexed column,
+        so the planner is free to lead with the most selective of them."""
+        where: list[ColumnElement[bool]] = []
+        if filters.building_id is not None:
+            where.append(Organization.building_id == filters.building_id)
+        if filters.area is not None:
+            where.append(_organization_in_area(filters.area))
+        if filters.practice_id is not None:
+            where.append(_organization_has_practice(filters.practice_id, filters.recursive))
+        if filters.name is not None:
+            where.append(_organization_name_contains(filters.name))
+        return await self._list_organizations(page, fields, *where)
+
+    async def list_building_clusters(
+        self,
+        grid: ClusterGrid,
+        practice_id: int | None = None,
+        recursive: bool = False,
+    ) -> Sequence[RowMapping]:
+        """Rows shaped as BuildingClusterSchema of the non-empty cells, by rows from the north.
+
+        Buildings are picked by ix_building_tile_x_tile_y and aggregated per building first,
+        so a building with many organizations is counted once in the centroid. With practice_id
+        only the buildings of its organizations count, recursive reads the subtree with a query of its own.
+        """
+        shift = CLUSTER_TILE_ZOOM - grid.zoom
+        columns = (
+            Building.tile_x.bitwise_rshift(shift).label("x"),
+            Building.tile_y.bitwise_rshift(shift).label("y"),
+            Building.latitude,
+            Building.longitude,
+        )
+        in_grid = (
+            Building.tile_x.between(grid.x1 << shift, ((grid.x2 + 1) << shift) - 1),
+            Building.tile_y.between(grid.y1 << shift, ((grid.y2 + 1) << shift) - 1),
+        )
+        if practice_id is None:
+            # Counted per building by ix_organization_building_id, a join would hash the whole table
+            organizations = select(func.count()).where(Organization.building_id == Building.id).scalar_subquery()
+            per_building = select(*columns, organizations.label("organizations")).where(*in_grid)
+        else:
+            # With the practice ids at hand the planner counts their organizations from the column
+            # statistics, for a subquery it assumes a subtree of average size and scans all the links
+            practice_ids = await self.list_practice_subtree(practice_id) if recursive else [practice_id]
+            has_practice = Organization.id.in_(
+                select(organization_practice_table.c.organization_id)
+                .where(_id_in(organization_practice_table.c.practice_id, practice_ids))
             )
-            .distinct()
-            .options(selectinload(Organization.practices))
+            per_building = (
+                select(*columns, func.count(Organization.id).label("organizations"))
+                .join(Organization, Organization.building_id == Building.id)
+                .where(*in_grid, has_practice)
+                .group_by(Building.id)
+            )
+        b = per_building.subquery()
+        stmt = (
+            select(
+                b.c.x,
+                b.c.y,
+                func.avg(b.c.latitude).label("latitude"),
+                func.avg(b.c.longitude).label("longitude"),
+                func.count().label("buildings"),
+                func.sum(b.c.organizations).cast(Integer).label("organizations"),
+            )
+            .group_by(b.c.y, b.c.x)
+            .order_by(b.c.y, b.c.x)
         )
-        return (await self._session.scalars(stmt)).all()
+        return (await self._session.execute(stmt)).mappings().all()
 
-    async def list_organizations_by_name_search(self, search_substr: str):
+    async def list_catalog_buildings(self, building_ids: list[int] | None = None) -> Sequence[Row[Any]]:
+        """All buildings, or the given ones, with their coordinates and tiles."""
         stmt = (
-            select(Organization)
-            .where(Organization.name.ilike(f"%{search_substr}%"))
-            .options(selectinload(Organization.practices))
+            select(*_BUILDING_COLUMNS, Building.latitude, Building.longitude, Building.tile_x, Building.tile_y)
+            .order_by(Building.id)
+        )
+        if building_ids is not None:
+            stmt = stmt.where(_id_in(Building.id, building_ids))
+        return (await self._session.execute(stmt)).all()
+
+    async def list_catalog_practices(self) -> Sequence[Row[Any]]:
+        stmt = select(*_PRACTICE_COLUMNS).order_by(Practice.id)
+        return (await self._session.execute(stmt)).all()
+
+    async def list_practice_descendants(self) -> Sequence[Row[Any]]:
+        """Rows of (ancestor_id, descendant_id), a practice is a descendant of itself."""
+        stmt = select(practice_closure_table.c.ancestor_id, practice_closure_table.c.descendant_id)
+        return (await self._session.execute(stmt)).all()
+
+    async def list_practice_subtree(self, practice_id: int) -> list[int]:
+        """Ids of the practice and of all its descendants."""
+        stmt = select(practice_closure_table.c.descendant_id).where(practice_closure_table.c.ancestor_id == practice_id)
+        return list(await self._session.scalars(stmt))
+
+    async def list_catalog_organizations(self, organization_ids: list[int] | None = None) -> Sequence[Row[Any]]:
+        stmt = select(*_ORGANIZATION_COLUMNS).order_by(Organization.id)
+        if organization_ids is not None:
+            stmt = stmt.where(_id_in(Organization.id, organization_ids))
+        return (await self._session.execute(stmt)).all()
+
+    async def list_organization_practice_links(self, organization_ids: list[int] | None = None) -> Sequence[Row[Any]]:
+        """Rows of (organization_id, practice_id) of all organizations, or of the given ones."""
+        stmt = (
+            select(organization_practice_table.c.organization_id, organization_practice_table.c.practice_id)
+            .order_by(organization_practice_table.c.organization_id, organization_practice_table.c.practice_id)
         )
-        return (await self._session.scalars(stmt)).all()
+        if organization_ids is not None:
+            stmt = stmt.where(_id_in(organization_practice_table.c.organization_id, organization_ids))
+        return (await self._session.execute(stmt)).all()
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
 
 from routes.v1.routes_buildings import router as router_buildings
+from routes.v1.routes_cache import router as router_cache
 from routes.v1.routes_organizations import router as router_organizations
+from routes.v1.routes_pool import router as router_pool
 from routes.v1.routes_practices import router as router_practices
 
 
@@ -10,3 +12,5 @@ router = APIRouter(prefix="/v1")
 router.include_router(router_buildings)
 router.include_router(router_organizations)
 router.include_router(router_practices)
+router.include_router(router_cache)
+router.include_router(router_pool)
@@ -1,38 +1,82 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Path
+from fastapi import APIRouter, Depends, Path, Query, Response
+from fastapi.responses import StreamingResponse
 
-from dependencies import area_query, get_service, verify_api_key
-from schemas import BoxArea, BuildingSchema, CircleArea, OrganizationSchema
+from constants import NDJSON_MEDIA_TYPE
+from dependencies import (
+    area_query,
+    building_fields_query,
+    check_etag,
+    cluster_grid_query,
+    forwarded_headers,
+    get_service,
+    organization_fields_query,
+    paginated,
+    pagination_query,
+    serialized,
+    verify_api_key,
+)
+from schemas import (
+    BoxArea,
+    BuildingClusterSchema,
+    BuildingSchema,
+    CircleArea,
+    ClusterGrid,
+    OrganizationSchema,
+    Pagination,
+)
 from service import SecundaService
 
 
-router = APIRouter(prefix="/buildings")
+router = APIRouter(prefix="/buildings", dependencies=[Depends(check_etag)])
 
 
 @router.get(
     "/all",
     description="Вывод списка всех зданий.",
+    response_model=list[BuildingSchema],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
     tags=["buildings"],
 )
 async def list_all_buildings(
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[BuildingSchema]:
-    return await service.list_all_buildings()
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(building_fields_query)],
+    format: Annotated[
+        Literal["json", "ndjson"],
+        Query(description=(
+            "ndjson - выгрузить все здания потоком, по одному JSON-объекту на строку. "
+            "Параметры пагинации при этом не учитываются."
+        )),
+    ] = "json",
+) -> Response:
+    if format == "ndjson":
+        return StreamingResponse(
+            service.export_all_buildings(fields),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=forwarded_headers(response),
+        )
+    return paginated(response, await service.list_all_buildings(page, fields))
 
 
 @router.get(
     "/{building_id}/organizations",
     description="Вывод списка всех организаций внутри данного здания.",
+    response_model=list[OrganizationSchema],
     tags=["organizations"],
 )
 async def list_organizations_in_building(
     building_id: Annotated[int, Path(gt=0, description="Id Здания")],
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[OrganizationSchema]:
-    return await service.list_organizations_in_building(building_id)
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(organization_fields_query)],
+) -> Response:
+    return paginated(response, await service.list_organizations_in_building(building_id, page, fields))
 
 
 @router.get(
@@ -42,11 +86,39 @@ async def list_organizations_in_building(
         "одним из 2 способов:\n1. С помощью 2-х точек, образующих прямоугольную "
         "область;\n2. С помощью центральной точки и радиуса, образующих круглую область."
     ),
+    response_model=list[BuildingSchema],
     tags=["buildings"],
 )
 async def list_buildings_in_area(
     area: Annotated[BoxArea | CircleArea, Depends(area_query)],
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[BuildingSchema]:
-    return await service.list_buildings_in_area(area)
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(building_fields_query)],
+) -> Response:
+    return paginated(response, await service.list_buildings_in_area(area, page, fields))
+
+
+@router.get(
+    "/clusters",
+    description=(
+        "Здания видимой области карты, сгруппированные по ячейкам для данного масштаба. "
+        "Ячейка - четверть тайла карты по каждой оси, для нее выводятся центр ее зданий, "
+        "число зданий и организаций в них."
+    ),
+    response_model=list[BuildingClusterSchema],
+    tags=["buildings"],
+)
+async def list_building_clusters(
+    grid: Annotated[ClusterGrid, Depends(cluster_grid_query)],
+    service: Annotated[SecundaService, Depends(get_service)],
+    _: Annotated[str, Depends(verify_api_key)],
+    response: Response,
+    practice_id: Annotated[int | None, Query(gt=0, description="Учитывать только организации с данной деятельностью")] = None,
+    recursive: Annotated[
+        bool,
+        Query(description="Учитывать также деятельности, являющиеся потомками данной деятельности"),
+    ] = False,
+) -> Response:
+    return serialized(response, await service.list_building_clusters(grid, practice_id, recursive))
@@ -0,0 +1,45 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+from starlette.status import HTTP_204_NO_CONTENT
+
+from cache import cache_stats, dataset_version, invalidate_caches
+from database import async_session_maker
+from dependencies import verify_api_key
+from repository import bump_dataset_version
+
+
+router = APIRouter(prefix="/cache")
+
+
+@router.get(
+    "/stats",
+    description="Статистика попаданий и промахов кэша по каждому методу сервиса, в обработавшем запрос процессе.",
+    tags=["service"],
+)
+async def get_cache_stats(
+    _: Annotated[str, Depends(verify_api_key)],
+) -> dict[str, dict[str, int | float]]:
+    return cache_stats()
+
+
+@router.post(
+    "/invalidate",
+    description=(
+        "Сброс кэша. Нужен, если данные в БД изменены в обход приложения. "
+        "Увеличивает версию данных: обработавший запрос процесс сбрасывает кэш сразу, "
+        "остальные процессы и экземпляры — заметив новую версию, не позже чем через секунду "
+        "при следующем запросе, read model перезагружается при очередной проверке версии."
+    ),
+    status_code=HTTP_204_NO_CONTENT,
+    tags=["service"],
+)
+async def invalidate_cache(
+    _: Annotated[str, Depends(verify_api_key)],
+) -> None:
+    # The cache is per process, the other ones drop theirs on the new version, see DatasetVersion
+    async with async_session_maker() as session:
+        await bump_dataset_version(session)
+        await session.commit()
+    invalidate_caches()
+    dataset_version.expire()
@@ -1,25 +1,66 @@
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, Path, Query
+from fastapi import APIRouter, Depends, Path, Query, Response
+from fastapi.responses import StreamingResponse
 
-from dependencies import area_query, get_service, verify_api_key
-from schemas import BoxArea, CircleArea, OrganizationFullSchema, OrganizationSchema
+from constants import BATCH_MAX_IDS, NDJSON_MEDIA_TYPE, NEAREST_MAX_K, NEAREST_MAX_RADIUS
+from dependencies import (
+    area_query,
+    check_etag,
+    forwarded_headers,
+    get_service,
+    organization_fields_query,
+    organization_filters_query,
+    paginated,
+    pagination_query,
+    ranked_pagination_query,
+    serialized,
+    verify_api_key,
+)
+from schemas import (
+    BoxArea,
+    CircleArea,
+    OrganizationBatchSchema,
+    OrganizationFilters,
+    OrganizationFullSchema,
+    OrganizationNearestSchema,
+    OrganizationSchema,
+    Pagination,
+)
 from service import SecundaService
 
 
-router = APIRouter(prefix="/organizations")
+router = APIRouter(prefix="/organizations", dependencies=[Depends(check_etag)])
 
 
 @router.get(
     "/all",
     description="Вывод списка всех организаций.",
+    response_model=list[OrganizationSchema],
+    responses={200: {"content": {NDJSON_MEDIA_TYPE: {}}}},
     tags=["organizations"],
 )
 async def list_all_organizations(
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[OrganizationSchema]:
-    return await service.list_all_organizations()
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(organization_fields_query)],
+    format: Annotated[
+        Literal["json", "ndjson"],
+        Query(description=(
+            "ndjson - выгрузить все организации потоком, по одному JSON-объекту на строку. "
+            "Параметры пагинации при этом не учитываются."
+        )),
+    ] = "json",
+) -> Response:
+    if format == "ndjson":
+        return StreamingResponse(
+            service.export_all_organizations(fields),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=forwarded_headers(response),
+        )
+    return paginated(response, await service.list_all_organizations(page, fields))
 
 
 @router.get(
@@ -29,37 +70,116 @@ async def list_all_organizations(
         "одним из 2 способов:\n1. С помощью 2-х точек, образующих прямоугольную "
         "область;\n2. С помощью центральной точки и радиуса, образующих круглую область."
     ),
+    response_model=list[OrganizationSchema],
     tags=["organizations"],
 )
 async def list_organizations_in_area(
     area: Annotated[BoxArea | CircleArea, Depends(area_query)],
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[OrganizationSchema]:
-    return await service.list_organizations_in_area(area)
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(organization_fields_query)],
+) -> Response:
+    return paginated(response, await service.list_organizations_in_area(area, page, fields))
 
 
 @router.get(
-    "/{organization_id}",
-    description="Вывод подробной информации о данной организации.",   
+    "/search_by_name",
+    description=(
+        "Вывод списка организаций, с названием, включающим данную подстроку. "
+        "Организации упорядочены по схожести названия с подстрокой."
+    ),
+    response_model=list[OrganizationSchema],
     tags=["organizations"],
 )
-async def get_organization(
-    organization_id: Annotated[int, Path(gt=0, description="Id организации")],
+async def list_organizations_by_name_search(
+    search: Annotated[str, Query(min_length=1, description="Искомая подстрока")],
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> OrganizationFullSchema:
-    return await service.get_organization(organization_id)
+    response: Response,
+    page: Annotated[Pagination, Depends(ranked_pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(organization_fields_query)],
+) -> Response:
+    return paginated(response, await service.search_organizations_by_name(search, page, fields))
 
 
 @router.get(
-    "/search_by_name",
-    description="Вывод списка организаций, с названием, включающим данную подстроку.",
+    "/search",
+    description=(
+        "Поиск организаций по любому сочетанию фильтров: области (прямоугольной или круглой), "
+        "зданию, деятельности (в том числе с учетом ее потомков) и подстроке названия. "
+        "Выводятся организации, подходящие под все заданные фильтры."
+    ),
+    response_model=list[OrganizationSchema],
     tags=["organizations"],
 )
-async def list_organizations_by_name_search(
-    search: Annotated[str, Query(min_length=1, description="Искомая подстрока")],
+async def search_organizations(
+    filters: Annotated[OrganizationFilters, Depends(organization_filters_query)],
+    service: Annotated[SecundaService, Depends(get_service)],
+    _: Annotated[str, Depends(verify_api_key)],
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(organization_fields_query)],
+) -> Response:
+    return paginated(response, await service.search_organizations(filters, page, fields))
+
+
+@router.get(
+    "/nearest",
+    description=(
+        "Вывод k ближайших к данной точке организаций, упорядоченных по расстоянию "
+        f"(в километрах, поле distance). Учитываются организации не дальше {NEAREST_MAX_RADIUS:g} км."
+    ),
+    response_model=list[OrganizationNearestSchema],
+    tags=["organizations"],
+)
+async def list_nearest_organizations(
+    lat: Annotated[float, Query(ge=-90, le=90, description="Широта точки")],
+    lon: Annotated[float, Query(ge=-180, le=180, description="Долгота точки")],
+    service: Annotated[SecundaService, Depends(get_service)],
+    _: Annotated[str, Depends(verify_api_key)],
+    response: Response,
+    fields: Annotated[tuple[str, ...], Depends(organization_fields_query)],
+    k: Annotated[int, Query(ge=1, le=NEAREST_MAX_K, description="Количество организаций")] = 10,
+    practice_id: Annotated[int | None, Query(gt=0, description="Id деятельности")] = None,
+) -> Response:
+    return serialized(response, await service.list_nearest_organizations(lat, lon, k, practice_id, fields))
+
+
+@router.get(
+    "/batch",
+    description=(
+        "Вывод подробной информации о нескольких организациях за один запрос. "
+        "Организации выводятся в порядке переданных id, повторно переданный id выводится один раз. "
+        "Ненайденные id перечислены в missing в том же порядке, "
+        "ответ 200 даже если не найдена ни одна организация."
+    ),
+    response_model=OrganizationBatchSchema,
+    tags=["organizations"],
+)
+async def get_organizations_batch(
+    ids: Annotated[
+        list[int],
+        Query(min_length=1, max_length=BATCH_MAX_IDS, description="Id организаций"),
+    ],
+    service: Annotated[SecundaService, Depends(get_service)],
+    _: Annotated[str, Depends(verify_api_key)],
+    response: Response,
+) -> Response:
+    return serialized(response, await service.get_organizations(list(dict.fromkeys(ids))))
+
+
+@router.get(
+    "/{organization_id}",
+    description="Вывод подробной информации о данной организации.",   
+    response_model=OrganizationFullSchema,
+    tags=["organizations"],
+)
+async def get_organization(
+    organization_id: Annotated[int, Path(gt=0, description="Id организации")],
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[OrganizationSchema]:
-    return await service.search_organizations_by_name(search)
+    response: Response,
+) -> Response:
+    return serialized(response, await service.get_organization(organization_id))
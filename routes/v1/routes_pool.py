@@ -0,0 +1,23 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+
+from database import pool_stats
+from dependencies import verify_api_key
+
+
+router = APIRouter(prefix="/pool")
+
+
+@router.get(
+    "/stats",
+    description=(
+        "Состояние пулов соединений с основной БД и репликами: занятые соединения, "
+        "переполнение сверх размера пула и время ожидания свободного соединения в секундах."
+    ),
+    tags=["service"],
+)
+async def get_pool_stats(
+    _: Annotated[str, Depends(verify_api_key)],
+) -> dict[str, dict[str, int | float]]:
+    return pool_stats()
@@ -1,38 +1,52 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, Path
+from fastapi import APIRouter, Depends, Path, Response
 
-from dependencies import get_service, verify_api_key
-from schemas import PracticeSchema, OrganizationSchema
+from dependencies import (
+    check_etag,
+    get_service,
+    organization_fields_query,
+    paginated,
+    pagination_query,
+    verify_api_key,
+)
+from schemas import Pagination, PracticeSchema, OrganizationSchema
 from service import SecundaService
 
 
-router = APIRouter(prefix="/practices")
+router = APIRouter(prefix="/practices", dependencies=[Depends(check_etag)])
 
 
 @router.get(
     "/all",
     description="Вывод списка всех деятельностей.",
+    response_model=list[PracticeSchema],
     tags=["practices"],
 )
 async def list_all_practices(
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[PracticeSchema]:
-    return await service.list_all_practices()
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+) -> Response:
+    return paginated(response, await service.list_all_practices(page))
 
 
 @router.get(
     "/{practice_id}/organizations",
     description="Вывод списка всех организаций, занятых данным видом деятельности.",
+    response_model=list[OrganizationSchema],
     tags=["organizations"],
 )
 async def list_organizations_of_practice(
     practice_id: Annotated[int, Path(gt=0, description="Id деятельности")],
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[OrganizationSchema]:
-    return await service.list_organizations_of_practice(practice_id)
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(organization_fields_query)],
+) -> Response:
+    return paginated(response, await service.list_organizations_of_practice(practice_id, page, fields))
 
 
 @router.get(
@@ -42,11 +56,15 @@ async def list_organizations_of_practice(
         "Вывод списка организаций, занятых данной деятельностью или "
         "деятельностью, являющейся одним из потомков данной деятельности."
     ),
+    response_model=list[OrganizationSchema],
     tags=["organizations"],
 )
 async def list_organizations_of_practice_recursively(
     practice_id: Annotated[int, Path(gt=0, description="Id деятельности")],
     service: Annotated[SecundaService, Depends(get_service)],
     _: Annotated[str, Depends(verify_api_key)],
-) -> list[OrganizationSchema]:
-    return await service.list_organizations_of_practice_recursively(practice_id)
+    response: Response,
+    page: Annotated[Pagination, Depends(pagination_query)],
+    fields: Annotated[tuple[str, ...], Depends(organization_fields_query)],
+) -> Response:
+    return paginated(response, await service.list_organizations_of_practice_recursively(practice_id, page, fields))
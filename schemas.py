@@ -1,6 +1,11 @@
+from typing import Generic, TypeVar
+
 from pydantic import BaseModel
 
 
+T = TypeVar("T")
+
+
 # ----------- Building -----------
 class BuildingSchema(BaseModel):
     id: int
@@ -17,6 +22,10 @@ class OrganizationSchema(BaseModel):
     practices: list[PracticeShortSchema]
 
 
+class OrganizationNearestSchema(OrganizationSchema):
+    distance: float  # km
+
+
 class OrganizationShortSchema(BaseModel):
     id: int
     name: str
@@ -30,6 +39,11 @@ class OrganizationFullSchema(BaseModel):
     practices: list[PracticeShortSchema]
 
 
+class OrganizationBatchSchema(BaseModel):
+    items: list[OrganizationFullSchema]  # in the order of the requested ids
+    missing: list[int]
+
+
 # ----------- Practice -----------
 class PracticeSchema(BaseModel):
     id: int
@@ -44,6 +58,15 @@ class PracticeShortSchema(BaseModel):
     name: str
 
 
+class BuildingClusterSchema(BaseModel):
+    x: int  # web mercator tile of the cell at ClusterGrid.zoom
+    y: int
+    latitude: float  # centroid of the buildings
+    longitude: float
+    buildings: int
+    organizations: int
+
+
 # ----------- Query Schema -----------
 class BoxArea(BaseModel):
     lat1: float
@@ -56,3 +79,38 @@ class CircleArea(BaseModel):
     lat: float
     lon: float
     radius: float
+
+
+class ClusterGrid(BaseModel):
+    """Map cells from x1, y1 to x2, y2 inclusive, web mercator tiles at zoom."""
+    zoom: int
+    x1: int
+    y1: int
+    x2: int
+    y2: int
+
+
+class OrganizationFilters(BaseModel):
+    area: BoxArea | CircleArea | None = None
+    building_id: int | None = None
+    practice_id: int | None = None
+    recursive: bool = False  # practice_id matches its descendants too
+    name: str | None = None  # substring
+
+
+class Pagination(BaseModel):
+    limit: int
+    after: list[int | float] | None = None  # sort key of the last item of the previous page
+
+
+# ----------- Page -----------
+class Page(BaseModel, Generic[T]):
+    items: list[T]
+    next_cursor: str | None
+
+
+# ----------- Sparse Fieldsets -----------
+# Fields of the list items in response order, a client picks some of them with fields= and include=
+BUILDING_FIELDS: tuple[str, ...] = tuple(BuildingSchema.model_fields)
+ORGANIZATION_FIELDS: tuple[str, ...] = tuple(OrganizationSchema.model_fields)
+ORGANIZATION_RELATIONSHIPS: tuple[str, ...] = ("practices",)  # fetched with a separate query per page
@@ -1,69 +1,536 @@
+import heapq
+import math
+from bisect import bisect_right
+from collections import defaultdict
+from collections.abc import AsyncIterator, Iterable, Sequence
+from typing import Any
+
+import orjson
+from sqlalchemy import Row
+
+from cache import TTLCache, cached
+from config import settings
+from constants import (
+    CACHE_MAXSIZE,
+    CACHE_TTL_ORGANIZATIONS,
+    CACHE_TTL_REFERENCE,
+    CACHE_TTL_SEARCH,
+    CLUSTER_PRACTICE_CACHE_SIZE,
+    NEAREST_MAX_RADIUS,
+    NEAREST_START_RADIUS,
+    STREAM_BATCH_SIZE,
+)
+from geo_index import building_index
+from metrics import measure_serialization
+from read_model import CatalogSnapshot
 from repository import Repository
 from schemas import (
+    BUILDING_FIELDS,
+    ORGANIZATION_FIELDS,
+    ORGANIZATION_RELATIONSHIPS,
     BoxArea,
-    BuildingSchema,
     CircleArea,
+    ClusterGrid,
+    OrganizationFilters,
     OrganizationFullSchema,
-    OrganizationSchema,
-    PracticeSchema,
+    Page,
+    Pagination,
+)
+from snapshot_file import MappedSnapshot
+from utils import (
+    distance_wgs84,
+    encode_cursor,
+    next_search_radius,
+    trigram_similarity,
+    trigram_words,
+    trigrams,
 )
-from utils import find_buildings_in_box_area, find_buildings_in_circle_area
+
+
+# List items are plain dicts shaped as BuildingSchema, OrganizationSchema and PracticeSchema,
+# built straight from column rows and serialized without a validation pass
+Item = dict[str, Any]
+
+
+def _cut_page(
+    rows: Sequence[Row[Any]],
+    page: Pagination,
+    keys: Sequence[Sequence[int | float]] | None = None,
+) -> tuple[Sequence[Row[Any]], str | None]:
+    """Rows come with one extra row past the page, see repository._keyset_page."""
+    if len(rows) <= page.limit:
+        return rows, None
+    last_key = keys[page.limit - 1] if keys is not None else [rows[page.limit - 1].id]
+    return rows[:page.limit], encode_cursor(last_key)
+
+
+def _building_items(rows: Sequence[Row[Any]], fields: tuple[str, ...] = BUILDING_FIELDS) -> list[Item]:
+    return [{f: getattr(r, f) for f in fields} for r in rows]
+
+
+def _ndjson(items: list[Item]) -> bytes:
+    with measure_serialization():
+        return b"".join(orjson.dumps(item) + b"\n" for item in items)
 
 
 class SecundaService:
     def __init__(self, repo: Repository):
         self._repo: Repository = repo
 
-    async def list_all_buildings(self) -> list[BuildingSchema]:
-        buildings = await self._repo.list_buildings()
-        return [BuildingSchema.model_validate(b, from_attributes=True) for b in buildings]
+    async def _practices_of_organizations(self, rows: Sequence[Row[Any]]) -> defaultdict[int, list[Item]]:
+        practices: defaultdict[int, list[Item]] = defaultdict(list)
+        for organization_id, practice_id, name in await self._repo.list_practices_of_organizations(
+            [r.id for r in rows]
+        ):
+            practices[organization_id].append({"id": practice_id, "name": name})
+        return practices
+
+    async def _organization_items(
+        self,
+        rows: Sequence[Row[Any]],
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> list[Item]:
+        """Items with the given fields, practices are queried only when they are among them."""
+        columns = [f for f in fields if f not in ORGANIZATION_RELATIONSHIPS]
+        items = [{f: getattr(r, f) for f in columns} for r in rows]
+        if "practices" in fields:
+            practices = await self._practices_of_organizations(rows)
+            for item in items:
+                item["practices"] = practices[item["id"]]
+        return items
+
+    async def _organizations_page(
+        self,
+        rows: Sequence[Row[Any]],
+        page: Pagination,
+        fields: tuple[str, ...],
+        keys: Sequence[Sequence[int | float]] | None = None,
+    ) -> Page[Item]:
+        rows, next_cursor = _cut_page(rows, page, keys)
+        return Page[Item].model_construct(items=await self._organization_items(rows, fields), next_cursor=next_cursor)
+
+    @cached(ttl=CACHE_TTL_REFERENCE, maxsize=CACHE_MAXSIZE)
+    async def list_all_buildings(self, page: Pagination, fields: tuple[str, ...] = BUILDING_FIELDS) -> Page[Item]:
+        rows, next_cursor = _cut_page(await self._repo.list_buildings(page, fields), page)
+        return Page[Item].model_construct(items=_building_items(rows, fields), next_cursor=next_cursor)
 
-    async def list_all_practices(self) -> list[PracticeSchema]:
-        scalars = await self._repo.list_practices()
-        return [PracticeSchema.model_validate(s, from_attributes=True) for s in scalars]
+    async def export_all_buildings(self, fields: tuple[str, ...] = BUILDING_FIELDS) -> AsyncIterator[bytes]:
+        async for rows in self._repo.stream_buildings(fields):
+            yield _ndjson(_building_items(rows, fields))
 
-    async def list_all_organizations(self) -> list[OrganizationSchema]:
-        scalars = await self._repo.list_organizations()
-        return [OrganizationSchema.model_validate(s, from_attributes=True) for s in scalars]
+    @cached(ttl=CACHE_TTL_REFERENCE, maxsize=CACHE_MAXSIZE)
+    async def list_all_practices(self, page: Pagination) -> Page[Item]:
+        rows, next_cursor = _cut_page(await self._repo.list_practices(page), page)
+        organizations: defaultdict[int, list[Item]] = defaultdict(list)
+        for practice_id, organization_id, name in await self._repo.list_organizations_of_practices(
+            [r.id for r in rows]
+        ):
+            organizations[practice_id].append({"id": organization_id, "name": name})
+        items = [
+            {
+                "id": r.id,
+                "name": r.name,
+                "parent_id": r.parent_id,
+                "level": r.level,
+                "organizations": organizations[r.id],
+            }
+            for r in rows
+        ]
+        return Page[Item].model_construct(items=items, next_cursor=next_cursor)
 
-    async def list_organizations_in_building(self, building_id: int) -> list[OrganizationSchema]:
-        scalars = await self._repo.list_organizations_by_building_ids([building_id])
-        return [OrganizationSchema.model_validate(s, from_attributes=True) for s in scalars]
+    @cached(ttl=CACHE_TTL_ORGANIZATIONS, maxsize=CACHE_MAXSIZE)
+    async def list_all_organizations(
+        self,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        return await self._organizations_page(await self._repo.list_organizations(page, fields), page, fields)
 
-    async def list_organizations_of_practice(self, practice_id: int) -> list[OrganizationSchema]:
-        scalars = await self._repo.list_organizations_by_practice_id(practice_id)
-        return [OrganizationSchema.model_validate(s, from_attributes=True) for s in scalars]
+    async def export_all_organizations(self, fields: tuple[str, ...] = ORGANIZATION_FIELDS) -> AsyncIterator[bytes]:
+        async for rows in self._repo.stream_organizations(fields):
+            yield _ndjson(await self._organization_items(rows, fields))
 
-    async def list_buildings_in_area(self, area: BoxArea | CircleArea) -> list[BuildingSchema]:
-        buildings = await self._repo.list_buildings()
+    @cached(ttl=CACHE_TTL_ORGANIZATIONS, maxsize=CACHE_MAXSIZE)
+    async def list_organizations_in_building(
+        self,
+        building_id: int,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        rows = await self._repo.list_organizations_by_building_ids([building_id], page, fields)
+        return await self._organizations_page(rows, page, fields)
+
+    @cached(ttl=CACHE_TTL_ORGANIZATIONS, maxsize=CACHE_MAXSIZE)
+    async def list_organizations_of_practice(
+        self,
+        practice_id: int,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        rows = await self._repo.list_organizations_by_practice_id(practice_id, page, fields)
+        return await self._organizations_page(rows, page, fields)
+
+    async def _find_building_ids_in_index(self, area: BoxArea | CircleArea) -> list[int]:
+        await building_index.ensure_built(self._repo.list_building_points)
         if type(area) == BoxArea:
-            res = find_buildings_in_box_area(buildings, area)
+            return building_index.query_box(area)
         elif type(area) == CircleArea:
-            res = find_buildings_in_circle_area(buildings, area)
+            return building_index.query_circle(area)
         else:
             raise TypeError("Unsupported Area Type")
-        return [BuildingSchema.model_validate(b, from_attributes=True) for b in res]
 
-    async def list_organizations_in_area(self, area: BoxArea | CircleArea) -> list[OrganizationSchema]:
-        buildings = await self._repo.list_buildings()
-        if type(area) == BoxArea:
-            buildings = find_buildings_in_box_area(buildings, area)
+    @cached(ttl=CACHE_TTL_SEARCH, maxsize=CACHE_MAXSIZE)
+    async def list_buildings_in_area(
+        self,
+        area: BoxArea | CircleArea,
+        page: Pagination,
+        fields: tuple[str, ...] = BUILDING_FIELDS,
+    ) -> Page[Item]:
+        if settings.BUILDING_INDEX_ENABLED:
+            building_ids = await self._find_building_ids_in_index(area)
+            start = bisect_right(building_ids, page.after[0]) if page.after is not None else 0
+            res = await self._repo.list_buildings_by_ids(building_ids[start:start + page.limit + 1], fields)
+        elif type(area) == BoxArea:
+            res = await self._repo.list_buildings_in_box_area(area, page, fields)
         elif type(area) == CircleArea:
-            buildings = find_buildings_in_circle_area(buildings, area)
+            res = await self._repo.list_buildings_in_circle_area(area, page, fields)
         else:
             raise TypeError("Unsupported Area Type")
-        
-        res = await self._repo.list_organizations_by_building_ids([b.id for b in buildings])
-        return [OrganizationSchema.model_validate(o, from_attributes=True) for o in res]
+        rows, next_cursor = _cut_page(res, page)
+        return Page[Item].model_construct(items=_building_items(rows, fields), next_cursor=next_cursor)
+
+    @cached(ttl=CACHE_TTL_SEARCH, maxsize=CACHE_MAXSIZE)
+    async def list_building_clusters(
+        self,
+        grid: ClusterGrid,
+        practice_id: int | None = None,
+        recursive: bool = False,
+    ) -> list[Item]:
+        """Shaped as BuildingClusterSchema."""
+        rows = await self._repo.list_building_clusters(grid, practice_id, recursive)
+        return [dict(r) for r in rows]
 
+    @cached(ttl=CACHE_TTL_SEARCH, maxsize=CACHE_MAXSIZE)
+    async def list_organizations_in_area(
+        self,
+        area: BoxArea | CircleArea,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        # Not served by building_index: the ids of every building in a large area would
+        # have to be sent back to the database as query parameters
+        rows = await self._repo.list_organizations_in_area(area, page, fields)
+        return await self._organizations_page(rows, page, fields)
+
+    @cached(ttl=CACHE_TTL_ORGANIZATIONS, maxsize=CACHE_MAXSIZE)
     async def get_organization(self, organization_id: int) -> OrganizationFullSchema:
         scalar = await self._repo.get_organization(organization_id)
         return OrganizationFullSchema.model_validate(scalar, from_attributes=True)
 
-    async def list_organizations_of_practice_recursively(self, practice_id: int) -> list[OrganizationSchema]:
-        scalars = await self._repo.list_organizations_by_practice_id_recursively(practice_id)
-        return [OrganizationSchema.model_validate(s, from_attributes=True) for s in scalars]
+    @cached(ttl=CACHE_TTL_ORGANIZATIONS, maxsize=CACHE_MAXSIZE)
+    async def get_organizations(self, organization_ids: list[int]) -> Item:
+        """Shaped as OrganizationBatchSchema."""
+        rows = await self._repo.list_organizations_with_buildings(organization_ids)
+        practices = await self._practices_of_organizations(rows)
+        found = {
+            r.id: {
+                "id": r.id,
+                "name": r.name,
+                "phone_numbers": r.phone_numbers,
+                "building": {"id": r.building_id, "address": r.building_address, "coordinates": r.building_coordinates},
+                "practices": practices[r.id],
+            }
+            for r in rows
+        }
+        return {
+            "items": [found[i] for i in organization_ids if i in found],
+            "missing": [i for i in organization_ids if i not in found],
+        }
+
+    @cached(ttl=CACHE_TTL_ORGANIZATIONS, maxsize=CACHE_MAXSIZE)
+    async def list_organizations_of_practice_recursively(
+        self,
+        practice_id: int,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        rows = await self._repo.list_organizations_by_practice_id_recursively(practice_id, page, fields)
+        return await self._organizations_page(rows, page, fields)
+
+    @cached(ttl=CACHE_TTL_SEARCH, maxsize=CACHE_MAXSIZE)
+    async def search_organizations(
+        self,
+        filters: OrganizationFilters,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        rows = await self._repo.search_organizations(filters, page, fields)
+        return await self._organizations_page(rows, page, fields)
+
+    @cached(ttl=CACHE_TTL_SEARCH, maxsize=CACHE_MAXSIZE)
+    async def list_nearest_organizations(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        practice_id: int | None = None,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> list[Item]:
+        """Shaped as OrganizationNearestSchema, nearest first.
+
+        The search circle grows until it holds k organizations or reaches NEAREST_MAX_RADIUS.
+        Rows outside the circle are never considered, so the k found are the nearest ones.
+        """
+        radius = NEAREST_START_RADIUS
+        while True:
+            rows = await self._repo.list_nearest_organizations(lat, lon, k, radius, practice_id, fields)
+            if len(rows) == k or radius >= NEAREST_MAX_RADIUS:
+                break
+            radius = next_search_radius(radius, len(rows), k)
+        items = await self._organization_items(rows, fields)
+        for item, r in zip(items, rows):
+            item["distance"] = r.distance
+        return items
+
+    @cached(ttl=CACHE_TTL_SEARCH, maxsize=CACHE_MAXSIZE)
+    async def search_organizations_by_name(
+        self,
+        search_substr: str,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        rows = await self._repo.list_organizations_by_name_search(search_substr, page, fields)
+        return await self._organizations_page(rows, page, fields, keys=[(r.rank, r.id) for r in rows])
+
+
+# -------------- Read model --------------
+# Building clusters of a practice by (snapshot version, practice_id, recursive), entries of older versions age out
+_practice_clusters = TTLCache(math.inf, CLUSTER_PRACTICE_CACHE_SIZE)
+
+
+def _id_page(ids: Sequence[int], page: Pagination) -> tuple[Sequence[int], str | None]:
+    """A page of sorted ids and the cursor of the next one, as _cut_page gives."""
+    start = bisect_right(ids, page.after[0]) if page.after is not None else 0
+    ids = ids[start:start + page.limit + 1]
+    if len(ids) <= page.limit:
+        return ids, None
+    return ids[:page.limit], encode_cursor([ids[page.limit - 1]])
+
+
+class SnapshotService(SecundaService):
+    """Gives the same results as SecundaService from an in-memory CatalogSnapshot, see read_model.py,
+    or from a MappedSnapshot of a snapshot file, see snapshot_file.py."""
+
+    def __init__(self, snapshot: CatalogSnapshot | MappedSnapshot):  # pyright:ignore[reportMissingSuperCall]
+        self._snapshot: CatalogSnapshot | MappedSnapshot = snapshot
+
+    def _page_of_organizations(
+        self,
+        organization_ids: Sequence[int],
+        page: Pagination,
+        fields: tuple[str, ...],
+    ) -> Page[Item]:
+        organization_ids, next_cursor = _id_page(organization_ids, page)
+        items = self._snapshot.organization_items(organization_ids, fields)
+        return Page[Item].model_construct(items=items, next_cursor=next_cursor)
+
+    def _buildings(self, building_ids: Sequence[int], fields: tuple[str, ...]) -> list[Item]:
+        buildings = self._snapshot.buildings
+        if fields == BUILDING_FIELDS:
+            return [buildings[i] for i in building_ids]
+        return [{f: buildings[i][f] for f in fields} for i in building_ids]
+
+    def _building_ids_in_area(self, area: BoxArea | CircleArea) -> list[int]:
+        if type(area) == BoxArea:
+            return self._snapshot.building_index.query_box(area)
+        elif type(area) == CircleArea:
+            return self._snapshot.building_index.query_circle(area)
+        else:
+            raise TypeError("Unsupported Area Type")
+
+    def _organization_ids_in_area(self, area: BoxArea | CircleArea) -> list[int]:
+        in_building = self._snapshot.organizations_in_building
+        return sorted(i for b in self._building_ids_in_area(area) for i in in_building.get(b, ()))
+
+    def _organization_ids_of_practice(self, practice_id: int, recursive: bool = False) -> list[int]:
+        of_practice = self._snapshot.organizations_of_practice
+        if not recursive:
+            return of_practice.get(practice_id, [])
+        return sorted({i for p in self._snapshot.descendants.get(practice_id, ()) for i in of_practice.get(p, ())})
+
+    async def list_all_buildings(self, page: Pagination, fields: tuple[str, ...] = BUILDING_FIELDS) -> Page[Item]:
+        building_ids, next_cursor = _id_page(self._snapshot.building_ids, page)
+        return Page[Item].model_construct(items=self._buildings(building_ids, fields), next_cursor=next_cursor)
+
+    async def export_all_buildings(self, fields: tuple[str, ...] = BUILDING_FIELDS) -> AsyncIterator[bytes]:
+        building_ids = self._snapshot.building_ids
+        for start in range(0, len(building_ids), STREAM_BATCH_SIZE):
+            yield _ndjson(self._buildings(building_ids[start:start + STREAM_BATCH_SIZE], fields))
+
+    async def list_all_practices(self, page: Pagination) -> Page[Item]:
+        practice_ids, next_cursor = _id_page(self._snapshot.practice_ids, page)
+        practices = self._snapshot.practices
+        return Page[Item].model_construct(items=[practices[i] for i in practice_ids], next_cursor=next_cursor)
+
+    async def list_all_organizations(
+        self,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        return self._page_of_organizations(self._snapshot.organization_ids, page, fields)
+
+    async def export_all_organizations(self, fields: tuple[str, ...] = ORGANIZATION_FIELDS) -> AsyncIterator[bytes]:
+        organization_ids = self._snapshot.organization_ids
+        for start in range(0, len(organization_ids), STREAM_BATCH_SIZE):
+            yield _ndjson(self._snapshot.organization_items(organization_ids[start:start + STREAM_BATCH_SIZE], fields))
+
+    async def list_organizations_in_building(
+        self,
+        building_id: int,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        organization_ids = self._snapshot.organizations_in_building.get(building_id, [])
+        return self._page_of_organizations(organization_ids, page, fields)
+
+    async def list_organizations_of_practice(
+        self,
+        practice_id: int,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        return self._page_of_organizations(self._organization_ids_of_practice(practice_id), page, fields)
+
+    async def list_buildings_in_area(
+        self,
+        area: BoxArea | CircleArea,
+        page: Pagination,
+        fields: tuple[str, ...] = BUILDING_FIELDS,
+    ) -> Page[Item]:
+        building_ids, next_cursor = _id_page(self._building_ids_in_area(area), page)
+        return Page[Item].model_construct(items=self._buildings(building_ids, fields), next_cursor=next_cursor)
+
+    async def list_organizations_in_area(
+        self,
+        area: BoxArea | CircleArea,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        return self._page_of_organizations(self._organization_ids_in_area(area), page, fields)
+
+    async def list_building_clusters(
+        self,
+        grid: ClusterGrid,
+        practice_id: int | None = None,
+        recursive: bool = False,
+    ) -> list[Item]:
+        if practice_id is None:
+            return self._snapshot.building_clusters.cells(grid)
+        key = (self._snapshot.version, practice_id, recursive)
+        found, clusters = _practice_clusters.get(key)
+        if not found:
+            clusters = self._snapshot.building_clusters_of(self._organization_ids_of_practice(practice_id, recursive))
+            _practice_clusters.set(key, clusters)
+        return clusters.cells(grid)
+
+    def _full_organization(self, organization_id: int) -> Item | None:
+        organization = self._snapshot.organizations.get(organization_id)
+        if organization is None:
+            return None
+        return {
+            "id": organization["id"],
+            "name": organization["name"],
+            "phone_numbers": organization["phone_numbers"],
+            "building": self._snapshot.buildings[organization["building_id"]],
+            "practices": organization["practices"],
+        }
+
+    async def get_organization(self, organization_id: int) -> OrganizationFullSchema:
+        return OrganizationFullSchema.model_validate(self._full_organization(organization_id))
+
+    async def get_organizations(self, organization_ids: list[int]) -> Item:
+        found = {i: organization for i in organization_ids if (organization := self._full_organization(i))}
+        return {
+            "items": list(found.values()),
+            "missing": [i for i in organization_ids if i not in found],
+        }
+
+    async def list_organizations_of_practice_recursively(
+        self,
+        practice_id: int,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        organization_ids = self._organization_ids_of_practice(practice_id, recursive=True)
+        return self._page_of_organizations(organization_ids, page, fields)
+
+    async def list_nearest_organizations(
+        self,
+        lat: float,
+        lon: float,
+        k: int,
+        practice_id: int | None = None,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> list[Item]:
+        """The same expanding circle search as SecundaService.list_nearest_organizations, over the grid."""
+        snapshot = self._snapshot
+        of_practice = set(self._organization_ids_of_practice(practice_id)) if practice_id is not None else None
+        radius = NEAREST_START_RADIUS
+        while True:
+            found = [
+                (distance_wgs84(lat, lon, *snapshot.building_points[b]), i)
+                for b in snapshot.building_index.query_circle(CircleArea(lat=lat, lon=lon, radius=radius))
+                for i in snapshot.organizations_in_building.get(b, [])
+                if of_practice is None or i in of_practice
+            ]
+            if len(found) >= k or radius >= NEAREST_MAX_RADIUS:
+                break
+            radius = next_search_radius(radius, len(found), k)
+        nearest = heapq.nsmallest(k, found)
+        items = snapshot.organization_items([i for _, i in nearest], fields)
+        return [{**item, "distance": distance} for item, (distance, _) in zip(items, nearest)]
+
+    async def search_organizations(
+        self,
+        filters: OrganizationFilters,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        matches: list[set[int]] = []
+        if filters.building_id is not None:
+            matches.append(set(self._snapshot.organizations_in_building.get(filters.building_id, ())))
+        if filters.area is not None:
+            matches.append(set(self._organization_ids_in_area(filters.area)))
+        if filters.practice_id is not None:
+            matches.append(set(self._organization_ids_of_practice(filters.practice_id, filters.recursive)))
+        if matches:
+            candidates: Iterable[int] = matches[0].intersection(*matches[1:])
+            if filters.name is not None:
+                names = self._snapshot.organization_names
+                search_substr = filters.name.lower()
+                candidates = [i for i in candidates if search_substr in names[i]]
+        elif filters.name is not None:
+            candidates = self._snapshot.organization_ids_with_name(filters.name)
+        else:
+            candidates = self._snapshot.organization_ids
+        return self._page_of_organizations(sorted(candidates), page, fields)
 
-    async def search_organizations_by_name(self, search_substr: str) -> list[OrganizationSchema]:
-        scalars = await self._repo.list_organizations_by_name_search(search_substr)
-        return [OrganizationSchema.model_validate(s, from_attributes=True) for s in scalars]
+    async def search_organizations_by_name(
+        self,
+        search_substr: str,
+        page: Pagination,
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> Page[Item]:
+        search_trigrams = trigrams(trigram_words(search_substr))
+        keys = sorted(
+            (-trigram_similarity(words, count, search_trigrams), i)
+            for i, words, count in self._snapshot.organization_trigrams_with_name(search_substr)
+        )
+        if page.after is not None:
+            keys = keys[bisect_right(keys, tuple(page.after)):]
+        keys = keys[:page.limit + 1]
+        next_cursor = encode_cursor(keys[page.limit - 1]) if len(keys) > page.limit else None
+        return Page[Item].model_construct(
+            items=self._snapshot.organization_items([i for _, i in keys[:page.limit]], fields),
+            next_cursor=next_cursor,
+        )
@@ -0,0 +1,460 @@
+"""The catalog snapshot as a flat binary file, mapped read-only by the worker processes of a host.
+
+    python -m snapshot_file PATH [--watch]
+
+Writes the snapshot of read_model.py to PATH, with --watch keeps the read model running and writes
+the file again whenever the catalog changes. Workers started with READ_MODEL_FILE=PATH serve reads
+from the mapped file: its pages are shared through the page cache, so the memory of a host does not
+grow with its workers, and a worker starts without reading the database. The file is replaced
+atomically, workers notice a new one by its inode, checked every SNAPSHOT_FILE_POLL_INTERVAL, and map it.
+
+Layout: MAGIC, the length of a JSON header as uint64 and the header, giving the dataset version and
+the dtype, offset and length of every array. Arrays are 8-byte aligned. A string column is a bytes
+array of the UTF-8 strings laid end to end, with an offsets array of n + 1 items. A list column is
+an offsets array of n + 1 items into a values array, lists of buildings, practices or organizations
+hold their row numbers. Rows are ordered by id.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import mmap
+import os
+from collections.abc import Callable, Iterable, Iterator, Mapping, Sequence
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import numpy.typing as npt
+
+from constants import SNAPSHOT_FILE_POLL_INTERVAL
+from database import engine
+from geo_arrays import CoordinateStore, IdArray, TileClusters
+from read_model import CatalogSnapshot, Item, load_snapshot, read_model
+from schemas import ORGANIZATION_FIELDS, BoxArea, CircleArea
+from utils import box_area_bounds, circle_area_bounds
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SECUNDA1"
+ALIGNMENT = 8
+
+
+# -------------- Writing --------------
+def _offsets(lengths: Iterable[int]) -> IdArray:
+    return np.concatenate(([0], np.cumsum(np.fromiter(lengths, dtype=np.int64), dtype=np.int64)))
+
+
+class _Columns:
+    def __init__(self):
+        self.arrays: dict[str, npt.NDArray[Any]] = {}
+
+    def add(self, name: str, values: Any, dtype: npt.DTypeLike) -> None:
+        self.arrays[name] = np.asarray(values, dtype=np.dtype(dtype).newbyteorder("<"))
+
+    def add_strings(self, name: str, values: Iterable[str]) -> None:
+        encoded = [value.encode() for value in values]
+        self.add(f"{name}.offsets", _offsets(map(len, encoded)), np.int64)
+        self.arrays[f"{name}.bytes"] = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def add_lists(self, name: str, values: Sequence[Sequence[int]]) -> None:
+        self.add(f"{name}.offsets", _offsets(map(len, values)), np.int64)
+        self.add(f"{name}.values", [v for value in values for v in value], np.int64)
+
+
+def write_snapshot(snapshot: CatalogSnapshot, path: Path) -> None:
+    """Writes a file next to path and renames it, a worker never maps a half written one.
+
+    Reads the snapshot without awaiting, so a refresh of the read model cannot change it meanwhile.
+    """
+    building_ids = list(snapshot.building_ids)
+    organization_ids = list(snapshot.organization_ids)
+    practice_ids = list(snapshot.practice_ids)
+    building_row = {building_id: row for row, building_id in enumerate(building_ids)}
+    organization_row = {organization_id: row for row, organization_id in enumerate(organization_ids)}
+    practice_row = {practice_id: row for row, practice_id in enumerate(practice_ids)}
+
+    columns = _Columns()
+    buildings = [snapshot.buildings[i] for i in building_ids]
+    lats, lons = zip(*(snapshot.building_points[i] for i in building_ids)) if building_ids else ((), ())
+    by_lat = np.argsort(np.asarray(lats, dtype=np.float64), kind="stable")
+    columns.add("building.id", building_ids, np.int64)
+    columns.add("building.latitude", lats, np.float64)
+    columns.add("building.longitude", lons, np.float64)
+    columns.add("building.by_latitude", by_lat, np.int64)
+    columns.add("building.sorted_latitude", np.asarray(lats, dtype=np.float64)[by_lat], np.float64)
+    columns.add("building.tile_x", [snapshot.building_tiles[i][0] for i in building_ids], np.int64)
+    columns.add("building.tile_y", [snapshot.building_tiles[i][1] for i in building_ids], np.int64)
+    columns.add_strings("building.address", (b["address"] for b in buildings))
+    columns.add_strings("building.coordinates", (b["coordinates"] for b in buildings))
+    columns.add_lists("building.organizations", [
+        [organization_row[o] for o in snapshot.organizations_in_building.get(i, ())] for i in building_ids
+    ])
+
+    clusters = snapshot.building_clusters
+    columns.add("building_cluster.code", clusters.codes, np.int64)
+    columns.add("building_cluster.latitude_sum", clusters.lat_sums, np.float64)
+    columns.add("building_cluster.longitude_sum", clusters.lon_sums, np.float64)
+    columns.add("building_cluster.organization_sum", clusters.organization_sums, np.int64)
+
+    practices = [snapshot.practices[i] for i in practice_ids]
+    columns.add("practice.id", practice_ids, np.int64)
+    columns.add("practice.parent_id", [-1 if p["parent_id"] is None else p["parent_id"] for p in practices], np.int64)
+    columns.add("practice.level", [p["level"] for p in practices], np.int64)
+    columns.add_strings("practice.name", (p["name"] for p in practices))
+    columns.add_lists("practice.organizations", [
+        [organization_row[o] for o in snapshot.organizations_of_practice.get(i, ())] for i in practice_ids
+    ])
+    columns.add_lists("practice.descendants", [
+        sorted(practice_row[d] for d in snapshot.descendants.get(i, ())) for i in practice_ids
+    ])
+
+    organizations = [snapshot.organizations[i] for i in organization_ids]
+    columns.add("organization.id", organization_ids, np.int64)
+    columns.add("organization.building", [building_row[o["building_id"]] for o in organizations], np.int64)
+    columns.add_strings("organization.name", (o["name"] for o in organizations))
+    columns.add_strings("organization.name_lower", (snapshot.organization_names[i] for i in organization_ids))
+    columns.add_strings("organization.trigram_words", (snapshot.organization_trigrams[i][0] for i in organization_ids))
+    columns.add("organization.trigram_count", [snapshot.organization_trigrams[i][1] for i in organization_ids], np.int64)
+    columns.add("organization.phone_numbers.offsets", _offsets(len(o["phone_numbers"]) for o in organizations), np.int64)
+    columns.add_strings("organization.phone_number", (phone for o in organizations for phone in o["phone_numbers"]))
+    columns.add_lists("organization.practices", [[practice_row[p["id"]] for p in o["practices"]] for o in organizations])
+
+    header: dict[str, Any] = {"version": snapshot.version, "arrays": {}}
+    offset = 0
+    for name, array in columns.arrays.items():
+        header["arrays"][name] = [array.dtype.str, offset, len(array)]
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    encoded_header = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(encoded_header)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("wb") as f:
+        f.write(MAGIC)
+        f.write(len(encoded_header).to_bytes(8, "little"))
+        f.write(encoded_header)
+        for name, array in columns.arrays.items():
+            f.seek(data_start + header["arrays"][name][1])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# -------------- Reading --------------
+class _Strings:
+    def __init__(self, buffer: mmap.mmap, start: int, offsets: IdArray):
+        self._buffer: mmap.mmap = buffer
+        self._start: int = start
+        self._offsets: IdArray = offsets
+
+    def __getitem__(self, row: int) -> str:
+        return self._buffer[self._start + self._offsets[row]:self._start + self._offsets[row + 1]].decode()
+
+    def take(self, rows: IdArray) -> list[str]:
+        starts = (self._offsets[rows] + self._start).tolist()
+        ends = (self._offsets[rows + 1] + self._start).tolist()
+        return [self._buffer[start:end].decode() for start, end in zip(starts, ends)]
+
+    def find(self, substr: str) -> IdArray:
+        """Rows of the strings containing substr."""
+        needle = substr.encode()
+        end = self._start + int(self._offsets[-1])
+        positions: list[int] = []
+        pos = self._buffer.find(needle, self._start, end)
+        while pos != -1:
+            positions.append(pos - self._start)
+            pos = self._buffer.find(needle, pos + 1, end)
+        found = np.asarray(positions, dtype=np.int64)
+        rows = np.searchsorted(self._offsets, found, side="right") - 1
+        # Not the matches spanning two strings
+        return np.unique(rows[found + len(needle) <= self._offsets[rows + 1]])
+
+
+class _Ids(Sequence[int]):
+    """Sorted ids of a mapped id column, as the id lists of CatalogSnapshot."""
+
+    def __init__(self, ids: IdArray):
+        self._ids: IdArray = ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __getitem__(self, index: Any) -> Any:
+        return self._ids[index].tolist()
+
+    def row(self, key: int) -> int | None:
+        row = int(np.searchsorted(self._ids, key))
+        return row if row < len(self._ids) and self._ids[row] == key else None
+
+
+class _ById(Mapping[int, Any]):
+    """Values by id, made from the mapped columns on access."""
+
+    def __init__(self, ids: _Ids, make: Callable[[int], Any]):
+        self._ids: _Ids = ids
+        self._make: Callable[[int], Any] = make
+
+    def __getitem__(self, key: int) -> Any:
+        row = self._ids.row(key)
+        if row is None:
+            raise KeyError(key)
+        return self._make(row)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def values(self) -> Iterator[Any]:  # pyright:ignore[reportIncompatibleMethodOverride]
+        return map(self._make, range(len(self._ids)))
+
+
+class _MappedBuildingIndex:
+    """query_box and query_circle of BuildingIndex over the buildings ordered by latitude."""
+
+    # The masks are exact, the latitude band only has to cover them
+    _BAND_SLACK = 1e-9
+
+    def __init__(self, arrays: dict[str, npt.NDArray[Any]]):
+        self._ids: IdArray = arrays["building.id"]
+        self._lats: npt.NDArray[np.float64] = arrays["building.latitude"]
+        self._lons: npt.NDArray[np.float64] = arrays["building.longitude"]
+        self._by_lat: IdArray = arrays["building.by_latitude"]
+        self._sorted_lats: npt.NDArray[np.float64] = arrays["building.sorted_latitude"]
+
+    def _candidates(self, bounds: tuple[float, float, float, float]) -> CoordinateStore:
+        min_lat, _, max_lat, _ = bounds
+        start = np.searchsorted(self._sorted_lats, min_lat - self._BAND_SLACK, side="left")
+        end = np.searchsorted(self._sorted_lats, max_lat + self._BAND_SLACK, side="right")
+        rows = self._by_lat[start:end]
+        return CoordinateStore(self._ids[rows], self._lats[rows], self._lons[rows])
+
+    def query_box(self, area: BoxArea) -> list[int]:
+        return sorted(self._candidates(box_area_bounds(area)).in_box_area(area).tolist())
+
+    def query_circle(self, area: CircleArea) -> list[int]:
+        return sorted(self._candidates(circle_area_bounds(area)).in_circle_area(area).tolist())
+
+
+class MappedSnapshot:
+    """A snapshot file mapped read-only, with the interface of CatalogSnapshot that SnapshotService uses.
+
+    Items are made on access, nothing per building or organization is kept in the process.
+    """
+
+    def __init__(self, path: Path):
+        with path.open("rb") as f:
+            self.inode: int = os.fstat(f.fileno()).st_ino
+            self._buffer: mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._buffer[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a catalog snapshot file")
+        header_start = len(MAGIC) + 8
+        header_length = int.from_bytes(self._buffer[len(MAGIC):header_start], "little")
+        header = json.loads(self._buffer[header_start:header_start + header_length])
+        data_start = -(-(header_start + header_length) // ALIGNMENT) * ALIGNMENT
+
+        self.version: int = header["version"]
+        self._array_starts: dict[str, int] = {}
+        arrays: dict[str, npt.NDArray[Any]] = {}
+        for name, (dtype, offset, length) in header["arrays"].items():
+            self._array_starts[name] = data_start + offset
+            arrays[name] = np.frombuffer(self._buffer, dtype=np.dtype(dtype), count=length, offset=data_start + offset)
+        self._arrays: dict[str, npt.NDArray[Any]] = arrays
+
+        self._building_ids: IdArray = arrays["building.id"]
+        self._practice_ids: IdArray = arrays["practice.id"]
+        self._organization_ids: IdArray = arrays["organization.id"]
+        self._building_address: _Strings = self._strings("building.address")
+        self._building_coordinates: _Strings = self._strings("building.coordinates")
+        self._practice_name: _Strings = self._strings("practice.name")
+        self._organization_name: _Strings = self._strings("organization.name")
+        self._organization_name_lower: _Strings = self._strings("organization.name_lower")
+        self._organization_phone_number: _Strings = self._strings("organization.phone_number")
+        self._organization_trigram_words: _Strings = self._strings("organization.trigram_words")
+
+        self.building_ids: _Ids = _Ids(self._building_ids)
+        self.practice_ids: _Ids = _Ids(self._practice_ids)
+        self.organization_ids: _Ids = _Ids(self._organization_ids)
+
+        self.buildings: _ById = _ById(self.building_ids, self._building)
+        self.building_points: _ById = _ById(
+            self.building_ids,
+            lambda row: (float(arrays["building.latitude"][row]), float(arrays["building.longitude"][row])),
+        )
+        self.building_index: _MappedBuildingIndex = _MappedBuildingIndex(arrays)
+        self.building_tiles: _ById = _ById(
+            self.building_ids,
+            lambda row: (int(arrays["building.tile_x"][row]), int(arrays["building.tile_y"][row])),
+        )
+        self.building_clusters: TileClusters = TileClusters(
+            arrays["building_cluster.code"],
+            arrays["building_cluster.latitude_sum"],
+            arrays["building_cluster.longitude_sum"],
+            arrays["building_cluster.organization_sum"],
+        )
+        self.practices: _ById = _ById(self.practice_ids, self._practice)
+        self.descendants: _ById = _ById(
+            self.practice_ids,
+            lambda row: self._practice_ids[self._list("practice.descendants", row)].tolist(),
+        )
+        self.organizations: _ById = _ById(self.organization_ids, self._organization)
+        self.organization_names: _ById = _ById(self.organization_ids, self._organization_name_lower.__getitem__)
+        self.organizations_in_building: _ById = _ById(
+            self.building_ids,
+            lambda row: self._organization_ids[self._list("building.organizations", row)].tolist(),
+        )
+        self.organizations_of_practice: _ById = _ById(
+            self.practice_ids,
+            lambda row: self._organization_ids[self._list("practice.organizations", row)].tolist(),
+        )
+
+    def _strings(self, name: str) -> _Strings:
+        return _Strings(self._buffer, self._array_starts[f"{name}.bytes"], self._arrays[f"{name}.offsets"])
+
+    def _list(self, name: str, row: int) -> IdArray:
+        offsets = self._arrays[f"{name}.offsets"]
+        return self._arrays[f"{name}.values"][offsets[row]:offsets[row + 1]]
+
+    def _building(self, row: int) -> Item:
+        return {
+            "id": int(self._building_ids[row]),
+            "address": self._building_address[row],
+            "coordinates": self._building_coordinates[row],
+        }
+
+    def _practice(self, row: int) -> Item:
+        parent_id = int(self._arrays["practice.parent_id"][row])
+        organization_rows = self._list("practice.organizations", row)
+        return {
+            "id": int(self._practice_ids[row]),
+            "name": self._practice_name[row],
+            "parent_id": None if parent_id == -1 else parent_id,
+            "level": int(self._arrays["practice.level"][row]),
+            "organizations": [
+                {"id": organization_id, "name": name}
+                for organization_id, name in zip(
+                    self._organization_ids[organization_rows].tolist(),
+                    self._organization_name.take(organization_rows),
+                )
+            ],
+        }
+
+    def _organization(self, row: int, fields: tuple[str, ...] = ORGANIZATION_FIELDS) -> Item:
+        item: Item = {"id": int(self._organization_ids[row])}
+        if "name" in fields:
+            item["name"] = self._organization_name[row]
+        if "phone_numbers" in fields:
+            phone_offsets = self._arrays["organization.phone_numbers.offsets"]
+            item["phone_numbers"] = self._organization_phone_number.take(
+                np.arange(int(phone_offsets[row]), int(phone_offsets[row + 1]))
+            )
+        if "building_id" in fields:
+            item["building_id"] = int(self._building_ids[self._arrays["organization.building"][row]])
+        if "practices" in fields:
+            practice_rows = self._list("organization.practices", row)
+            item["practices"] = [
+                {"id": practice_id, "name": name}
+                for practice_id, name in zip(
+                    self._practice_ids[practice_rows].tolist(),
+                    self._practice_name.take(practice_rows),
+                )
+            ]
+        return item
+
+    def organization_items(
+        self,
+        organization_ids: Iterable[int],
+        fields: tuple[str, ...] = ORGANIZATION_FIELDS,
+    ) -> list[Item]:
+        rows = np.searchsorted(self._organization_ids, np.fromiter(organization_ids, dtype=np.int64))
+        return [self._organization(row, fields) for row in rows.tolist()]
+
+    def building_clusters_of(self, organization_ids: Iterable[int]) -> TileClusters:
+        rows = np.searchsorted(self._organization_ids, np.fromiter(organization_ids, dtype=np.int64))
+        building_rows, counts = np.unique(self._arrays["organization.building"][rows], return_counts=True)
+        arrays = self._arrays
+        return TileClusters.build(
+            arrays["building.tile_x"][building_rows],
+            arrays["building.tile_y"][building_rows],
+            arrays["building.latitude"][building_rows],
+            arrays["building.longitude"][building_rows],
+            counts,
+        )
+
+    def organization_ids_with_name(self, search_substr: str) -> list[int]:
+        return self._organization_ids[self._organization_name_lower.find(search_substr.lower())].tolist()
+
+    def organization_trigrams_with_name(self, search_substr: str) -> list[tuple[int, str, int]]:
+        rows = self._organization_name_lower.find(search_substr.lower())
+        return list(zip(
+            self._organization_ids[rows].tolist(),
+            self._organization_trigram_words.take(rows),
+            self._arrays["organization.trigram_count"][rows].tolist(),
+        ))
+
+
+class MappedReadModel:
+    """Serves reads from a snapshot file, mapping it again when the loader has replaced it."""
+
+    def __init__(self):
+        self.snapshot: MappedSnapshot | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    async def start(self, path: Path) -> None:
+        self.snapshot = MappedSnapshot(path)
+        logger.info("Snapshot file %s mapped, version %d", path, self.snapshot.version)
+        self._task = asyncio.create_task(self._follow(path))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _follow(self, path: Path) -> None:
+        while True:
+            await asyncio.sleep(SNAPSHOT_FILE_POLL_INTERVAL)
+            try:
+                assert self.snapshot is not None
+                if os.stat(path).st_ino != self.snapshot.inode:
+                    # Requests holding the previous mapping keep it until they are done
+                    self.snapshot = MappedSnapshot(path)
+                    logger.info("Snapshot file %s mapped, version %d", path, self.snapshot.version)
+            except Exception:
+                logger.exception("Mapping snapshot file %s failed", path)
+
+
+mapped_read_model = MappedReadModel()
+
+
+# -------------- Loader --------------
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--watch", action="store_true", help="write the file again on every catalog change")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if not args.watch:
+        write_snapshot(await load_snapshot(), args.path)
+        await engine.dispose()
+        return
+    await read_model.start()
+    written: int | None = None
+    try:
+        while True:
+            # Written right after the refresh that changed it, nothing else runs on the loop meanwhile
+            snapshot = await read_model.wait_for_version(written)
+            write_snapshot(snapshot, args.path)
+            written = snapshot.version
+            logger.info("Snapshot file %s written, version %d", args.path, written)
+    finally:
+        await read_model.stop()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import asyncio
+import os
+import subprocess
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+from typing import cast
+
+import asyncpg
+import pytest
+from anyio.from_thread import BlockingPortal
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).parent.parent
+
+# Settings are read on import, the required ones default to those of example.env
+for line in (ROOT / "example.env").read_text().splitlines():
+    name, sep, value = line.partition("=")
+    if sep:
+        os.environ.setdefault(name.strip(), value.strip())
+# A database of their own for the tests, created anew on every run
+os.environ["DB_NAME"] = f"{os.environ['DB_NAME']}_test"
+
+from config import settings  # noqa: E402
+
+# The sizes CI checks query plans at, smaller tables are rightly read whole by the planner
+SEED_BUILDINGS = 50_000
+SEED_ORGANIZATIONS = 150_000
+
+
+async def _recreate_database() -> None:
+    conn = await asyncpg.connect(
+        user=settings.DB_USER,
+        password=settings.DB_PASSWORD,
+        host=settings.DB_HOST,
+        port=settings.DB_PORT,
+        database="postgres",
+    )
+    try:
+        await conn.execute(f'DROP DATABASE IF EXISTS "{settings.DB_NAME}" WITH (FORCE)')
+        await conn.execute(f'CREATE DATABASE "{settings.DB_NAME}"')
+    finally:
+        await conn.close()
+
+
+@pytest.fixture(scope="session")
+def catalog_db(tmp_path_factory: pytest.TempPathFactory) -> None:
+    """The test database migrated to head and seeded with the catalog of benchmarks.generate_catalog --seed 0.
+    Tests using it are skipped when there is no PostgreSQL to connect to.
+    """
+    try:
+        asyncio.run(_recreate_database())
+    except (OSError, asyncpg.PostgresError) as e:
+        pytest.skip(f"No database: {e}")
+    # Processes of their own, alembic configures logging and the loader runs its own event loop
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=ROOT, check=True)
+    subprocess.run(
+        [
+            sys.executable, "-m", "benchmarks.generate_catalog",
+            "--out", str(tmp_path_factory.mktemp("catalog")),
+            "--buildings", str(SEED_BUILDINGS),
+            "--organizations", str(SEED_ORGANIZATIONS),
+            "--seed", "0",
+            "--load",
+        ],
+        cwd=ROOT,
+        check=True,
+    )
+
+
+@pytest.fixture(scope="session")
+def client(catalog_db: None) -> Iterator[TestClient]:
+    # Entered, so the app and its connections live on the one event loop of the client's portal
+    from main import app
+
+    with TestClient(app, headers={"X-API-Key": settings.API_KEY}) as c:
+        yield c
+
+
+@pytest.fixture(scope="session")
+def portal(client: TestClient) -> BlockingPortal:
+    """Runs coroutines on the event loop of the app, where its pooled connections belong."""
+    # Typed by starlette with the deprecated anyio.abc alias of BlockingPortal
+    portal = cast(BlockingPortal | None, client.portal)  # pyright:ignore[reportUnknownMemberType]
+    assert portal is not None
+    return portal
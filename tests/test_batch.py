@@ -0,0 +1,51 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from constants import BATCH_MAX_IDS
+from service import SnapshotService
+
+from test_read_model import _snapshot  # pyright:ignore[reportPrivateUsage]
+
+
+URL = "/api/v1/organizations/batch"
+MISSING = 999_999_999
+
+
+def _batch(client: TestClient, ids: list[int]) -> tuple[list[int], list[int]]:
+    r = client.get(URL, params={"ids": ids})
+    assert r.status_code == 200
+    body = r.json()
+    return [item["id"] for item in body["items"]], body["missing"]
+
+
+def test_request_order(client: TestClient):
+    assert _batch(client, [5, 3, 9, 1]) == ([5, 3, 9, 1], [])
+
+
+def test_duplicates_are_listed_once(client: TestClient):
+    assert _batch(client, [5, 3, 5, 5, 3]) == ([5, 3], [])
+    assert _batch(client, [MISSING, 5, MISSING]) == ([5], [MISSING])
+
+
+def test_missing_ids(client: TestClient):
+    assert _batch(client, [MISSING, 5, MISSING - 1, 3]) == ([5, 3], [MISSING, MISSING - 1])
+    assert _batch(client, [MISSING]) == ([], [MISSING])
+
+
+def test_item_is_the_single_organization(client: TestClient):
+    body = client.get(URL, params={"ids": [7]}).json()
+    assert body["items"] == [client.get("/api/v1/organizations/7").json()]
+
+
+@pytest.mark.parametrize("ids", [[], list(range(1, BATCH_MAX_IDS + 2))])
+def test_invalid_ids(client: TestClient, ids: list[int]):
+    assert client.get(URL, params={"ids": ids}).status_code == 422
+
+
+def test_snapshot_service_gives_the_same():
+    service = SnapshotService(_snapshot())
+    result = asyncio.run(service.get_organizations([12, MISSING, 10]))
+    assert [item["id"] for item in result["items"]] == [12, 10]
+    assert result["missing"] == [MISSING]
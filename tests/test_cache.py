@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any
+
+import pytest
+from sqlalchemy.orm import Session
+
+import cache
+from cache import cached, caches, invalidate_caches, normalize_cache_key
+from config import settings
+from models import Building, Organization
+from schemas import BoxArea, CircleArea, Page
+
+
+class _Service:
+    def __init__(self):
+        self.calls = 0
+
+    @cached(ttl=60, maxsize=8)
+    async def list_page(self, practice_id: int, area: BoxArea | None = None) -> Page[dict[str, Any]]:
+        self.calls += 1
+        return Page(items=[{"id": practice_id, "practices": [{"id": 1}]}], next_cursor=None)
+
+
+@pytest.fixture
+def service(monkeypatch: pytest.MonkeyPatch) -> _Service:
+    monkeypatch.setattr(settings, "CACHE_ENABLED", True)
+    invalidate_caches("list_page")
+    return _Service()
+
+
+def test_box_key_is_its_center_and_size():
+    box = BoxArea(lat1=55.75, lon1=37.61, lat2=55.76, lon2=37.62)
+    mirrored = BoxArea(lat1=55.75, lon1=37.61, lat2=55.74, lon2=37.60)
+    assert normalize_cache_key(box) == normalize_cache_key(mirrored)
+    assert normalize_cache_key(box) != normalize_cache_key(BoxArea(lat1=55.75, lon1=37.61, lat2=55.77, lon2=37.62))
+
+
+def test_coordinates_are_rounded_in_keys():
+    circle = CircleArea(lat=55.7575, lon=37.613, radius=1.5)
+    assert normalize_cache_key(CircleArea(lat=55.75750000001, lon=37.613, radius=1.5)) == normalize_cache_key(circle)
+    assert normalize_cache_key(CircleArea(lat=55.7576, lon=37.613, radius=1.5)) != normalize_cache_key(circle)
+    assert normalize_cache_key([circle, (1, 2)]) == (normalize_cache_key(circle), (1, 2))
+
+
+def test_same_arguments_are_one_entry(service: _Service):
+    box = BoxArea(lat1=55.75, lon1=37.61, lat2=55.76, lon2=37.62)
+    asyncio.run(service.list_page(1, area=box))
+    asyncio.run(service.list_page(1, area=box.model_copy(update={"lat2": 55.74})))
+    asyncio.run(service.list_page(2, area=box))
+    assert service.calls == 2
+    assert len(caches["list_page"]) == 2
+
+
+def test_cached_value_is_read_only(service: _Service):
+    first = asyncio.run(service.list_page(1))
+    first.items[0]["practices"].append({"id": 2})
+    second = asyncio.run(service.list_page(1))
+    assert second.items == [{"id": 1, "practices": [{"id": 1}]}]
+    with pytest.raises(TypeError):
+        second.items[0]["practices"].append({"id": 2})
+    with pytest.raises(TypeError):
+        second.items[0]["name"] = "Рога и Копыта"
+    second.next_cursor = "changed"
+    assert asyncio.run(service.list_page(1)).next_cursor is None
+    assert service.calls == 1
+
+
+def _commit(*objects: object) -> None:
+    # The listeners as a flush and commit of these objects run them, without a database
+    session = Session()
+    session.add_all(objects)
+    cache._note_catalog_changes(session, None)  # pyright:ignore[reportPrivateUsage]
+    cache._invalidate_on_commit(session)  # pyright:ignore[reportPrivateUsage]
+
+
+def test_commit_of_catalog_changes_drops_caches(service: _Service):
+    asyncio.run(service.list_page(1))
+    _commit()
+    asyncio.run(service.list_page(1))
+    assert service.calls == 1
+
+    _commit(Organization(name="Рога и Копыта", phone_numbers=[], building_id=1))
+    asyncio.run(service.list_page(1))
+    assert service.calls == 2
+
+    _commit(Building(address="г. Москва, ул. Тверская 1", coordinates="55.7575,37.613"))
+    asyncio.run(service.list_page(1))
+    assert service.calls == 3
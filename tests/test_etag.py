@@ -0,0 +1,38 @@
+from anyio.from_thread import BlockingPortal
+from fastapi.testclient import TestClient
+
+from database import async_session_maker
+from models import Organization
+
+
+URL = "/api/v1/practices/all"
+
+
+async def _rename_organization(organization_id: int, name: str) -> str:
+    async with async_session_maker() as session:
+        organization = await session.get(Organization, organization_id)
+        assert organization is not None
+        old, organization.name = organization.name, name
+        await session.commit()
+        return old
+
+
+def test_not_modified(client: TestClient):
+    etag = client.get(URL).headers["ETag"]
+    for if_none_match in (etag, f"W/{etag}", f'"0", {etag}', "*"):
+        r = client.get(URL, headers={"If-None-Match": if_none_match})
+        assert r.status_code == 304
+        assert r.content == b""
+        assert r.headers["ETag"] == etag
+    assert client.get(URL, headers={"If-None-Match": '"0"'}).status_code == 200
+
+
+def test_committed_write_changes_etag(client: TestClient, portal: BlockingPortal):
+    etag = client.get(URL).headers["ETag"]
+    old = portal.call(_rename_organization, 1, "Рога и Копыта")
+    try:
+        r = client.get(URL, headers={"If-None-Match": etag})
+        assert r.status_code == 200
+        assert r.headers["ETag"] != etag
+    finally:
+        portal.call(_rename_organization, 1, old)
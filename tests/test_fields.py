@@ -0,0 +1,58 @@
+from itertools import combinations
+
+import pytest
+from fastapi.testclient import TestClient
+
+from repository import _BUILDING_COLUMNS, _ORGANIZATION_COLUMNS, _columns_of  # pyright:ignore[reportPrivateUsage]
+from schemas import BUILDING_FIELDS, ORGANIZATION_FIELDS, ORGANIZATION_RELATIONSHIPS
+
+
+ATTRIBUTES = [f for f in ORGANIZATION_FIELDS if f != "id" and f not in ORGANIZATION_RELATIONSHIPS]
+
+
+def _keys(client: TestClient, url: str, **params: str) -> list[list[str]]:
+    r = client.get(url, params={**params, "limit": "3"})
+    assert r.status_code == 200
+    assert r.json()
+    return [list(item) for item in r.json()]
+
+
+@pytest.mark.parametrize("fields", [c for n in range(len(ATTRIBUTES) + 1) for c in combinations(ATTRIBUTES, n)])
+@pytest.mark.parametrize("include", [None, "", "practices"])
+def test_organization_keys_are_the_projection(client: TestClient, fields: tuple[str, ...], include: str | None):
+    params = {"fields": ",".join(fields)} if fields else {}
+    if include is not None:
+        params["include"] = include
+    chosen: set[str] = set(fields or ATTRIBUTES) | ({"practices"} if include in (None, "practices") else set())
+    expected = [f for f in ORGANIZATION_FIELDS if f == "id" or f in chosen]
+    # The columns selected are the fields shown, the relationships come from a query of their own
+    columns = [c.key for c in _columns_of(_ORGANIZATION_COLUMNS, expected)]
+    assert columns == [f for f in expected if f not in ORGANIZATION_RELATIONSHIPS]
+    assert _keys(client, "/api/v1/organizations/all", **params) == [expected] * 3
+    assert _keys(client, "/api/v1/organizations/search_by_name", search="Кофе", **params) == [expected] * 3
+
+
+@pytest.mark.parametrize("fields", ["address", "coordinates", "id", "address,coordinates"])
+def test_building_keys_are_the_projection(client: TestClient, fields: str):
+    expected = [f for f in BUILDING_FIELDS if f == "id" or f in fields.split(",")]
+    assert [c.key for c in _columns_of(_BUILDING_COLUMNS, expected)] == expected
+    assert _keys(client, "/api/v1/buildings/all", fields=fields) == [expected] * 3
+
+
+def test_empty_fields_are_the_id(client: TestClient):
+    assert _keys(client, "/api/v1/organizations/all", fields=" , ", include="") == [["id"]] * 3
+
+
+@pytest.mark.parametrize(
+    ("url", "params", "detail"),
+    [
+        ("/api/v1/organizations/all", {"fields": "name,rank"}, "Unknown fields: rank"),
+        ("/api/v1/organizations/all", {"fields": "practices"}, "Unknown fields: practices"),
+        ("/api/v1/organizations/all", {"include": "building,name"}, "Unknown include: building, name"),
+        ("/api/v1/buildings/all", {"fields": "latitude"}, "Unknown fields: latitude"),
+    ],
+)
+def test_unknown_names(client: TestClient, url: str, params: dict[str, str], detail: str):
+    r = client.get(url, params=params)
+    assert r.status_code == 422
+    assert r.json() == {"detail": detail}
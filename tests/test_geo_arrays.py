@@ -0,0 +1,73 @@
+from collections import defaultdict
+from typing import Any
+
+import numpy as np
+import pytest
+
+from constants import CLUSTER_TILE_ZOOM
+from geo_arrays import TileClusters, morton_codes
+from schemas import ClusterGrid
+from utils import mercator_tile
+
+
+def test_morton_codes():
+    xs = np.array([0, 1, 0, 1, 2, 5, (1 << CLUSTER_TILE_ZOOM) - 1], dtype=np.int64)
+    ys = np.array([0, 0, 1, 1, 0, 3, (1 << CLUSTER_TILE_ZOOM) - 1], dtype=np.int64)
+    assert morton_codes(xs, ys).tolist() == [0, 1, 2, 3, 4, 0b011011, (1 << 2 * CLUSTER_TILE_ZOOM) - 1]
+
+
+def _reference_cells(
+    tiles: list[tuple[int, int]],
+    points: list[tuple[float, float]],
+    counts: list[int],
+    grid: ClusterGrid,
+) -> list[dict[str, Any]]:
+    """Buildings grouped by the cell of their tile one by one, as the database groups them."""
+    shift = CLUSTER_TILE_ZOOM - grid.zoom
+    cells: defaultdict[tuple[int, int], list[tuple[float, float, int]]] = defaultdict(list)
+    for (tile_x, tile_y), (lat, lon), n in zip(tiles, points, counts):
+        x, y = tile_x >> shift, tile_y >> shift
+        if grid.x1 <= x <= grid.x2 and grid.y1 <= y <= grid.y2:
+            cells[y, x].append((lat, lon, n))
+    return [
+        {
+            "x": x,
+            "y": y,
+            "latitude": pytest.approx(sum(b[0] for b in buildings) / len(buildings)),
+            "longitude": pytest.approx(sum(b[1] for b in buildings) / len(buildings)),
+            "buildings": len(buildings),
+            "organizations": sum(b[2] for b in buildings),
+        }
+        for (y, x), buildings in sorted(cells.items())
+    ]
+
+
+@pytest.mark.parametrize("zoom", [8, 11, 14, 17, 20])
+def test_cells_are_the_reference_aggregation(zoom: int):
+    rng = np.random.default_rng(0)
+    # Dense around a center, as a city is, and a few points sharing a tile
+    points = [(float(lat), float(lon)) for lat, lon in rng.normal((55.75, 37.62), 0.05, (2000, 2))]
+    points += [points[0]] * 3
+    tiles = [mercator_tile(lat, lon, CLUSTER_TILE_ZOOM) for lat, lon in points]
+    counts = rng.integers(0, 5, len(points)).tolist()
+    clusters = TileClusters.build(
+        np.array([t[0] for t in tiles]),
+        np.array([t[1] for t in tiles]),
+        np.array([p[0] for p in points]),
+        np.array([p[1] for p in points]),
+        np.array(counts),
+    )
+
+    # The west half of the points at a high zoom, cells on the grid edges included
+    x1, y1 = mercator_tile(55.85, 37.45, zoom)
+    x2, y2 = mercator_tile(55.65, 37.62, zoom)
+    grid = ClusterGrid(zoom=zoom, x1=x1, y1=y1, x2=x2, y2=y2)
+    cells = clusters.cells(grid)
+    assert cells == _reference_cells(tiles, points, counts, grid)
+    assert sum(cell["buildings"] for cell in cells) > 0
+
+
+def test_no_buildings():
+    empty = np.array([], dtype=np.int64)
+    clusters = TileClusters.build(empty, empty, empty.astype(np.float64), empty.astype(np.float64), empty)
+    assert clusters.cells(ClusterGrid(zoom=10, x1=0, y1=0, x2=3, y2=3)) == []
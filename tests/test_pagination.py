@@ -0,0 +1,72 @@
+import base64
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from dependencies import NEXT_CURSOR_HEADER
+from utils import decode_cursor, encode_cursor
+
+
+def _pages(client: TestClient, url: str, limit: int, count: int, **params: str) -> tuple[list[int], list[str]]:
+    """Ids of the first count pages and the cursors between them."""
+    ids: list[int] = []
+    cursors: list[str] = []
+    params = {**params, "limit": str(limit)}
+    for _ in range(count):
+        r = client.get(url, params=params)
+        assert r.status_code == 200
+        ids += [item["id"] for item in r.json()]
+        cursor = r.headers.get(NEXT_CURSOR_HEADER)
+        if cursor is None:
+            break
+        cursors.append(cursor)
+        params["after"] = cursor
+    return ids, cursors
+
+
+def test_next_page_starts_after_the_cursor(client: TestClient):
+    ids, cursors = _pages(client, "/api/v1/organizations/all", 50, 2)
+    whole = [item["id"] for item in client.get("/api/v1/organizations/all", params={"limit": 100}).json()]
+    assert ids == whole
+    assert decode_cursor(cursors[0]) == [whole[49]]
+
+
+def test_ties_on_the_rank_are_ordered_by_id(client: TestClient):
+    url = "/api/v1/organizations/search_by_name"
+    ids, cursors = _pages(client, url, 5, 12, search="Кофе")
+    whole = [item["id"] for item in client.get(url, params={"search": "Кофе", "limit": 60}).json()]
+    assert ids == whole
+    # Names of the same length are as similar to the search, a page ends amid equal ranks
+    ranks = [decode_cursor(cursor)[0] for cursor in cursors]
+    assert any(a == b for a, b in zip(ranks, ranks[1:]))
+
+
+@pytest.mark.parametrize("limit", [31, 155])
+def test_last_full_page_has_no_cursor(client: TestClient, limit: int):
+    # 155 practices, pages of a divisor of it end without an empty one after
+    ids, cursors = _pages(client, "/api/v1/practices/all", limit, 10)
+    assert len(ids) == len(set(ids)) == 155
+    assert len(cursors) == 155 // limit - 1
+
+
+def test_short_last_page(client: TestClient):
+    ids, cursors = _pages(client, "/api/v1/practices/all", 154, 10)
+    assert len(ids) == 155 and len(cursors) == 1
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "not a cursor",
+        base64.urlsafe_b64encode(b"[1").decode(),
+        encode_cursor([1, 2]),  # a key of the ranked search
+        base64.urlsafe_b64encode(json.dumps(["1"]).encode()).decode(),
+        base64.urlsafe_b64encode(json.dumps({"id": 1}).encode()).decode(),
+        base64.urlsafe_b64encode(json.dumps([]).encode()).decode(),
+    ],
+)
+def test_invalid_cursor(client: TestClient, cursor: str):
+    r = client.get("/api/v1/organizations/all", params={"after": cursor})
+    assert r.status_code == 422
+    assert r.json() == {"detail": "Invalid cursor"}
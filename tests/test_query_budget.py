@@ -0,0 +1,243 @@
+"""Statement budgets and query plans of the SecundaService read methods.
+
+Every method runs against the seeded test database with the cache off. A check fails when the method
+issues more SQL statements than its budget, or when the plan of one of them reads a table of at least
+MIN_ROWS rows with a sequential scan. The catalog is seeded with a fixed seed, so are the sample and
+the points, every run checks the same queries.
+"""
+import json
+import random
+from collections.abc import Awaitable, Callable, Iterator
+from dataclasses import dataclass, field
+from typing import Any
+
+import pytest
+from anyio.from_thread import BlockingPortal
+from sqlalchemy import Engine, event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.endpoints import Sample, load_sample
+from config import settings
+from constants import NEAREST_MAX_RADIUS, NEAREST_START_RADIUS
+from database import async_session_maker
+from dependencies import cluster_grid_query
+from repository import Repository
+from schemas import BoxArea, CircleArea, ClusterGrid, OrganizationFilters, Pagination
+from service import SecundaService
+from utils import next_search_radius
+
+
+PAGE = Pagination(limit=100)
+NEAREST_K = 20
+MIN_ROWS = 10_000
+
+_captured: list[tuple[str, Any]] | None = None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _capture_statement(conn: Any, cursor: Any, statement: str, parameters: Any, *_: Any) -> None:
+    if _captured is not None:
+        _captured.append((statement, parameters))
+
+
+@dataclass
+class Check:
+    name: str
+    call: Callable[[SecundaService, Sample], Awaitable[Any]]
+    budget: int  # statements
+    building_index: bool | None = None  # run with BUILDING_INDEX_ENABLED set to this value
+    # Tables whose full scan is the faster plan, with the plans measured on the seeded catalog
+    allow_seq_scan: set[str] = field(default_factory=set[str])
+    extension: str | None = None  # skipped without it
+
+    def __str__(self) -> str:
+        return self.name
+
+
+def _box(s: Sample) -> BoxArea:
+    lat, lon = s.point()
+    return BoxArea(lat1=lat, lon1=lon, lat2=lat + 0.01, lon2=lon + 0.01)
+
+
+def _circle(s: Sample, radius: float = 1) -> CircleArea:
+    lat, lon = s.point()
+    return CircleArea(lat=lat, lon=lon, radius=radius)
+
+
+def _nearest_budget(k: int) -> int:
+    """Statements of a nearest-k search that grows its circle as little as it can until NEAREST_MAX_RADIUS:
+    a query per circle and one for the practices of the found organizations. Whatever the data."""
+    circles, radius = 1, NEAREST_START_RADIUS
+    while radius < NEAREST_MAX_RADIUS:
+        radius = next_search_radius(radius, k - 1, k)
+        circles += 1
+    return circles + 1
+
+
+def _grid(s: Sample, zoom: int) -> ClusterGrid:
+    lat, lon = s.point()
+    span = 1920 / 256 * 360 / 2 ** zoom
+    return cluster_grid_query(f"{lon - span / 2},{lat - span / 4},{lon + span / 2},{lat + span / 4}", zoom)
+
+
+CHECKS = [
+    Check("list_all_buildings", lambda svc, s: svc.list_all_buildings(PAGE), 1),
+    Check(
+        "list_all_practices",
+        lambda svc, s: svc.list_all_practices(PAGE),
+        2,
+        # A page of practices lists every organization of each of them: 184k of the 318k links and
+        # all 150k organizations. 391 ms scanning them, 402 ms with seqscan off for their indexes.
+        allow_seq_scan={"organization", "organization_practice"},
+    ),
+    Check("list_all_organizations", lambda svc, s: svc.list_all_organizations(PAGE), 2),
+    Check("list_all_organizations[fields=name]", lambda svc, s: svc.list_all_organizations(PAGE, ("id", "name")), 1),
+    Check(
+        "list_organizations_in_building",
+        lambda svc, s: svc.list_organizations_in_building(s.building_ids[0], PAGE),
+        2,
+    ),
+    Check(
+        "list_organizations_of_practice",
+        lambda svc, s: svc.list_organizations_of_practice(s.practice_ids[0], PAGE),
+        2,
+    ),
+    Check(
+        "list_organizations_of_practice_recursively",
+        lambda svc, s: svc.list_organizations_of_practice_recursively(s.practice_ids[0], PAGE),
+        2,
+    ),
+    Check("get_organization", lambda svc, s: svc.get_organization(s.organization_ids[0]), 3),
+    Check("get_organizations", lambda svc, s: svc.get_organizations(s.organization_ids), 2),
+    Check(
+        "search_organizations_by_name",
+        # A whole name, common substrings are rightly served by a full scan
+        lambda svc, s: svc.search_organizations_by_name(s.names[0], PAGE),
+        2,
+        extension="pg_trgm",
+    ),
+    Check(
+        "search_organizations[area, practice subtree]",
+        lambda svc, s: svc.search_organizations(
+            OrganizationFilters(area=_circle(s), practice_id=s.practice_ids[0], recursive=True),
+            PAGE,
+        ),
+        2,
+    ),
+    Check(
+        "search_organizations[building, name]",
+        lambda svc, s: svc.search_organizations(
+            OrganizationFilters(building_id=s.building_ids[0], name=s.names[0][:3]),
+            PAGE,
+        ),
+        2,
+    ),
+    Check(
+        "list_nearest_organizations",
+        lambda svc, s: svc.list_nearest_organizations(*s.point(), NEAREST_K),
+        _nearest_budget(NEAREST_K),
+    ),
+    Check(
+        "list_nearest_organizations[practice]",
+        lambda svc, s: svc.list_nearest_organizations(*s.point(), NEAREST_K, s.practice_ids[0]),
+        _nearest_budget(NEAREST_K),
+    ),
+    Check("list_buildings_in_area[box, sql]", lambda svc, s: svc.list_buildings_in_area(_box(s), PAGE), 1, False),
+    Check("list_buildings_in_area[circle, sql]", lambda svc, s: svc.list_buildings_in_area(_circle(s), PAGE), 1, False),
+    Check("list_buildings_in_area[box, index]", lambda svc, s: svc.list_buildings_in_area(_box(s), PAGE), 1, True),
+    Check("list_organizations_in_area[box]", lambda svc, s: svc.list_organizations_in_area(_box(s), PAGE), 2),
+    Check(
+        "list_organizations_in_area[circle]",
+        lambda svc, s: svc.list_organizations_in_area(_circle(s), PAGE),
+        2,
+    ),
+    Check(
+        "list_organizations_in_area[large circle]",
+        lambda svc, s: svc.list_organizations_in_area(_circle(s, radius=10), PAGE),
+        2,
+    ),
+    Check("list_building_clusters", lambda svc, s: svc.list_building_clusters(_grid(s, 16)), 1),
+    Check(
+        "list_building_clusters[zoomed out, practice subtree]",
+        lambda svc, s: svc.list_building_clusters(_grid(s, 12), s.practice_ids[0], True),
+        2,
+        # The 2.5k organizations of the practice are looked up in a hash of the whole table rather
+        # than by 2.5k primary key lookups: 62 ms, 80 ms with seqscan off.
+        allow_seq_scan={"organization"},
+    ),
+]
+
+
+def seq_scans(plan: dict[str, Any]) -> Iterator[str]:
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", []):
+        yield from seq_scans(child)
+
+
+async def explain(session: AsyncSession, statement: str, parameters: Any) -> dict[str, Any]:
+    raw = await (await session.connection()).get_raw_connection()
+    res = await raw.driver_connection.fetchval(  # pyright:ignore[reportOptionalMemberAccess]
+        f"EXPLAIN (FORMAT JSON) {statement}",
+        *(parameters or ()),
+    )
+    # SQLAlchemy registers a json codec on its connections, a bare asyncpg one returns text
+    plans = json.loads(res) if isinstance(res, str) else res
+    return plans[0]["Plan"]
+
+
+async def run_check(check: Check, sample: Sample) -> list[str]:
+    """Problems found, none when the check passes."""
+    global _captured
+    async with async_session_maker() as session:
+        large = set(await session.scalars(
+            text("SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= :min_rows"),
+            {"min_rows": MIN_ROWS},
+        ))
+        assert large, f"No table has {MIN_ROWS} rows, plans can't be checked"
+
+        service = SecundaService(Repository(session))
+        if check.building_index:
+            # Building the index is a one-off cost, not a part of the query
+            await service._find_building_ids_in_index(_box(sample))  # pyright:ignore[reportPrivateUsage]
+        _captured = []
+        try:
+            await check.call(service, sample)
+            captured = _captured
+        finally:
+            _captured = None
+
+        problems: list[str] = []
+        if len(captured) > check.budget:
+            problems.append(f"{len(captured)} statements, budget {check.budget}")
+        for statement, parameters in captured:
+            plan = await explain(session, statement, parameters)
+            scanned = set(seq_scans(plan)) & large - check.allow_seq_scan
+            if scanned:
+                problems.append(
+                    f"sequential scan on {', '.join(sorted(scanned))} in:\n{statement}\n{json.dumps(plan, indent=2)}"
+                )
+        return problems
+
+
+async def _has_extension(name: str) -> bool:
+    async with async_session_maker() as session:
+        stmt = text("SELECT EXISTS (SELECT FROM pg_extension WHERE extname = :name)")
+        return bool(await session.scalar(stmt, {"name": name}))
+
+
+@pytest.fixture(scope="module")
+def sample(portal: BlockingPortal) -> Sample:
+    return portal.call(load_sample, 10)
+
+
+@pytest.mark.parametrize("check", CHECKS, ids=str)
+def test_query_budget(check: Check, sample: Sample, portal: BlockingPortal, monkeypatch: pytest.MonkeyPatch):
+    if check.extension is not None and not portal.call(_has_extension, check.extension):
+        pytest.skip(f"No {check.extension} extension")
+    monkeypatch.setattr(settings, "CACHE_ENABLED", False)
+    if check.building_index is not None:
+        monkeypatch.setattr(settings, "BUILDING_INDEX_ENABLED", check.building_index)
+    random.seed(check.name)
+    problems = portal.call(run_check, check, sample)
+    assert not problems, "\n".join(problems)
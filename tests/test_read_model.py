@@ -0,0 +1,91 @@
+import asyncio
+from typing import Any
+
+import pytest
+from anyio.from_thread import BlockingPortal
+
+from database import async_session_maker
+from read_model import CatalogSnapshot, load_snapshot
+from repository import Repository
+from schemas import ClusterGrid
+from service import SecundaService, SnapshotService, _practice_clusters  # pyright:ignore[reportPrivateUsage]
+from utils import mercator_tile
+
+from test_snapshot_file import BUILDINGS, DESCENDANTS, LINKS, ORGANIZATIONS, PRACTICES
+
+
+GRID = ClusterGrid(zoom=14, x1=10140000 >> 10, y1=5262000 >> 10, x2=10142000 >> 10, y2=5264000 >> 10)
+
+
+def _snapshot() -> CatalogSnapshot:
+    return CatalogSnapshot.from_tables(1, BUILDINGS, PRACTICES, DESCENDANTS, ORGANIZATIONS, LINKS)
+
+
+def test_patched_clusters_are_those_of_the_applied_rows():
+    building_ids = [2, 3, 4]
+    buildings = [
+        (3, "г. Москва, наб. Садовая 3", "55.757000,37.612000", 55.757, 37.612, 10141203, 5262103),
+        (4, "г. Москва, ул. Новая 4", "55.741000,37.621000", 55.741, 37.621, 10141530, 5263110),
+    ]
+    # 11 moves to the new building, 12 is deleted, 13 is added
+    organization_ids = [11, 12, 13]
+    organizations: list[tuple[int, str, list[str], int]] = [(11, "Молоко Плюс", [], 4), (13, "Новая", [], 3)]
+
+    snapshot = _snapshot()
+    before = snapshot.building_clusters.cells(GRID)
+    clusters = snapshot.cluster_patched_buildings(building_ids, buildings, organization_ids, organizations)
+    assert snapshot.building_clusters.cells(GRID) == before
+
+    snapshot.apply_buildings(building_ids, buildings)
+    snapshot.apply_organizations(organization_ids, organizations)
+    assert clusters.cells(GRID) == snapshot.cluster_buildings().cells(GRID)
+    assert sum(cell["organizations"] for cell in clusters.cells(GRID)) == 3
+
+
+def test_practice_clusters_are_cached_per_version():
+    _practice_clusters.clear()
+    snapshot = _snapshot()
+    service = SnapshotService(snapshot)
+
+    def organizations() -> int:
+        cells = asyncio.run(service.list_building_clusters(GRID, 1, recursive=True))
+        return sum(cell["organizations"] for cell in cells)
+
+    assert organizations() == 2
+    snapshot.apply_links([10], [])
+    # The same version is taken for unchanged, as the read model bumps it with every patch
+    assert organizations() == 2
+    snapshot.version += 1
+    assert organizations() == 1
+    assert len(_practice_clusters) == 2
+
+
+@pytest.fixture(scope="module")
+def loaded_snapshot(portal: BlockingPortal) -> CatalogSnapshot:
+    return portal.call(load_snapshot)
+
+
+async def _database_clusters(grid: ClusterGrid, practice_id: int | None, recursive: bool) -> list[Any]:
+    async with async_session_maker() as session:
+        return await SecundaService(Repository(session)).list_building_clusters(grid, practice_id, recursive)
+
+
+@pytest.mark.parametrize("zoom", [9, 13, 17])
+@pytest.mark.parametrize(("practice_id", "recursive"), [(None, False), (1, True), (31, False)])
+def test_clusters_match_the_database(
+    portal: BlockingPortal,
+    loaded_snapshot: CatalogSnapshot,
+    zoom: int,
+    practice_id: int | None,
+    recursive: bool,
+):
+    x1, y1 = mercator_tile(55.80, 37.55, zoom)
+    x2, y2 = mercator_tile(55.70, 37.70, zoom)
+    grid = ClusterGrid(zoom=zoom, x1=x1, y1=y1, x2=x2, y2=y2)
+    cells = asyncio.run(SnapshotService(loaded_snapshot).list_building_clusters(grid, practice_id, recursive))
+    expected = portal.call(_database_clusters, grid, practice_id, recursive)
+    assert cells
+    assert cells == [
+        {**cell, "latitude": pytest.approx(cell["latitude"]), "longitude": pytest.approx(cell["longitude"])}
+        for cell in expected
+    ]
@@ -0,0 +1,96 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from read_model import CatalogSnapshot
+from schemas import BoxArea, CircleArea, ClusterGrid
+from snapshot_file import MappedSnapshot, write_snapshot
+
+
+BUILDINGS = [
+    (1, "г. Москва, ул. Тверская 1", "55.757500,37.613000", 55.7575, 37.613, 10141200, 5262100),
+    (2, "г. Москва, пер. Арбат 2", "55.752000,37.592000", 55.752, 37.592, 10140221, 5262420),
+    (3, "г. Москва, наб. Садовая 3", "55.740000,37.620000", 55.74, 37.62, 10141526, 5263120),
+]
+PRACTICES = [(1, "Еда", None, 0), (2, "Молочная продукция", 1, 1), (3, "Автомобили", None, 0)]
+DESCENDANTS = [(1, 1), (1, 2), (2, 2), (3, 3)]
+ORGANIZATIONS: list[tuple[int, str, list[str], int]] = [
+    (10, "Рога и Копыта", ["2-222-222", "8-923-666-13-13"], 1),
+    (11, "Молоко Плюс", [], 1),
+    (12, "Автосервис", ["3-333-333"], 3),
+]
+LINKS = [(10, 1), (10, 2), (11, 2), (12, 3)]
+
+
+def _snapshot(version: int = 7, organizations: list[tuple[int, str, list[str], int]] = ORGANIZATIONS) -> CatalogSnapshot:
+    return CatalogSnapshot.from_tables(version, BUILDINGS, PRACTICES, DESCENDANTS, organizations, LINKS)
+
+
+def _assert_same(mapped: MappedSnapshot, snapshot: CatalogSnapshot) -> None:
+    assert mapped.version == snapshot.version
+    assert list(mapped.building_ids) == snapshot.building_ids
+    assert list(mapped.practice_ids) == snapshot.practice_ids
+    assert list(mapped.organization_ids) == snapshot.organization_ids
+    for i in snapshot.building_ids:
+        assert mapped.buildings[i] == snapshot.buildings[i]
+        assert mapped.building_points[i] == snapshot.building_points[i]
+        assert mapped.building_tiles[i] == snapshot.building_tiles[i]
+        assert mapped.organizations_in_building[i] == snapshot.organizations_in_building.get(i, [])
+    for i in snapshot.practice_ids:
+        assert mapped.practices[i] == snapshot.practices[i]
+        assert set(mapped.descendants[i]) == snapshot.descendants[i]
+        assert mapped.organizations_of_practice[i] == snapshot.organizations_of_practice.get(i, [])
+    ids = snapshot.organization_ids
+    assert mapped.organization_items(ids) == snapshot.organization_items(ids)
+    assert mapped.organization_items(ids, ("id", "name")) == snapshot.organization_items(ids, ("id", "name"))
+    for search in ("молоко", "О", "нет такого"):
+        assert mapped.organization_ids_with_name(search) == snapshot.organization_ids_with_name(search)
+        assert mapped.organization_trigrams_with_name(search) == snapshot.organization_trigrams_with_name(search)
+
+    box = BoxArea(lat1=55.70, lon1=37.50, lat2=55.80, lon2=37.70)
+    circle = CircleArea(lat=55.7575, lon=37.613, radius=1.5)
+    assert mapped.building_index.query_box(box) == snapshot.building_index.query_box(box)
+    assert mapped.building_index.query_circle(circle) == snapshot.building_index.query_circle(circle)
+    for zoom in (4, 12, 18):
+        shift = 24 - zoom
+        grid = ClusterGrid(zoom=zoom, x1=10140000 >> shift, y1=5262000 >> shift, x2=10142000 >> shift, y2=5264000 >> shift)
+        assert mapped.building_clusters.cells(grid) == snapshot.building_clusters.cells(grid)
+        some = ids[::2]
+        assert mapped.building_clusters_of(some).cells(grid) == snapshot.building_clusters_of(some).cells(grid)
+
+
+def test_round_trip(tmp_path: Path):
+    snapshot = _snapshot()
+    write_snapshot(snapshot, tmp_path / "catalog.snapshot")
+    _assert_same(MappedSnapshot(tmp_path / "catalog.snapshot"), snapshot)
+
+
+def test_round_trip_of_empty_tables(tmp_path: Path):
+    snapshot = CatalogSnapshot.from_tables(0, [], [], [], [], [])
+    write_snapshot(snapshot, tmp_path / "catalog.snapshot")
+    mapped = MappedSnapshot(tmp_path / "catalog.snapshot")
+    _assert_same(mapped, snapshot)
+    assert len(mapped.buildings) == len(mapped.practices) == len(mapped.organizations) == 0
+
+
+def test_replaced_file_is_a_new_inode(tmp_path: Path):
+    path = tmp_path / "catalog.snapshot"
+    write_snapshot(_snapshot(version=1), path)
+    old = MappedSnapshot(path)
+    renamed = [(i, f"{name}!", phones, b) for i, name, phones, b in ORGANIZATIONS]
+    write_snapshot(_snapshot(version=2, organizations=renamed), path)
+
+    assert os.stat(path).st_ino != old.inode
+    new = MappedSnapshot(path)
+    assert new.version == 2 and new.organizations[10]["name"] == "Рога и Копыта!"
+    # A request still holding the previous mapping reads the previous file
+    assert old.version == 1 and old.organizations[10]["name"] == "Рога и Копыта"
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_not_a_snapshot_file(tmp_path: Path):
+    path = tmp_path / "catalog.snapshot"
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        MappedSnapshot(path)
@@ -1,7 +1,11 @@
+import base64
+import json
+import re
 from collections.abc import Sequence
-from math import asin, cos, radians, sin, sqrt
+from math import asin, asinh, cos, degrees, floor, pi, radians, sin, sqrt, tan
+from typing import cast
 
-from constants import EARTH_RADIUS as R
+from constants import EARTH_RADIUS as R, MERCATOR_MAX_LATITUDE, NEAREST_MAX_RADIUS, NEAREST_RADIUS_GROWTH
 from models import Building
 from schemas import BoxArea, CircleArea
 
@@ -16,15 +20,92 @@ def distance_wgs84(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return 2 * R * asin(sqrt(a))
 
 
+def is_point_in_box_area(lat: float, lon: float, area: BoxArea) -> bool:
+    return (
+        abs(area.lat1 - lat) <= abs(area.lat1 - area.lat2)
+        and abs(area.lon1 - lon) <= abs(area.lon1 - area.lon2)
+    )
+
+
+def is_point_in_circle_area(lat: float, lon: float, area: CircleArea) -> bool:
+    return distance_wgs84(lat, lon, area.lat, area.lon) <= area.radius
+
+
+def box_area_bounds(area: BoxArea) -> tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) of the area."""
+    dlat = abs(area.lat1 - area.lat2)
+    dlon = abs(area.lon1 - area.lon2)
+    return area.lat1 - dlat, area.lon1 - dlon, area.lat1 + dlat, area.lon1 + dlon
+
+
+def circle_area_bounds(area: CircleArea) -> tuple[float, float, float, float]:
+    """(min_lat, min_lon, max_lat, max_lon) enclosing the circle.
+
+    Near the poles and across the antimeridian the whole longitude range is returned.
+    """
+    angular_radius = area.radius / R
+    dlat = degrees(angular_radius)
+    min_lat, max_lat = area.lat - dlat, area.lat + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90), -180, min(max_lat, 90), 180
+
+    dlon = degrees(asin(min(sin(angular_radius) / cos(radians(area.lat)), 1)))
+    min_lon, max_lon = area.lon - dlon, area.lon + dlon
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, -180, max_lat, 180
+    return min_lat, min_lon, max_lat, max_lon
+
+
+def parse_coordinates(coordinates: str) -> tuple[float, float]:
+    """Latitude and longitude of "lat,lon", as the building_lat_lon_set trigger parses them."""
+    lat, lon = coordinates.split(",")
+    return float(lat), float(lon)
+
+
+def mercator_tile(lat: float, lon: float, zoom: int) -> tuple[int, int]:
+    """(x, y) of the web mercator tile holding the point, computed as the building.tile_x and tile_y columns."""
+    n = 1 << zoom
+    lat = min(max(lat, -MERCATOR_MAX_LATITUDE), MERCATOR_MAX_LATITUDE)
+    x = floor((lon + 180) / 360 * n)
+    y = floor((1 - asinh(tan(radians(lat))) / pi) / 2 * n)
+    return min(x, n - 1), min(max(y, 0), n - 1)
+
+
+def next_search_radius(radius: float, found: int, k: int) -> float:
+    """Radius of the next circle of a nearest-k search, after `found` < k were found within `radius`.
+
+    A circle holding some organizations grows by the radius their density suggests,
+    an overshoot makes the next round read the buildings of a much larger area.
+    """
+    growth = 1.25 * sqrt(k / found) if found else NEAREST_RADIUS_GROWTH
+    return min(radius * min(max(growth, 1.5), NEAREST_RADIUS_GROWTH), NEAREST_MAX_RADIUS)
+
+
+def trigram_words(s: str) -> str:
+    """Words of s padded as pg_trgm pads them, joined by "|". A trigram of s is a substring of the result."""
+    return "|".join(f"  {word} " for word in re.findall(r"[^\W_]+", s.lower()))
+
+
+def trigrams(words: str) -> set[str]:
+    """Trigrams of a trigram_words result."""
+    return {t for t in (words[i:i + 3] for i in range(len(words) - 2)) if "|" not in t}
+
+
+def trigram_similarity(words: str, count: int, other: set[str]) -> float:
+    """similarity() of pg_trgm: shared trigrams over the trigrams of both strings.
+
+    The first string is given by its trigram_words and the size of its trigrams,
+    so that checking it against many strings takes no set building.
+    """
+    shared = sum(t in words for t in other)
+    total = count + len(other) - shared
+    return shared / total if total else 0
+
+
 def find_buildings_in_box_area(buildings: Sequence[Building], area: BoxArea) -> list[Building]:
     res: list[Building] = []
     for b in buildings:
-        b_lat = float(b.coordinates.split(",")[0])
-        b_lon = float(b.coordinates.split(",")[1])
-        if (
-            abs(area.lat1 - b_lat) <= abs(area.lat1 - area.lat2)
-            and abs(area.lon1 - b_lon) <= abs(area.lon1 - area.lon2)
-        ):
+        if is_point_in_box_area(b.latitude, b.longitude, area):
             res.append(b)
     return res
 
@@ -32,13 +113,21 @@ def find_buildings_in_box_area(buildings: Sequence[Building], area: BoxArea) ->
 def find_buildings_in_circle_area(buildings: Sequence[Building], area: CircleArea) -> list[Building]:
     res: list[Building] = []
     for b in buildings:
-        if (
-            distance_wgs84(
-                float(b.coordinates.split(",")[0]),
-                float(b.coordinates.split(",")[1]),
-                area.lat,
-                area.lon,
-            ) <= area.radius
-        ):
+        if is_point_in_circle_area(b.latitude, b.longitude, area):
             res.append(b)
     return res
+
+
+def encode_cursor(key: Sequence[int | float]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list[int | float]:
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError as e:
+        raise ValueError("Malformed cursor") from e
+    values = cast(list[object], key) if isinstance(key, list) else []
+    if not values or not all(type(v) in (int, float) for v in values):
+        raise ValueError("Malformed cursor")
+    return cast(list[int | float], values)